@@ -0,0 +1,180 @@
+"""
+compression.py
+
+Per-view gzip/brotli response compression that keeps streaming responses streaming.
+
+Django's GZipMiddleware applies to every response. This module instead
+compresses only the views decorated with @compressed: chart JSON, the CSV
+export and the DRF trade list. Encodings are negotiated from Accept-Encoding:
+brotli when the brotli package is installed and the client accepts it,
+otherwise gzip.
+
+Bodies smaller than JOURNAL_COMPRESS_MIN_BYTES are sent as is. A streaming
+response is peeked until that many bytes have been produced. Past that point
+each chunk is compressed and flushed as it arrives, so the client keeps
+receiving data while the rest is generated. Async streams (the exports under
+ASGI) can't be peeked from sync code and are always compressed, chunk by chunk.
+"""
+import re
+import zlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone still works
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # on-the-fly: close to gzip's speed with better ratios
+
+_ACCEPT_RE = re.compile(r"\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?")
+
+
+def accepted_encodings(header):
+    """Content codings in an Accept-Encoding header, minus those refused with q=0."""
+    accepted = set()
+    for part in header.split(","):
+        match = _ACCEPT_RE.match(part)
+        if not match:
+            continue
+        coding, q = match.group(1).lower(), match.group(2)
+        try:
+            if q is not None and float(q) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding)
+    return accepted
+
+
+def _choose_encoding(request):
+    accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Incremental compressor with a uniform compress/flush/finish interface."""
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._br.process(data)
+        return self._gz.compress(data)
+
+    def flush(self):
+        if self.encoding == "br":
+            return self._br.flush()
+        return self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
+    def whole(self, data):
+        return self.compress(data) + self.finish()
+
+
+def _compress_chunks(chunks, encoding):
+    compressor = _Compressor(encoding)
+    for chunk in chunks:
+        # Flush per chunk so the client isn't kept waiting; producers should
+        # yield reasonably large chunks (see trades_export_csv).
+        out = compressor.compress(chunk) + compressor.flush()
+        if out:
+            yield out
+    yield compressor.finish()
+
+
+async def _acompress_chunks(chunks, encoding):
+    compressor = _Compressor(encoding)
+    async for chunk in chunks:
+        out = compressor.compress(chunk) + compressor.flush()
+        if out:
+            yield out
+    yield compressor.finish()
+
+
+def _mark_encoded(response, encoding):
+    response.headers["Content-Encoding"] = encoding
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        # The compressed representation is no longer byte-identical.
+        response.headers["ETag"] = "W/" + etag
+
+
+def compress_response(request, response):
+    """
+    Compress response in place for this request if it's worth it; returns it.
+    Unrendered template responses (DRF's Response) are compressed after rendering.
+    """
+    if getattr(response, "is_rendered", True) is False:
+        response.add_post_render_callback(lambda rendered: compress_response(request, rendered))
+        return response
+    if response.status_code != 200 or response.has_header("Content-Encoding"):
+        return response
+    patch_vary_headers(response, ("Accept-Encoding",))
+    encoding = _choose_encoding(request)
+    if encoding is None:
+        return response
+    threshold = settings.JOURNAL_COMPRESS_MIN_BYTES
+
+    if not response.streaming:
+        if len(response.content) < threshold:
+            return response
+        response.content = _Compressor(encoding).whole(response.content)
+        response.headers["Content-Length"] = str(len(response.content))
+        _mark_encoded(response, encoding)
+        return response
+
+    if response.is_async:
+        # Can't peek an async stream from sync code; these are never tiny in practice.
+        response.streaming_content = _acompress_chunks(response.streaming_content, encoding)
+        _mark_encoded(response, encoding)
+        return response
+
+    chunks = iter(response.streaming_content)
+    head, size = [], 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= threshold:
+            break
+    else:
+        # The whole body was smaller than the threshold.
+        response.streaming_content = head
+        return response
+
+    def _body():
+        yield from head
+        yield from chunks
+    response.streaming_content = _compress_chunks(_body(), encoding)
+    response.headers.pop("Content-Length", None)
+    _mark_encoded(response, encoding)
+    return response
+
+
+def compressed(view):
+    """Decorator for views (sync or async) whose responses should be compressed."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def _wrapped(request, *args, **kwargs):
+            return compress_response(request, await view(request, *args, **kwargs))
+    else:
+        @wraps(view)
+        def _wrapped(request, *args, **kwargs):
+            return compress_response(request, view(request, *args, **kwargs))
+    return _wrapped
@@ -0,0 +1,134 @@
+"""
+db_routers.py
+
+Read-replica routing for analytics traffic.
+
+Views decorated with reads_from_replica (dashboard, calendar, stats APIs, export)
+and safe TradeViewSet requests read from the "replica" alias when it is
+configured. Everything else, and every write, uses "default".
+
+Read-your-writes: after any request that wrote to the database (or used an
+unsafe method), ReplicaRoutingMiddleware pins its user to the primary for
+JOURNAL_REPLICA_PIN_SECONDS with a key in the default cache. While the pin is
+there, that user's reads stay on the primary, from any browser tab, API client
+or script, so they always see the trades they just created or edited. The pin
+is per user, so it needs a cache shared by the workers. A write earlier in the
+same request, or an open transaction on the primary, also keeps the rest of
+that request there.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = "replica"
+
+
+class _RoutingState:
+    """Per-request routing flags, shared by reference with helper threads."""
+    __slots__ = ("use_replica", "user_id", "pinned", "wrote")
+
+    def __init__(self):
+        self.use_replica = False
+        self.user_id = None
+        self.pinned = None  # looked up on the first read that could use the replica
+        self.wrote = False
+
+
+_state = contextvars.ContextVar("journal_db_routing", default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _pin_key(user_id):
+    return f"journal:pin:{user_id}"
+
+
+def pin(user_id):
+    """Keep user_id's reads on the primary for the next JOURNAL_REPLICA_PIN_SECONDS."""
+    cache.set(_pin_key(user_id), True, settings.JOURNAL_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id), False)
+
+
+@contextmanager
+def request_routing():
+    """Track routing for one request; reads default to the primary until use_replica() is called."""
+    state = _RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def use_replica(user=None):
+    """
+    Allow the rest of the current request to read from the replica, unless
+    user (the request's user, however they authenticated) is pinned.
+    """
+    state = _state.get()
+    if state is not None:
+        state.use_replica = True
+        if user is not None and user.is_authenticated:
+            state.user_id = user.pk
+
+
+def reads_from_replica(view):
+    """Decorator for read-only analytics views (sync or async)."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def _wrapped(request, *args, **kwargs):
+            use_replica(await request.auser())
+            return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def _wrapped(request, *args, **kwargs):
+            use_replica(request.user)
+            return view(request, *args, **kwargs)
+    return _wrapped
+
+
+class ReplicaRouter:
+    """
+    Database router sending opted-in reads to the replica alias.
+    Reads outside a request (management commands, shell) always use the primary.
+    """
+    def __init__(self):
+        self.replica = REPLICA_ALIAS if replica_configured() else None
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if not (self.replica and state and state.use_replica) or state.wrote:
+            return None
+        if state.pinned is None:
+            state.pinned = state.user_id is not None and is_pinned(state.user_id)
+        if state.pinned:
+            return None
+        # The replica can't see rows from a transaction that is still open on the primary.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_ALIAS:
+            return False
+        return None
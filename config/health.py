@@ -0,0 +1,193 @@
+"""
+health.py
+
+The deep health check behind /healthz/?deep=1.
+
+Each check runs in a small dedicated thread pool and gets
+JOURNAL_HEALTH_TIMEOUT_SECONDS to finish. A check that hangs, for example
+connecting to an unreachable database, is reported as timed out and the
+probe still answers on time. The pool is bounded, so repeated probes against
+a hung dependency queue behind it and time out too, rather than adding
+threads.
+
+Checks:
+
+- database (and database:replica when configured): connect time and a
+  SELECT 1 round trip on a fresh connection, plus server connections in use
+  against max_connections.
+- cache: a set/get/delete round trip on the default cache.
+- workers: this process's in-flight requests (MetricsMiddleware) and the
+  backlog of the run_concurrently query pool (journal.concurrency).
+- migrations: migrations on disk that haven't been applied. The result is
+  cached for MIGRATIONS_CACHE_SECONDS, since loading the graph is slow.
+
+Every check reports "ok", "degraded" or "unhealthy"; the overall status is
+the worst of them. Only a failing primary database is unhealthy. Slow or
+saturated dependencies, a broken cache or replica and pending migrations
+mark the instance degraded.
+
+The report names migrations, connection counts and the cache backend, and
+running it opens database connections, so only internal callers get it (see
+allowed()).
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .db_routers import REPLICA_ALIAS, replica_configured
+from .metrics import REGISTRY
+
+OK, DEGRADED, UNHEALTHY = "ok", "degraded", "unhealthy"
+_SEVERITY = {OK: 0, DEGRADED: 1, UNHEALTHY: 2}
+
+MIGRATIONS_CACHE_SECONDS = 60
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="healthz")
+_migrations = {"checked": 0.0, "result": None}
+_migrations_lock = threading.Lock()
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _latency_status(seconds):
+    return DEGRADED if seconds * 1000 > settings.JOURNAL_HEALTH_SLOW_MS else OK
+
+
+def check_database(alias):
+    """Connect, round-trip and, on Postgres, connection usage for one alias."""
+    connection = connections[alias]  # this pool thread's own connection
+    try:
+        start = time.perf_counter()
+        connection.ensure_connection()
+        connected = time.perf_counter()
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                timeout_ms = int(settings.JOURNAL_HEALTH_TIMEOUT_SECONDS * 1000)
+                cursor.execute(f"SET statement_timeout = {timeout_ms}")
+            ping = time.perf_counter()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            round_trip = time.perf_counter() - ping
+            result = {
+                "status": _latency_status(round_trip),
+                "latency_ms": _ms(round_trip),
+                "connect_ms": _ms(connected - start),
+            }
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT count(*), current_setting('max_connections')::int FROM pg_stat_activity")
+                used, limit = cursor.fetchone()
+                ratio = used / limit
+                result["connections"] = {"used": used, "max": limit, "ratio": round(ratio, 3)}
+                if ratio >= settings.JOURNAL_HEALTH_MAX_CONNECTIONS_RATIO:
+                    result["status"] = DEGRADED
+        return result
+    finally:
+        connection.close()
+
+
+def check_cache():
+    key = f"journal:healthz:{uuid.uuid4().hex}"
+    start = time.perf_counter()
+    cache.set(key, 1, 10)
+    found = cache.get(key)
+    cache.delete(key)
+    elapsed = time.perf_counter() - start
+    if found != 1:
+        return {"status": DEGRADED, "error": "value written was not read back", "latency_ms": _ms(elapsed)}
+    return {
+        "status": _latency_status(elapsed),
+        "latency_ms": _ms(elapsed),
+        "backend": settings.CACHES["default"]["BACKEND"].rsplit(".", 1)[-1],
+        "shared": settings.SHARED_CACHE,
+    }
+
+
+def check_workers():
+    from journal import concurrency
+    result = {"status": OK, "pid": os.getpid(), "in_flight": REGISTRY.in_flight}
+    if result["in_flight"] > settings.JOURNAL_HEALTH_MAX_IN_FLIGHT:
+        result["status"] = DEGRADED
+    pool = concurrency._executor
+    if pool is not None:
+        queued = pool._work_queue.qsize()
+        result["query_pool"] = {"workers": pool._max_workers, "queued": queued}
+        if queued > pool._max_workers:
+            result["status"] = DEGRADED
+    return result
+
+
+def check_migrations():
+    from django.db.migrations.executor import MigrationExecutor
+    with _migrations_lock:
+        if _migrations["result"] and time.monotonic() - _migrations["checked"] < MIGRATIONS_CACHE_SECONDS:
+            return _migrations["result"]
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    finally:
+        connection.close()
+    pending = [f"{migration.app_label}.{migration.name}" for migration, _backwards in plan]
+    result = {"status": DEGRADED if pending else OK, "pending": pending}
+    with _migrations_lock:
+        _migrations.update(checked=time.monotonic(), result=result)
+    return result
+
+
+def _checks():
+    checks = {
+        "database": (check_database, DEFAULT_DB_ALIAS),
+        "cache": (check_cache,),
+        "workers": (check_workers,),
+        "migrations": (check_migrations,),
+    }
+    if replica_configured():
+        checks[f"database:{REPLICA_ALIAS}"] = (check_database, REPLICA_ALIAS)
+    return checks
+
+
+def _failed(name, error):
+    # Only the primary database makes the instance unusable.
+    return {"status": UNHEALTHY if name == "database" else DEGRADED, "error": error}
+
+
+TOKEN_HEADER = "X-Health-Token"
+
+
+def allowed(request):
+    """
+    Whether request may run the deep checks: it carries JOURNAL_HEALTH_TOKEN
+    in the X-Health-Token header (probes), or comes from a staff user.
+    """
+    token = settings.JOURNAL_HEALTH_TOKEN
+    if token and constant_time_compare(request.headers.get(TOKEN_HEADER, ""), token):
+        return True
+    return request.user.is_active and request.user.is_staff
+
+
+def run():
+    """Run every check concurrently, each within the timeout; returns the report."""
+    start = time.perf_counter()
+    futures = {name: _executor.submit(*call) for name, call in _checks().items()}
+    wait(futures.values(), timeout=settings.JOURNAL_HEALTH_TIMEOUT_SECONDS)
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()  # frees its place if it hasn't started
+            results[name] = _failed(name, f"timed out after {settings.JOURNAL_HEALTH_TIMEOUT_SECONDS}s")
+        elif future.exception() is not None:
+            exc = future.exception()
+            results[name] = _failed(name, f"{type(exc).__name__}: {exc}")
+        else:
+            results[name] = future.result()
+    status = max((check["status"] for check in results.values()), key=_SEVERITY.__getitem__)
+    return {"status": status, "checks": results, "elapsed_ms": _ms(time.perf_counter() - start)}
@@ -0,0 +1,329 @@
+"""
+metrics.py
+
+Process-local request metrics with Prometheus text exposition.
+
+MetricsMiddleware (see config/middleware.py) records one observation per request
+into the module-level REGISTRY. When JOURNAL_METRICS_DIR is set, every process
+periodically writes its aggregates to a JSON file in that directory and the
+/metrics endpoint merges all of them, so counts are correct behind a pre-forking
+server with several workers.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, suppress
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+# Prometheus client default buckets (seconds).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_view_stats():
+    return {
+        "requests": defaultdict(int),  # "METHOD status" -> count
+        "buckets": [0] * len(LATENCY_BUCKETS),
+        "latency_count": 0,
+        "latency_sum": 0.0,
+        "db_queries": 0,
+        "db_seconds": 0.0,
+    }
+
+
+class MetricsRegistry:
+    """
+    Thread-safe per-view aggregates for the current process.
+
+    Args:
+        directory (str): Optional directory for multi-process snapshots.
+        flush_interval (float): Minimum seconds between snapshot writes.
+    """
+    def __init__(self, directory="", flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one snapshot write at a time
+        self._views = defaultdict(_empty_view_stats)
+        self._last_flush = 0.0
+        self.in_flight = 0  # requests this process is handling now (config.health)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def observe(self, view, method, status, seconds, db_queries, db_seconds):
+        """Record one finished request."""
+        with self._lock:
+            stats = self._views[view]
+            stats["requests"][f"{method} {status}"] += 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][i] += 1
+            stats["latency_count"] += 1
+            stats["latency_sum"] += seconds
+            stats["db_queries"] += db_queries
+            stats["db_seconds"] += db_seconds
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            try:
+                self.flush()
+            except OSError:
+                # Metrics must never fail the request they describe.
+                logger.exception("Couldn't write the metrics snapshot to %s.", self.directory)
+
+    def snapshot(self):
+        """Return a JSON-serializable copy of this process's aggregates."""
+        with self._lock:
+            return {
+                view: {**stats, "requests": dict(stats["requests"]), "buckets": list(stats["buckets"])}
+                for view, stats in self._views.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def _path(self, pid=None):
+        return os.path.join(self.directory, f"metrics-{pid or os.getpid()}.json")
+
+    def flush(self):
+        """Atomically write this process's snapshot to the metrics directory."""
+        if not self.directory:
+            return
+        with self._flush_lock:
+            self._last_flush = time.monotonic()
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f"metrics-{os.getpid()}-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as fh:
+                    json.dump(self.snapshot(), fh)
+                os.replace(tmp, self._path())
+            except BaseException:
+                with suppress(OSError):
+                    os.unlink(tmp)
+                raise
+
+    def collect(self):
+        """
+        Return aggregates merged across processes.
+        Without a metrics directory this is just the local snapshot.
+        """
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        merged = defaultdict(_empty_view_stats)
+        for name in os.listdir(self.directory):
+            if not (name.startswith("metrics-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                # A worker may be mid-write or gone; skip its file this round.
+                continue
+            for view, stats in data.items():
+                _merge_into(merged[view], stats)
+        return merged
+
+
+def _merge_into(target, stats):
+    for key, count in stats["requests"].items():
+        target["requests"][key] += count
+    target["buckets"] = [a + b for a, b in zip(target["buckets"], stats["buckets"])]
+    for key in ("latency_count", "latency_sum", "db_queries", "db_seconds"):
+        target[key] += stats[key]
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(data):
+    """Render merged aggregates in the Prometheus text exposition format."""
+    lines = [
+        "# HELP journal_http_requests_total Requests handled, by view, method and status.",
+        "# TYPE journal_http_requests_total counter",
+    ]
+    for view in sorted(data):
+        for key, count in sorted(data[view]["requests"].items()):
+            method, status = key.split(" ", 1)
+            lines.append(
+                f'journal_http_requests_total{{view="{_label(view)}",method="{method}",status="{status}"}} {count}'
+            )
+
+    lines += [
+        "# HELP journal_http_request_duration_seconds Request latency, by view.",
+        "# TYPE journal_http_request_duration_seconds histogram",
+    ]
+    for view in sorted(data):
+        stats, v = data[view], _label(view)
+        for bound, count in zip(LATENCY_BUCKETS, stats["buckets"]):
+            lines.append(f'journal_http_request_duration_seconds_bucket{{view="{v}",le="{bound}"}} {count}')
+        lines.append(f'journal_http_request_duration_seconds_bucket{{view="{v}",le="+Inf"}} {stats["latency_count"]}')
+        lines.append(f'journal_http_request_duration_seconds_sum{{view="{v}"}} {stats["latency_sum"]:.6f}')
+        lines.append(f'journal_http_request_duration_seconds_count{{view="{v}"}} {stats["latency_count"]}')
+
+    lines += [
+        "# HELP journal_db_queries_total Database queries issued, by view.",
+        "# TYPE journal_db_queries_total counter",
+    ]
+    for view in sorted(data):
+        lines.append(f'journal_db_queries_total{{view="{_label(view)}"}} {data[view]["db_queries"]}')
+
+    lines += [
+        "# HELP journal_db_query_seconds_total Time spent in database queries, by view.",
+        "# TYPE journal_db_query_seconds_total counter",
+    ]
+    for view in sorted(data):
+        lines.append(f'journal_db_query_seconds_total{{view="{_label(view)}"}} {data[view]["db_seconds"]:.6f}')
+    return "\n".join(lines) + "\n"
+
+
+class QueryTimer:
+    """
+    Counts queries and accumulates their duration; safe to share between threads.
+    Nested timers also report to the enclosing one. With record > 0 the first
+    `record` statements are kept in `queries` as (sql, seconds).
+    """
+    def __init__(self, parent=None, record=0):
+        self._lock = threading.Lock()
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.record = record
+        self.queries = []
+
+    def add(self, seconds, sql=None):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            if len(self.queries) < self.record:
+                self.queries.append((sql, seconds))
+        if self.parent is not None:
+            self.parent.add(seconds, sql)
+
+
+# The timer for the request being handled. Context variables follow the request
+# through sync_to_async/async_to_sync, so queries run in helper threads are
+# attributed to the request that issued them.
+_current_timer = contextvars.ContextVar("journal_query_timer", default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    """execute_wrapper installed on every connection; records into the current timer, if any."""
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.add(time.perf_counter() - start, sql)
+
+
+def _install_wrapper(connection):
+    if _timed_execute not in connection.execute_wrappers:
+        # Insert at the bottom so execute_wrapper() blocks that are open while the
+        # connection is (re)established still pop their own wrapper on exit.
+        connection.execute_wrappers.insert(0, _timed_execute)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_wrapper(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+
+@contextmanager
+def track_queries(record=0):
+    """
+    Attribute every query issued inside the block (in any thread) to a new
+    QueryTimer, keeping the first `record` statements.
+    """
+    for conn in connections.all(initialized_only=True):
+        _install_wrapper(conn)
+    timer = QueryTimer(parent=_current_timer.get(), record=record)
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+class _TrackedStream:
+    """Streaming content whose chunks are produced under the request's QueryTimer."""
+    def __init__(self, chunks, timer, done):
+        self._chunks, self._timer, self._done = iter(chunks), timer, done
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = _current_timer.set(self._timer)
+        try:
+            return next(self._chunks)
+        finally:
+            _current_timer.reset(token)
+
+    def close(self):
+        self._done()
+
+
+class _AsyncTrackedStream:
+    def __init__(self, chunks, timer, done):
+        self._chunks, self._timer, self._done = aiter(chunks), timer, done
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        token = _current_timer.set(self._timer)
+        try:
+            return await anext(self._chunks)
+        finally:
+            _current_timer.reset(token)
+
+    def close(self):
+        self._done()
+
+
+def track_stream(response, timer, done):
+    """
+    Attribute the queries a streaming response issues while it is sent (after
+    the view and the track_queries() block have returned) to timer, and call
+    done() once Django closes the response.
+    """
+    stream = _AsyncTrackedStream if response.is_async else _TrackedStream
+    response.streaming_content = stream(response.streaming_content, timer, done)
+
+
+REGISTRY = MetricsRegistry(
+    directory=getattr(settings, "JOURNAL_METRICS_DIR", ""),
+    flush_interval=getattr(settings, "JOURNAL_METRICS_FLUSH_INTERVAL", 5.0),
+)
+atexit.register(REGISTRY.flush)
+
+
+@staff_member_required
+def metrics_view(request):
+    """Staff-only Prometheus endpoint with per-view request and DB metrics."""
+    return HttpResponse(render_prometheus(REGISTRY.collect()), content_type=CONTENT_TYPE)
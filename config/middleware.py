@@ -1,14 +1,51 @@
+import time
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.contrib import messages
-from django.urls import resolve
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from .db_routers import pin, replica_configured, request_routing
+from .metrics import REGISTRY, track_queries, track_stream
 
 """
 middleware.py
 
-Custom Django middleware for displaying authentication-related messages to users.
-This middleware adds success or info messages upon login and logout events,
-using Django's messages framework.
+Custom Django middleware for displaying authentication-related messages to users,
+recording per-view request metrics and routing reads to a replica.
+AuthMessageMiddleware adds success or info messages upon login and logout events,
+using Django's messages framework. MetricsMiddleware feeds config.metrics.
+ReplicaRoutingMiddleware sets up config.db_routers for each request.
+CachedAuthenticationMiddleware loads request.user through journal.caching.
 """
 
+def _session_user(request):
+    from journal.caching import get_session_user
+    if not hasattr(request, "_cached_user"):
+        request._cached_user = get_session_user(request)
+    return request._cached_user
+
+
+async def _asession_user(request):
+    from journal.caching import get_session_user
+    if not hasattr(request, "_acached_user"):
+        request._acached_user = await sync_to_async(get_session_user)(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware whose request.user and request.auser() come from
+    journal.caching.get_session_user(), so most requests skip the user query.
+    The sessions and the authentication backends stay Django's and allauth's.
+    """
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _session_user(request))
+        request.auser = partial(_asession_user, request)
+
+
 class AuthMessageMiddleware:
     """
     Middleware that attaches authentication-related messages to the request.
@@ -18,6 +55,9 @@ class AuthMessageMiddleware:
     Args:
         get_response (callable): The next middleware or view in the chain.
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the next response handler.
@@ -26,6 +66,8 @@ class AuthMessageMiddleware:
             get_response (callable): The next middleware or view in the chain.
         """
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         """
@@ -37,14 +79,170 @@ class AuthMessageMiddleware:
         Returns:
             HttpResponse: The HTTP response after processing.
         """
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         response = self.get_response(request)
-        try:
-            name = resolve(request.path_info).url_name
-        except Exception:
-            # If URL cannot be resolved, skip message handling.
-            return response
+        name = _url_name(request)
         if name == "login" and request.user.is_authenticated:
             messages.success(request, "Welcome back!")
         elif name == "logout":
             messages.info(request, "You have been logged out.")
         return response
+
+    async def __acall__(self, request):
+        """Async variant of __call__, used when the app is served over ASGI."""
+        response = await self.get_response(request)
+        name = _url_name(request)
+        if name == "login" and (await request.auser()).is_authenticated:
+            messages.success(request, "Welcome back!")
+        elif name == "logout":
+            messages.info(request, "You have been logged out.")
+        return response
+
+
+def _url_name(request):
+    """
+    URL name of the view that handled the request, from the match Django already
+    made. None if the URL didn't resolve; message handling is then skipped.
+    """
+    match = getattr(request, "resolver_match", None)
+    return match.url_name if match else None
+
+
+class MetricsMiddleware:
+    """
+    Middleware that records latency, status and database usage per view.
+    Queries are counted and timed by the execute_wrapper that config.metrics
+    installs on every connection, including those of helper threads used by
+    async views. Results are aggregated in config.metrics.REGISTRY.
+
+    Args:
+        get_response (callable): The next middleware or view in the chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """
+        Time the request and its queries, then record them under the view name.
+
+        Args:
+            request (HttpRequest): The incoming HTTP request.
+
+        Returns:
+            HttpResponse: The HTTP response after processing.
+        """
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        REGISTRY.request_started()
+        try:
+            with track_queries() as db:
+                response = self.get_response(request)
+        finally:
+            REGISTRY.request_finished()
+        return self._observe_when_sent(request, response, start, db)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        REGISTRY.request_started()
+        try:
+            with track_queries() as db:
+                response = await self.get_response(request)
+        finally:
+            REGISTRY.request_finished()
+        return self._observe_when_sent(request, response, start, db)
+
+    def _observe_when_sent(self, request, response, start, db):
+        def observe():
+            self._observe(request, response, time.perf_counter() - start, db)
+
+        if response.streaming:
+            # A streamed body is produced after the view returns; count its
+            # queries and the time to send it too.
+            track_stream(response, db, observe)
+        else:
+            observe()
+        return response
+
+    def _observe(self, request, response, elapsed, db):
+        REGISTRY.observe(
+            view=_view_label(request),
+            method=request.method,
+            status=response.status_code,
+            seconds=elapsed,
+            db_queries=db.count,
+            db_seconds=db.seconds,
+        )
+
+
+def _view_label(request):
+    """
+    Return the URL name of the matched view (namespaced), falling back to the
+    view's dotted path for unnamed patterns. Uses the resolver match Django
+    already computed instead of resolving the path again.
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name
+
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS", "TRACE"}
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Middleware that scopes replica routing to the request and pins clients that
+    just wrote to the primary for JOURNAL_REPLICA_PIN_SECONDS (read-your-writes).
+
+    Args:
+        get_response (callable): The next middleware or view in the chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """
+        Run the request with fresh routing state and pin the client if it wrote.
+
+        Args:
+            request (HttpRequest): The incoming HTTP request.
+
+        Returns:
+            HttpResponse: The HTTP response after processing.
+        """
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_routing() as state:
+            response = self.get_response(request)
+        if self._wrote(request, state):
+            self._pin(request)
+        return response
+
+    async def __acall__(self, request):
+        with request_routing() as state:
+            response = await self.get_response(request)
+        if self._wrote(request, state):
+            await sync_to_async(self._pin)(request)
+        return response
+
+    def _wrote(self, request, state):
+        return replica_configured() and (state.wrote or request.method not in SAFE_METHODS)
+
+    def _pin(self, request):
+        # request.user is whoever the view authenticated: the session's user, or
+        # the one DRF set for a token or basic-auth API request.
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            pin(user.pk)
@@ -0,0 +1,291 @@
+"""
+profiling.py
+
+On-demand profiling of single requests, for staff.
+
+A staff user adds ?_profile=1 to a URL, or sends an "X-Profile: 1" header.
+ProfilingMiddleware then samples the Python stacks of the view handling that
+request every JOURNAL_PROFILE_INTERVAL seconds. It also records every SQL
+statement the request issues, with its duration, through the execute_wrapper
+from config.metrics. Both are kept in an in-memory ring buffer of the last
+JOURNAL_PROFILE_KEEP profiles. Staff can browse them at /admin/profiles/ and
+download them as JSON or as folded stacks for flame graph tools.
+
+The sampler runs in its own thread and reads sys._current_frames(). It keeps
+only the stacks that belong to this request: those passing through the view
+function called with this request object, and those of sync_to_async worker
+threads (the async ORM, journal.concurrency) running in a context copied from
+it. So the view is profiled whether it runs on the event loop or in a thread,
+and concurrent requests aren't mixed in.
+
+Other requests pay for one header lookup and one substring test. With
+JOURNAL_PROFILER=0 the middleware removes itself. Each worker process keeps its
+own buffer.
+"""
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from asgiref.sync import SyncToAsync, iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse, JsonResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+from .metrics import track_queries
+
+HEADER = "HTTP_X_PROFILE"
+QUERY_FLAG = "_profile="
+MAX_QUERIES = 2000  # statements kept per profile
+MAX_DEPTH = 128  # frames kept per sample, from the leaf up
+
+# The sampler of the request being profiled; sync_to_async copies it into worker threads.
+_sampler = contextvars.ContextVar("journal_profile_sampler", default=None)
+_THREAD_HANDLER = SyncToAsync.thread_handler.__code__
+
+
+class ProfileBuffer:
+    """The last `size` profiles of this process, newest first; thread-safe."""
+    def __init__(self, size):
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=size)
+        self._ids = itertools.count(1)
+
+    def add(self, profile):
+        with self._lock:
+            profile["id"] = f"{os.getpid()}-{next(self._ids)}"
+            self._profiles.appendleft(profile)
+        return profile["id"]
+
+    def all(self):
+        with self._lock:
+            return list(self._profiles)
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((p for p in self._profiles if p["id"] == profile_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+BUFFER = ProfileBuffer(getattr(settings, "JOURNAL_PROFILE_KEEP", 50))
+
+
+def _view_codes(request):
+    """Code objects of the matched view and the decorators wrapping it."""
+    match = getattr(request, "resolver_match", None)
+    codes = set()
+    func = match.func if match else None
+    while func is not None and len(codes) < 32:
+        code = getattr(func, "__code__", None)
+        if code is not None:
+            codes.add(code)
+        func = getattr(func, "__wrapped__", None)
+    return codes
+
+
+def _frame_label(code):
+    path = code.co_filename
+    for root in (str(settings.BASE_DIR) + os.sep, os.path.dirname(os.__file__) + os.sep):
+        if path.startswith(root):
+            path = path[len(root):]
+            break
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    """Collects folded stacks of the frames serving one request."""
+    def __init__(self, request, interval):
+        super().__init__(name="journal-profiler", daemon=True)
+        self.request = request
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        codes = None
+        while not self._done.wait(self.interval):
+            if not codes:
+                # Set once URL resolution has happened inside the middleware chain.
+                codes = _view_codes(self.request)
+                if not codes:
+                    continue
+            for ident, frame in sys._current_frames().items():
+                if ident != self.ident:
+                    stack = self._stack(frame, codes)
+                    if stack:
+                        self.stacks[stack] += 1
+                        self.samples += 1
+
+    def _stack(self, frame, codes):
+        labels, ours = [], False
+        while frame is not None:
+            code = frame.f_code
+            if len(labels) < MAX_DEPTH:
+                labels.append(_frame_label(code))
+            if not ours:
+                if code in codes:
+                    ours = frame.f_locals.get("request") is self.request
+                elif code is _THREAD_HANDLER:
+                    # func is context.run of the context the caller's was copied into.
+                    context = getattr(frame.f_locals.get("func"), "__self__", None)
+                    ours = isinstance(context, contextvars.Context) and context.get(_sampler) is self
+            frame = frame.f_back
+        return ";".join(reversed(labels)) if ours else None
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def _requested(request):
+    return request.META.get(HEADER) == "1" or QUERY_FLAG in request.META.get("QUERY_STRING", "")
+
+
+class _Run:
+    """One profiled request: the sampler plus the query log."""
+    def __init__(self, request):
+        self.request = request
+        self.started = timezone.now()
+        self.sampler = _Sampler(request, settings.JOURNAL_PROFILE_INTERVAL)
+        self.queries = track_queries(record=MAX_QUERIES)
+
+    def __enter__(self):
+        self.db = self.queries.__enter__()
+        self.token = _sampler.set(self.sampler)
+        self.start = time.perf_counter()
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        try:
+            self.sampler.stop()
+        finally:
+            _sampler.reset(self.token)
+            self.queries.__exit__(*exc)
+
+    def save(self, user, response):
+        match = getattr(self.request, "resolver_match", None)
+        profile_id = BUFFER.add({
+            "started": self.started.isoformat(),
+            "user": user.get_username(),
+            "method": self.request.method,
+            "path": self.request.get_full_path(),
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "seconds": round(self.seconds, 6),
+            "interval": self.sampler.interval,
+            "samples": self.sampler.samples,
+            "stacks": dict(self.sampler.stacks.most_common()),
+            "query_count": self.db.count,
+            "query_seconds": round(self.db.seconds, 6),
+            "queries": [{"sql": sql, "seconds": round(seconds, 6)} for sql, seconds in self.db.queries],
+        })
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Middleware that profiles requests from staff asking for it (see module
+    docstring). Must come after AuthenticationMiddleware.
+
+    Args:
+        get_response (callable): The next middleware or view in the chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.JOURNAL_PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _requested(request) or not request.user.is_staff:
+            return self.get_response(request)
+        with _Run(request) as run:
+            response = self.get_response(request)
+        return run.save(request.user, response)
+
+    async def __acall__(self, request):
+        if not _requested(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not user.is_staff:
+            return await self.get_response(request)
+        with _Run(request) as run:
+            response = await self.get_response(request)
+        return run.save(user, response)
+
+
+def top_functions(profile, limit=30):
+    """[(function, self samples, total samples)] by total, from the folded stacks."""
+    own, total = Counter(), Counter()
+    for stack, count in profile["stacks"].items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [(frame, own[frame], count) for frame, count in total.most_common(limit)]
+
+
+def top_queries(profile, limit=30):
+    """[(sql, executions, seconds)] by total time, grouping identical statements."""
+    grouped = {}
+    for q in profile["queries"]:
+        count, seconds = grouped.get(q["sql"], (0, 0.0))
+        grouped[q["sql"]] = (count + 1, seconds + q["seconds"])
+    ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)
+    return [(sql, count, seconds) for sql, (count, seconds) in ranked[:limit]]
+
+
+@staff_member_required
+def profile_list(request):
+    """Admin page listing the buffered profiles."""
+    if request.method == "POST" and "clear" in request.POST:
+        BUFFER.clear()
+    return TemplateResponse(request, "admin/profiles.html", {
+        "title": "Request profiles",
+        "profiles": BUFFER.all(),
+        "keep": BUFFER._profiles.maxlen,
+    })
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    """One profile; ?download=json or ?download=folded to save it."""
+    profile = BUFFER.get(profile_id)
+    if profile is None:
+        raise Http404("Profile not found (it may have been evicted or recorded by another worker).")
+    download = request.GET.get("download")
+    if download == "json":
+        response = JsonResponse(profile, json_dumps_params={"indent": 2})
+        response["Content-Disposition"] = f'attachment; filename="profile-{profile_id}.json"'
+        return response
+    if download == "folded":
+        body = "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items())
+        response = HttpResponse(body, content_type="text/plain; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="profile-{profile_id}.folded"'
+        return response
+    return TemplateResponse(request, "admin/profile_detail.html", {
+        "title": f"Profile {profile_id}",
+        "profile": profile,
+        "functions": top_functions(profile),
+        "queries": top_queries(profile),
+        "sample_ms": profile["interval"] * 1000,
+    })
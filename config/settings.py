@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -32,10 +33,8 @@ SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "dev-key-not-for-prod")
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = 'django-insecure-+v$98em89!l4%a+ru^ad0s+hu)vk0%s(6crm*4bmlqio83-bpy'
 
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS = []
+# DEBUG and ALLOWED_HOSTS come from DJANGO_DEBUG / DJANGO_ALLOWED_HOSTS above; DEBUG
+# is off unless asked for (.env.example turns it on for development).
 
 
 # Application definition
@@ -61,11 +60,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.middleware.MetricsMiddleware",
+    "config.middleware.ReplicaRoutingMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    "config.middleware.CachedAuthenticationMiddleware",
+    "config.profiling.ProfilingMiddleware",
     "allauth.account.middleware.AccountMiddleware",
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -78,7 +80,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -86,6 +87,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process; runserver's autoreloader
+            # still clears the cache when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -104,8 +113,69 @@ DATABASES = {
         'PASSWORD': os.getenv("POSTGRES_PASSWORD", ""),
         'HOST': os.getenv("POSTGRES_HOST", "localhost"),
         'PORT': os.getenv("POSTGRES_PORT", "5432"),
+        # Persistent connections matter under ASGI/gunicorn, where async views
+        # run queries on pooled worker threads (see journal.concurrency).
+        'CONN_MAX_AGE': int(os.getenv("POSTGRES_CONN_MAX_AGE", "0")),
+        'CONN_HEALTH_CHECKS': env_bool("POSTGRES_CONN_HEALTH_CHECKS", default=True),
+    }
+}
+
+# Optional read replica for analytics reads (see config/db_routers.py). Pointing
+# POSTGRES_REPLICA_HOST at the primary itself gives a working two-alias setup locally.
+if os.getenv("POSTGRES_REPLICA_HOST"):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv("POSTGRES_REPLICA_DB", DATABASES['default']['NAME']),
+        'USER': os.getenv("POSTGRES_REPLICA_USER", DATABASES['default']['USER']),
+        'PASSWORD': os.getenv("POSTGRES_REPLICA_PASSWORD", DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv("POSTGRES_REPLICA_HOST"),
+        'PORT': os.getenv("POSTGRES_REPLICA_PORT", DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ["config.db_routers.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Defaults to a per-process memory cache. With several worker processes point it
+# at something shared, e.g. DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and DJANGO_CACHE_LOCATION=redis://redis:6379/1, or a FileBasedCache directory.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.getenv("DJANGO_CACHE_LOCATION", ""),
+        'KEY_PREFIX': 'journal',
     }
 }
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith(".LocMemCache")
+
+# The throttling counters and slots (config.throttling) need atomic add() and incr().
+# Redis and memcached provide that across workers. The file and database caches
+# don't (each is a read followed by a write) and cull keys once MAX_ENTRIES is
+# reached, so with them every worker process enforces the limits on its own, in memory.
+THROTTLE_SHARED = CACHES['default']['BACKEND'].rsplit(".", 1)[-1] in ("RedisCache", "PyMemcacheCache", "PyLibMCCache")
+CACHES['throttle'] = dict(CACHES['default']) if THROTTLE_SHARED else {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'journal-throttle',
+    'OPTIONS': {'MAX_ENTRIES': 100_000},
+}
+
+# Sessions are read on every request; keep them in the cache (written through to
+# the database) once the cache is shared, so logouts reach every worker.
+SESSION_ENGINE = os.getenv(
+    "DJANGO_SESSION_ENGINE",
+    "django.contrib.sessions.backends.cached_db" if SHARED_CACHE else "django.contrib.sessions.backends.db",
+)
+
+# After a write, keep that client's reads on the primary for this many seconds.
+JOURNAL_REPLICA_PIN_SECONDS = int(os.getenv("JOURNAL_REPLICA_PIN_SECONDS", "15"))
+
+# Opt-in range partitioning of journal_trade by entry_time: "month" or "year"
+# (Postgres only; see journal/partitioning.py). Applied by migration 0009 or by
+# "manage.py trade_partitions --convert"; leave empty to keep a plain table.
+JOURNAL_PARTITION_TRADES = os.getenv("JOURNAL_PARTITION_TRADES", "").strip().lower()
 
 
 # Password validation
@@ -146,6 +216,17 @@ STATIC_URL = 'static/'
 
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+STATIC_ROOT = os.getenv("DJANGO_STATIC_ROOT", str(BASE_DIR / "staticfiles"))
+
+# collectstatic writes content-hashed copies plus .gz/.br variants (config/static_assets.py).
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "config.static_assets.CompressedManifestStaticFilesStorage"},
+}
+
+# Serve collected static files from the app (with DEBUG off) when no proxy does it.
+JOURNAL_SERVE_STATIC = env_bool("JOURNAL_SERVE_STATIC", default=True)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -156,7 +237,10 @@ REST_FRAMEWORK = {
 
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly"
-    ]
+    ],
+
+    # Charges API requests to the same per-user budget as the throttled views (config.throttling).
+    "DEFAULT_THROTTLE_CLASSES": ["config.throttling.CostThrottle"],
 }
 
 
@@ -195,4 +279,84 @@ DEFAULT_FROM_EMAIL = "noreply@localhost"
 
 # Make sure dev hostnames are allowed
 ALLOWED_HOSTS = ["localhost", "127.0.0.1"]
-CSRF_TRUSTED_ORIGINS = ["http://localhost:8000", "http://127.0.0.1:8000"]
\ No newline at end of file
+CSRF_TRUSTED_ORIGINS = ["http://localhost:8000", "http://127.0.0.1:8000"]
+
+
+# Journal
+
+# Large deployments: estimated admin counts and index-probed date hierarchy.
+JOURNAL_ADMIN_AT_SCALE = env_bool("JOURNAL_ADMIN_AT_SCALE", default=False)
+JOURNAL_ADMIN_ESTIMATE_THRESHOLD = int(os.getenv("JOURNAL_ADMIN_ESTIMATE_THRESHOLD", "10000"))
+
+
+# Per-view metrics. Set JOURNAL_METRICS_DIR to a directory shared by all worker
+# processes (e.g. a tmpfs) so /metrics aggregates across them.
+JOURNAL_METRICS_DIR = os.getenv("JOURNAL_METRICS_DIR", "")
+JOURNAL_METRICS_FLUSH_INTERVAL = float(os.getenv("JOURNAL_METRICS_FLUSH_INTERVAL", "5"))
+
+# How long the session user and their UserTradeSettings stay cached; 0 disables it.
+JOURNAL_USER_CACHE_SECONDS = int(os.getenv("JOURNAL_USER_CACHE_SECONDS", "60"))
+
+# Responses of @compressed views (config.compression) smaller than this are sent uncompressed.
+JOURNAL_COMPRESS_MIN_BYTES = int(os.getenv("JOURNAL_COMPRESS_MIN_BYTES", "1024"))
+
+# Threads used by async views to run independent queries concurrently (journal.concurrency);
+# 0 (the default) runs them one after another on the request's connection. Each pooled
+# thread holds its own DB connection, so a worker process can open this many on top of
+# its usual one: size max_connections for workers x (JOURNAL_QUERY_WORKERS + 1). With
+# Postgres on the same single core the pool measured about 10% slower (README), so only
+# enable it where the database has spare cores.
+JOURNAL_QUERY_WORKERS = int(os.getenv("JOURNAL_QUERY_WORKERS", "0"))
+
+# Resumable chunked import uploads (journal.uploads): where partial files are kept,
+# the largest file and chunk accepted, how many uploads one user can have at a time,
+# and how long an abandoned upload is kept.
+JOURNAL_UPLOAD_DIR = os.getenv("JOURNAL_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "journal-uploads"))
+JOURNAL_UPLOAD_MAX_BYTES = int(os.getenv("JOURNAL_UPLOAD_MAX_BYTES", str(1024 ** 3)))
+JOURNAL_UPLOAD_CHUNK_BYTES = int(os.getenv("JOURNAL_UPLOAD_CHUNK_BYTES", str(8 * 1024 ** 2)))
+JOURNAL_UPLOAD_MAX_ACTIVE = int(os.getenv("JOURNAL_UPLOAD_MAX_ACTIVE", "2"))
+JOURNAL_UPLOAD_EXPIRE_HOURS = int(os.getenv("JOURNAL_UPLOAD_EXPIRE_HOURS", "24"))
+
+# Quotes for marking open trades to market (journal.quotes): a CSV or JSON snapshot
+# kept current by the market-data process. Quotes older than the TTL aren't used.
+JOURNAL_QUOTES_PATH = os.getenv("JOURNAL_QUOTES_PATH", "")
+JOURNAL_QUOTES_TTL_SECONDS = int(os.getenv("JOURNAL_QUOTES_TTL_SECONDS", "300"))
+JOURNAL_QUOTES_CHECK_SECONDS = float(os.getenv("JOURNAL_QUOTES_CHECK_SECONDS", "2"))
+
+# Staff-only request profiling (config.profiling): ?_profile=1 or an X-Profile: 1 header.
+# Keeps the last JOURNAL_PROFILE_KEEP profiles per process; JOURNAL_PROFILER=0 removes the middleware.
+JOURNAL_PROFILER = env_bool("JOURNAL_PROFILER", default=True)
+JOURNAL_PROFILE_KEEP = int(os.getenv("JOURNAL_PROFILE_KEEP", "50"))
+JOURNAL_PROFILE_INTERVAL = float(os.getenv("JOURNAL_PROFILE_INTERVAL", "0.002"))
+
+# Per-user limits for expensive views (config.throttling): a budget of cost units per
+# window (an export costs 10, a chart request 1) and a cap on concurrent heavy requests.
+# Kept in the "throttle" cache (see THROTTLE_SHARED above); 0 turns either limit off.
+# A heavy request's slot expires after JOURNAL_THROTTLE_LEASE_SECONDS unless renewed;
+# streaming responses renew it as they send, so this only bounds slots of dead workers.
+JOURNAL_THROTTLE_BUDGET = int(os.getenv("JOURNAL_THROTTLE_BUDGET", "300"))
+JOURNAL_THROTTLE_WINDOW = int(os.getenv("JOURNAL_THROTTLE_WINDOW", "60"))
+JOURNAL_THROTTLE_MAX_HEAVY = int(os.getenv("JOURNAL_THROTTLE_MAX_HEAVY", "2"))
+JOURNAL_THROTTLE_LEASE_SECONDS = int(os.getenv("JOURNAL_THROTTLE_LEASE_SECONDS", "120"))
+
+# Live dashboard/chart updates over server-sent events (journal.live, ASGI only).
+# "postgres" fans events out across worker processes with LISTEN/NOTIFY; "memory"
+# keeps them within one process. JOURNAL_LIVE=0 stops publishing them.
+JOURNAL_LIVE = env_bool("JOURNAL_LIVE", default=True)
+JOURNAL_LIVE_BACKEND = os.getenv("JOURNAL_LIVE_BACKEND", "postgres")
+JOURNAL_LIVE_HEARTBEAT_SECONDS = float(os.getenv("JOURNAL_LIVE_HEARTBEAT_SECONDS", "15"))
+
+# Deep health check (/healthz/?deep=1, config.health): the token probes send in the
+# X-Health-Token header (staff users need none; empty means staff only), the time each
+# check gets, and the thresholds past which the instance reports itself degraded.
+JOURNAL_HEALTH_TOKEN = os.getenv("JOURNAL_HEALTH_TOKEN", "")
+JOURNAL_HEALTH_TIMEOUT_SECONDS = float(os.getenv("JOURNAL_HEALTH_TIMEOUT_SECONDS", "2"))
+JOURNAL_HEALTH_SLOW_MS = float(os.getenv("JOURNAL_HEALTH_SLOW_MS", "250"))
+JOURNAL_HEALTH_MAX_CONNECTIONS_RATIO = float(os.getenv("JOURNAL_HEALTH_MAX_CONNECTIONS_RATIO", "0.9"))
+JOURNAL_HEALTH_MAX_IN_FLIGHT = int(os.getenv("JOURNAL_HEALTH_MAX_IN_FLIGHT", "200"))
+
+# Hot/cold archiving (journal.archive, "manage.py archive_trades"): closed trades that exited
+# more than JOURNAL_ARCHIVE_AFTER_DAYS days ago move to journal_trade_archive, in batches of
+# JOURNAL_ARCHIVE_BATCH. 0 leaves every trade in journal_trade.
+JOURNAL_ARCHIVE_AFTER_DAYS = int(os.getenv("JOURNAL_ARCHIVE_AFTER_DAYS", "0"))
+JOURNAL_ARCHIVE_BATCH = int(os.getenv("JOURNAL_ARCHIVE_BATCH", "5000"))
@@ -0,0 +1,126 @@
+"""
+static_assets.py
+
+Fingerprinted, precompressed static files served by the app itself.
+
+CompressedManifestStaticFilesStorage extends Django's manifest storage so
+collectstatic also writes .gz and .br (when the brotli package is installed)
+next to every compressible file. serve() hands those out from STATIC_ROOT,
+picking the best encoding the client accepts. Hashed names never change
+content, so they get a one-year immutable Cache-Control; anything else is
+revalidated after a minute.
+
+Put a proxy or CDN in front for heavy traffic and set JOURNAL_SERVE_STATIC=0.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from .compression import accepted_encodings, brotli
+
+COMPRESSIBLE = {".css", ".js", ".mjs", ".map", ".svg", ".json", ".txt", ".html", ".xml", ".ico"}
+MIN_SIZE = 256  # bytes; below this compression doesn't pay for the extra header
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=60"
+
+
+def _compress(path):
+    """Write path.gz and path.br when they are meaningfully smaller; return the variants written."""
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if len(data) < MIN_SIZE:
+        return []
+    variants = [("gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(("br", brotli.compress(data, quality=11)))
+    written = []
+    for ext, blob in variants:
+        if len(blob) < len(data) * 0.95:
+            with open(f"{path}.{ext}", "wb") as fh:
+                fh.write(blob)
+            written.append(ext)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that precompresses files during collectstatic.
+
+    Without a manifest (collectstatic not run, e.g. in tests) URLs fall back to
+    the plain file names instead of raising.
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        # Compress both the original and the hashed copy; templates rendered with
+        # DEBUG on, and external references, still use the original names.
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE and self.exists(name):
+                _compress(self.path(name))
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+_ENCODINGS = (("br", "br"), ("gzip", "gz"))
+
+
+_hashed_names = (None, frozenset())
+
+
+def _is_hashed(name):
+    """True if name is a fingerprinted file from the manifest."""
+    global _hashed_names
+    files = getattr(staticfiles_storage, "hashed_files", {})
+    if _hashed_names[0] is not files:
+        # Rebuilt only when the storage (and so its manifest) is reloaded.
+        _hashed_names = (files, frozenset(files.values()))
+    return name in _hashed_names[1]
+
+
+@require_safe
+def serve(request, path):
+    """Serve a collected static file, precompressed when possible."""
+    name = posixpath.normpath(path).lstrip("/")
+    try:
+        full = safe_join(settings.STATIC_ROOT, name)
+    except Exception:
+        raise Http404("Not found")
+    if not os.path.isfile(full):
+        raise Http404("Not found")
+
+    mtime = os.stat(full).st_mtime
+    if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), mtime):
+        return HttpResponseNotModified()
+
+    content_type = mimetypes.guess_type(full)[0] or "application/octet-stream"
+    variant, encoding = full, None
+    if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+        accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        for coding, ext in _ENCODINGS:
+            if coding in accepted and os.path.isfile(f"{full}.{ext}"):
+                variant, encoding = f"{full}.{ext}", coding
+                break
+
+    response = FileResponse(open(variant, "rb"), content_type=content_type)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+        response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Last-Modified"] = http_date(mtime)
+    response.headers["Cache-Control"] = IMMUTABLE if _is_hashed(name) else REVALIDATE
+    return response
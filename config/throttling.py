@@ -0,0 +1,227 @@
+"""
+throttling.py
+
+Per-user rate limits and a cap on concurrent heavy requests, kept in the
+"throttle" cache so that, with Redis or memcached, every worker process
+enforces the same limits.
+
+Expensive views are tagged with a cost, @throttled(HEAVY) or a function of
+the request. Each user may spend JOURNAL_THROTTLE_BUDGET cost units per
+JOURNAL_THROTTLE_WINDOW seconds (one cache counter per user and fixed
+window), and may have at most JOURNAL_THROTTLE_MAX_HEAVY requests costing
+HEAVY or more in flight at once. A request over either limit gets a 429 with
+Retry-After before the view runs, so it never reaches the database. Rejected
+requests aren't charged. CostThrottle charges DRF views against the same
+budget. Setting the budget or the cap to 0 turns that limit off.
+
+In-flight heavy requests hold one of MAX_HEAVY slot keys, taken with
+cache.add(). A slot is freed when the response is closed, after the last chunk
+of a streaming response, and a stream renews its lease while it is sent. If a
+worker dies holding one, it expires after JOURNAL_THROTTLE_LEASE_SECONDS.
+
+The counters rely on add() and incr() being atomic, which holds for Redis,
+memcached and the in-process LocMemCache but not for the file or database
+caches. settings.CACHES["throttle"] is therefore the default cache only when
+that is Redis or memcached (settings.THROTTLE_SHARED); otherwise it is a
+per-process LocMemCache and each worker enforces the limits on its own.
+"""
+import math
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.connection import ConnectionProxy
+from rest_framework.throttling import BaseThrottle
+
+LIGHT = 1
+HEAVY = 10
+BUSY_RETRY_SECONDS = 2  # Retry-After when all heavy slots are taken
+
+cache = ConnectionProxy(caches, "throttle")
+
+
+def _ident(request, user):
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _cost(cost, request):
+    return cost(request) if callable(cost) else cost
+
+
+def charge(ident, cost, now=None):
+    """
+    Spend cost units of ident's budget for the current window. Returns 0 when
+    allowed, else the seconds until the window ends (nothing is spent).
+    """
+    budget, window = settings.JOURNAL_THROTTLE_BUDGET, settings.JOURNAL_THROTTLE_WINDOW
+    if not budget or not cost:
+        return 0
+    now = time.time() if now is None else now
+    period = int(now // window)
+    key = f"journal:throttle:spent:{ident}:{period}"
+    cache.add(key, 0, window + 1)
+    try:
+        spent = cache.incr(key, cost)
+    except ValueError:  # expired between add() and incr()
+        cache.set(key, cost, window + 1)
+        spent = cost
+    if spent <= budget:
+        return 0
+    cache.decr(key, cost)
+    return max(1, math.ceil((period + 1) * window - now))
+
+
+class _Slot:
+    """One of the user's heavy-request slots; release() is idempotent."""
+    def __init__(self, key, token):
+        self.key, self.token = key, token
+        self._renewed = time.monotonic()
+
+    def renew_due(self):
+        """Whether the lease should be renewed: every third of it, so it never lapses mid-stream."""
+        return bool(self.key) and time.monotonic() - self._renewed >= settings.JOURNAL_THROTTLE_LEASE_SECONDS / 3
+
+    def renew(self):
+        self._renewed = time.monotonic()
+        if self.key and cache.get(self.key) == self.token:
+            cache.touch(self.key, settings.JOURNAL_THROTTLE_LEASE_SECONDS)
+
+    def release(self):
+        if self.key and cache.get(self.key) == self.token:
+            cache.delete(self.key)
+        self.key = None
+
+
+def take_slot(ident):
+    """A free heavy-request slot for ident, or None when all are taken."""
+    token = uuid.uuid4().hex
+    for i in range(settings.JOURNAL_THROTTLE_MAX_HEAVY):
+        key = f"journal:throttle:slot:{ident}:{i}"
+        if cache.add(key, token, settings.JOURNAL_THROTTLE_LEASE_SECONDS):
+            return _Slot(key, token)
+    return None
+
+
+def _admit(ident, cost):
+    """(slot or None, None) to go ahead, or (None, 429 response)."""
+    slot = None
+    if cost >= HEAVY and settings.JOURNAL_THROTTLE_MAX_HEAVY:
+        slot = take_slot(ident)
+        if slot is None:
+            return None, _too_many("Too many expensive requests in progress.", BUSY_RETRY_SECONDS)
+    retry_after = charge(ident, cost)
+    if retry_after:
+        if slot:
+            slot.release()
+        return None, _too_many("Request rate limit exceeded.", retry_after)
+    return slot, None
+
+
+def _too_many(message, retry_after):
+    response = JsonResponse({"error": message, "retry_after": retry_after}, status=429)
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+class _ReleasingIterator:
+    """Streaming content that frees the slot when Django closes the response."""
+    def __init__(self, chunks, slot):
+        self._chunks, self._slot = iter(chunks), slot
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._slot.renew_due():
+            self._slot.renew()
+        return next(self._chunks)
+
+    def close(self):
+        self._slot.release()
+
+
+class _AsyncReleasingIterator:
+    def __init__(self, chunks, slot):
+        self._chunks, self._slot = aiter(chunks), slot
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._slot.renew_due():
+            await sync_to_async(self._slot.renew)()
+        return await anext(self._chunks)
+
+    def close(self):
+        self._slot.release()
+
+
+def _hold_until_sent(response, slot):
+    if slot is None:
+        return response
+    if not response.streaming:
+        slot.release()
+    elif response.is_async:
+        response.streaming_content = _AsyncReleasingIterator(response.streaming_content, slot)
+    else:
+        response.streaming_content = _ReleasingIterator(response.streaming_content, slot)
+    return response
+
+
+def throttled(cost):
+    """
+    Decorator for expensive views (sync or async); cost is a number of budget
+    units or a function of the request returning one. Place it under
+    @login_required so requests are counted per user.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def _wrapped(request, *args, **kwargs):
+                ident = _ident(request, await request.auser())
+                slot, refused = await sync_to_async(_admit)(ident, _cost(cost, request))
+                if refused:
+                    return refused
+                try:
+                    response = await view(request, *args, **kwargs)
+                except BaseException:
+                    if slot:
+                        await sync_to_async(slot.release)()
+                    raise
+                if slot and not response.streaming:
+                    await sync_to_async(slot.release)()
+                    return response
+                return _hold_until_sent(response, slot)
+        else:
+            @wraps(view)
+            def _wrapped(request, *args, **kwargs):
+                slot, refused = _admit(_ident(request, request.user), _cost(cost, request))
+                if refused:
+                    return refused
+                try:
+                    response = view(request, *args, **kwargs)
+                except BaseException:
+                    if slot:
+                        slot.release()
+                    raise
+                return _hold_until_sent(response, slot)
+        _wrapped.throttle_cost = cost
+        return _wrapped
+    return decorator
+
+
+class CostThrottle(BaseThrottle):
+    """DRF throttle charging the view's throttle_cost (default LIGHT) to the user's budget."""
+    def allow_request(self, request, view):
+        cost = _cost(getattr(view, "throttle_cost", LIGHT), request)
+        self._retry_after = charge(_ident(request, request.user), cost)
+        return not self._retry_after
+
+    def wait(self):
+        return self._retry_after
@@ -14,12 +14,28 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from django.urls import path, include, re_path
+from config.metrics import metrics_view
+from config.profiling import profile_detail, profile_list
+from config.static_assets import serve as serve_static
 
 urlpatterns = [
+    # Before admin.site.urls, whose catch-all would otherwise take these.
+    path("admin/profiles/", profile_list, name="profile_list"),
+    path("admin/profiles/<str:profile_id>/", profile_detail, name="profile_detail"),
     path('admin/', admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("accounts/", include("allauth.urls")),
     path("api-auth/", include("rest_framework.urls")),
     path("", include("journal.urls"))
 ]
+
+if settings.DEBUG:
+    # runserver serves static files itself; this covers gunicorn/uvicorn in DEBUG.
+    urlpatterns += staticfiles_urlpatterns()
+elif settings.JOURNAL_SERVE_STATIC:
+    # Collected, fingerprinted and precompressed files (see config.static_assets).
+    urlpatterns += [re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.*)$", serve_static, name="static")]
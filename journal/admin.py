@@ -1,8 +1,12 @@
+from datetime import datetime, timedelta
 from django.contrib import admin
-from .models import Trade, UserTradeSettings
-from django.db.models import (
-    F, Q, Value, Case, When, DecimalField, ExpressionWrapper
-)
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import PNL_EXPR, Trade, UserTradeSettings
+from django.db.models import F, Q, Min, Max
 from allauth.account.models import EmailAddress, EmailConfirmation
 from allauth.account.admin import EmailAddressAdmin, EmailConfirmationAdmin
 from allauth.socialaccount.models import SocialApp, SocialAccount, SocialToken
@@ -20,10 +24,13 @@ class StatusFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         """Filter queryset by open or closed status."""
+        # exit_price/exit_time are set together (trade_exit_fields_both_or_neither),
+        # so exit_price alone decides; "open" is then exactly the predicate of the
+        # partial index trade_open_entry_idx.
         if self.value() == "open":
-            return queryset.filter(exit_price__isnull=True, exit_time__isnull=True)
+            return queryset.filter(exit_price__isnull=True)
         if self.value() == "closed":
-            return queryset.filter(Q(exit_price__isnull=False) | Q(exit_time__isnull=False))
+            return queryset.filter(exit_price__isnull=False)
         return queryset
 
 class PnLFilter(admin.SimpleListFilter):
@@ -36,14 +43,108 @@ class PnLFilter(admin.SimpleListFilter):
         return (("g", "Gain (≥ 0)"), ("l", "Loss (< 0)"))
 
     def queryset(self, request, queryset):
-        """Filter queryset by PnL value."""
+        """
+        Filter queryset by PnL sign.
+        Quantity is always > 0, so the sign only depends on side and the
+        exit/entry price comparison; this avoids filtering on the Case annotation.
+        """
+        closed = Q(exit_price__isnull=False)
         if self.value() == "g":
-            return queryset.filter(pnl_value__gte=0)
+            return queryset.filter(closed & (
+                Q(side="BUY", exit_price__gte=F("price")) | Q(side="SELL", exit_price__lte=F("price"))
+            ))
         if self.value() == "l":
-            return queryset.filter(pnl_value__lt=0)
+            return queryset.filter(closed & (
+                Q(side="BUY", exit_price__lt=F("price")) | Q(side="SELL", exit_price__gt=F("price"))
+            ))
         return queryset
 
 
+def _at_scale():
+    """Return True when the admin should avoid full counts and DISTINCT date scans."""
+    return getattr(settings, "JOURNAL_ADMIN_AT_SCALE", False)
+
+
+def estimated_count(queryset):
+    """
+    Return a row estimate for queryset from Postgres statistics, or None.
+    Unfiltered querysets use pg_class.reltuples; filtered ones use the planner's
+    row estimate from EXPLAIN. Other backends return None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # reltuples is -1 for tables that have never been analyzed.
+            return row[0] if row and row[0] >= 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts Postgres estimates for large result sets.
+    Below JOURNAL_ADMIN_ESTIMATE_THRESHOLD rows the exact COUNT(*) is cheap and used instead.
+    """
+
+    @cached_property
+    def count(self):
+        threshold = getattr(settings, "JOURNAL_ADMIN_ESTIMATE_THRESHOLD", 10000)
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < threshold:
+            return super().count
+        return estimate
+
+
+def _bucket_start(dt, kind):
+    tz = timezone.get_current_timezone()
+    if kind == "year":
+        return datetime(dt.year, 1, 1, tzinfo=tz)
+    if kind == "month":
+        return datetime(dt.year, dt.month, 1, tzinfo=tz)
+    return datetime(dt.year, dt.month, dt.day, tzinfo=tz)
+
+
+def _next_bucket(dt, kind):
+    if kind == "year":
+        return dt.replace(year=dt.year + 1)
+    if kind == "month":
+        return dt.replace(year=dt.year + 1, month=1) if dt.month == 12 else dt.replace(month=dt.month + 1)
+    return _bucket_start(dt + timedelta(days=1), "day")
+
+
+class IndexedDateHierarchyQuerySet(models.QuerySet):
+    """
+    QuerySet whose datetimes() probes each bucket with an indexed EXISTS
+    instead of running SELECT DISTINCT date_trunc(...) over every row.
+    Used by the admin date hierarchy in at-scale mode.
+    """
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        if kind not in {"year", "month", "day"}:
+            return super().datetimes(field_name, kind, order=order, tzinfo=tzinfo)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds["first"] is None:
+            return []
+        last = timezone.localtime(bounds["last"])
+        cursor = _bucket_start(timezone.localtime(bounds["first"]), kind)
+        buckets = []
+        while cursor <= last:
+            upper = _next_bucket(cursor, kind)
+            if self.filter(**{f"{field_name}__gte": cursor, f"{field_name}__lt": upper}).exists():
+                buckets.append(cursor)
+            cursor = upper
+        return buckets[::-1] if order == "DESC" else buckets
+
+
 @admin.register(UserTradeSettings)
 class UserTradeSettingsAdmin(admin.ModelAdmin):
     """Admin configuration for UserTradeSettings model."""
@@ -65,6 +166,7 @@ class TradeAdmin(admin.ModelAdmin):
     date_hierarchy = "entry_time"
     ordering = ("-entry_time",)
     list_per_page = 25
+    list_select_related = ("owner",)
     autocomplete_fields = ("owner",)
     readonly_fields = ("owner", "created_at",)
     fieldsets = (
@@ -79,25 +181,25 @@ class TradeAdmin(admin.ModelAdmin):
         }),
     )
 
+    @property
+    def show_full_result_count(self):
+        """Skip the unfiltered COUNT(*) next to the filtered count when at scale."""
+        return not _at_scale()
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        """Use estimated counts for large changelists when at scale."""
+        paginator_class = EstimatedCountPaginator if _at_scale() else self.paginator
+        return paginator_class(queryset, per_page, orphans, allow_empty_first_page)
+
     def get_queryset(self, request):
         """
-        Annotate queryset with PnL value for admin display and filtering.
-        BUY:  (exit - entry) * qty
-        SELL: (entry - exit) * qty
-        If exit_price is NULL (open trade), PnL is NULL.
+        Annotate queryset with PnL value (models.PNL_EXPR) for admin display
+        and ordering. Open trades have NULL PnL.
         """
         qs = super().get_queryset(request)
-        buy_expr  = (F("exit_price") - F("price")) * F("quantity")
-        sell_expr = (F("price") - F("exit_price")) * F("quantity")
-
-        pnl_case = Case(
-            When(exit_price__isnull=True, then=Value(None)),
-            When(side="BUY",  then=ExpressionWrapper(buy_expr,  output_field=DecimalField(max_digits=12, decimal_places=2))),
-            When(side="SELL", then=ExpressionWrapper(sell_expr, output_field=DecimalField(max_digits=12, decimal_places=2))),
-            default=Value(None),
-            output_field=DecimalField(max_digits=12, decimal_places=2),
-        )
-        return qs.annotate(pnl_value=pnl_case)
+        if _at_scale():
+            qs = IndexedDateHierarchyQuerySet(model=qs.model, query=qs.query, using=qs._db)
+        return qs.annotate(pnl_value=PNL_EXPR)
 
     def pnl(self, obj):
         """Return annotated PnL value for display."""
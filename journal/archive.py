@@ -0,0 +1,272 @@
+"""
+Hot/cold archiving of old closed trades (Postgres only).
+
+journal_trade holds the trades people actually look at: open ones and those
+closed within the last JOURNAL_ARCHIVE_AFTER_DAYS days. The archive_trades
+command moves every trade that exited before that horizon into
+journal_trade_archive, a batch at a time, and adds it to the per-day totals in
+journal_trade_rollup (models.TradeRollup) in the same statement. restore()
+moves trades back and takes them out of the totals again.
+
+Reads stay on journal_trade unless their date range starts before the
+horizon; trades() then returns the journal_trade_history view
+(models.TradeHistory), which reads both tables. The dashboard totals, the
+calendar and the daily PnL chart answer the archived part from the rollups
+instead, so they never read archived trades one by one.
+
+Every archived trade exited before the horizon of the run that archived it,
+which is never later than today's horizon, and entered no later than it
+exited; reads rely on both, since they pick the tables by entry time. A run
+therefore first restores what is now inside the horizon, along with archived
+trades that exit before they enter, swaps the times of those
+(partitioning.swap_reversed_times()) and only archives trades that pass. So
+lengthening JOURNAL_ARCHIVE_AFTER_DAYS needs a run of archive_trades, and
+turning archiving off needs archive_trades --restore.
+
+Each rollup records the time zone its day was bucketed in. When TIME_ZONE
+changes, the next run of archive_trades rebuilds them from the archive before
+moving anything; until then the daily totals of archived days stay in the old
+zone.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import partitioning
+from .models import Trade, TradeHistory, TradeRollup
+
+TABLE = "journal_trade"
+ARCHIVE_TABLE = "journal_trade_archive"
+ROLLUP_TABLE = "journal_trade_rollup"
+
+# The columns both tables share; journal_trade also has the symbol text, which
+# its symbol-interning trigger derives symbol_id from.
+_COLUMNS = (
+    "id", "owner_id", "symbol_id", "side", "quantity", "entry_time", "price",
+    "exit_price", "exit_time", "created_at", "notes", "tags",
+)
+
+# Each moved batch's contribution to the rollups, as PNL_EXPR computes PnL and
+# TruncDate buckets the exit time (in the zone named by the statement's zone CTE).
+_ROLLUP_DELTA = """
+SELECT owner_id, day, count(*) AS trades, count(*) FILTER (WHERE pnl > 0) AS wins, sum(pnl) AS pnl
+FROM (
+    SELECT owner_id, (exit_time AT TIME ZONE (SELECT name FROM zone))::date AS day,
+           CASE side WHEN 'BUY' THEN (exit_price - price) * quantity
+                     ELSE (price - exit_price) * quantity END AS pnl
+    FROM moved
+) AS m
+GROUP BY owner_id, day
+"""
+
+# Batches walk the primary key, which leads with id on a partitioned table too,
+# and skip trades someone is editing; the next run picks those up.
+_ARCHIVE_SQL = f"""
+WITH zone AS (SELECT %s::text AS name), batch AS (
+    SELECT id FROM {TABLE}
+    WHERE id > %s AND exit_time < %s AND entry_time <= exit_time AND owner_id IS NOT NULL
+    ORDER BY id LIMIT %s
+    FOR UPDATE SKIP LOCKED
+), moved AS (
+    DELETE FROM {TABLE} USING batch WHERE {TABLE}.id = batch.id
+    RETURNING {TABLE}.*
+), archived AS (
+    INSERT INTO {ARCHIVE_TABLE} ({", ".join(_COLUMNS)})
+    SELECT {", ".join(_COLUMNS)} FROM moved
+), rolled AS (
+    INSERT INTO {ROLLUP_TABLE} (owner_id, day, trades, wins, pnl, time_zone)
+    SELECT delta.*, zone.name FROM ({_ROLLUP_DELTA}) AS delta, zone
+    ON CONFLICT (owner_id, day) DO UPDATE SET
+        trades = {ROLLUP_TABLE}.trades + excluded.trades,
+        wins = {ROLLUP_TABLE}.wins + excluded.wins,
+        pnl = {ROLLUP_TABLE}.pnl + excluded.pnl
+)
+SELECT max(id), count(*) FROM moved
+"""
+
+_RESTORE_SQL = f"""
+WITH zone AS (SELECT %s::text AS name), batch AS (
+    SELECT id FROM {ARCHIVE_TABLE}
+    WHERE id > %s{{where}}
+    ORDER BY id LIMIT %s
+    FOR UPDATE SKIP LOCKED
+), moved AS (
+    DELETE FROM {ARCHIVE_TABLE} USING batch WHERE {ARCHIVE_TABLE}.id = batch.id
+    RETURNING {ARCHIVE_TABLE}.*
+), restored AS (
+    INSERT INTO {TABLE} (symbol, {", ".join(_COLUMNS)})
+    SELECT journal_symbol.name, {", ".join(f"moved.{column}" for column in _COLUMNS)}
+    FROM moved JOIN journal_symbol ON journal_symbol.id = moved.symbol_id
+), rolled AS (
+    UPDATE {ROLLUP_TABLE} SET
+        trades = {ROLLUP_TABLE}.trades - delta.trades,
+        wins = {ROLLUP_TABLE}.wins - delta.wins,
+        pnl = {ROLLUP_TABLE}.pnl - delta.pnl
+    FROM ({_ROLLUP_DELTA}) AS delta
+    WHERE {ROLLUP_TABLE}.owner_id = delta.owner_id AND {ROLLUP_TABLE}.day = delta.day
+)
+SELECT max(id), count(*) FROM moved
+"""
+
+_REBUILD_SQL = f"""
+WITH zone AS (SELECT %s::text AS name), moved AS (SELECT * FROM {ARCHIVE_TABLE})
+INSERT INTO {ROLLUP_TABLE} (owner_id, day, trades, wins, pnl, time_zone)
+SELECT delta.*, zone.name FROM ({_ROLLUP_DELTA}) AS delta, zone
+"""
+
+
+def enabled():
+    return settings.JOURNAL_ARCHIVE_AFTER_DAYS > 0
+
+
+def horizon(now=None):
+    """
+    Start of the local day JOURNAL_ARCHIVE_AFTER_DAYS before today: trades
+    that exited earlier belong in the archive. None when archiving is off.
+    """
+    if not enabled():
+        return None
+    day = timezone.localdate(now) - timedelta(days=settings.JOURNAL_ARCHIVE_AFTER_DAYS)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def reaches(since):
+    """
+    Whether a date range starting at since (an aware datetime, a date, or
+    None for no lower bound) may include archived trades.
+    """
+    cutoff = horizon()
+    if cutoff is None:
+        return False
+    if since is None:
+        return True
+    if not isinstance(since, datetime):
+        since = timezone.make_aware(datetime.combine(since, time.min))
+    return since < cutoff
+
+
+def trades(since=None):
+    """
+    The manager to read trades from when the date range starts at since:
+    TradeHistory's if the range reaches into the archive, else Trade's.
+    """
+    return (TradeHistory if reaches(since) else Trade).objects
+
+
+def rollups(user, first=None, last=None):
+    """user's archived daily totals, optionally for the days first..last (inclusive)."""
+    qs = TradeRollup.objects.filter(owner=user)
+    if first is not None:
+        qs = qs.filter(day__gte=first)
+    if last is not None:
+        qs = qs.filter(day__lte=last)
+    return qs
+
+
+def totals(user):
+    """{"trades", "wins", "pnl"} over all of user's archived trades (zeros when archiving is off)."""
+    if not enabled():
+        return {"trades": 0, "wins": 0, "pnl": 0}
+    agg = rollups(user).aggregate(trades=Sum("trades"), wins=Sum("wins"), pnl=Sum("pnl"))
+    return {"trades": agg["trades"] or 0, "wins": agg["wins"] or 0, "pnl": agg["pnl"] or 0}
+
+
+def _move(sql, params, batch_size):
+    """Run sql one batch of batch_size trades at a time, each in its own transaction; returns the total moved."""
+    last_id, total = 0, 0
+    while True:
+        with transaction.atomic(), connection.cursor() as c:
+            c.execute(sql, [timezone.get_current_timezone_name(), *params(last_id), batch_size])
+            batch_last, moved = c.fetchone()
+        if not moved:
+            return total
+        last_id, total = batch_last, total + moved
+
+
+def rebuild_rollups():
+    """
+    Recompute the rollups from the archive if any were bucketed in another
+    time zone than the current one. Returns whether they were rebuilt.
+    """
+    zone = timezone.get_current_timezone_name()
+    with transaction.atomic():
+        if not TradeRollup.objects.exclude(time_zone=zone).exists():
+            return False
+        with connection.cursor() as c:
+            c.execute(f"LOCK TABLE {ARCHIVE_TABLE}, {ROLLUP_TABLE} IN EXCLUSIVE MODE")
+            c.execute(f"DELETE FROM {ROLLUP_TABLE}")
+            c.execute(_REBUILD_SQL, [zone])
+    return True
+
+
+def archive(batch_size=None, now=None):
+    """
+    Move every closed trade that exited before the horizon into the archive,
+    after restoring archived trades the horizon no longer covers and those
+    that exit before they enter. Returns (archived, restored).
+    """
+    cutoff = horizon(now)
+    if cutoff is None:
+        raise ValueError("Archiving is off; set JOURNAL_ARCHIVE_AFTER_DAYS.")
+    batch_size = batch_size or settings.JOURNAL_ARCHIVE_BATCH
+    restored = restore(since=cutoff, batch_size=batch_size)
+    restored += _restore(" AND exit_time < entry_time", [], batch_size)
+    partitioning.swap_reversed_times()
+    archived = _move(_ARCHIVE_SQL, lambda last_id: [last_id, cutoff], batch_size)
+    return archived, restored
+
+
+def restore(since=None, user=None, batch_size=None):
+    """
+    Move archived trades back into journal_trade: those that exited at or
+    after since, of user, or all of them. Returns how many were restored.
+    """
+    where, extra = "", []
+    if since is not None:
+        where += " AND exit_time >= %s"
+        extra.append(since)
+    if user is not None:
+        where += " AND owner_id = %s"
+        extra.append(user.pk)
+    return _restore(where, extra, batch_size or settings.JOURNAL_ARCHIVE_BATCH)
+
+
+def _restore(where, extra, batch_size):
+    # Restoring takes each trade out of its day's rollup, which must be in the current zone.
+    rebuild_rollups()
+    restored = _move(_RESTORE_SQL.format(where=where), lambda last_id: [last_id, *extra], batch_size)
+    if restored:
+        TradeRollup.objects.filter(trades=0).delete()
+    return restored
+
+
+def status(now=None):
+    """Row counts and on-disk sizes of the hot table and the archive, for the archive_trades command."""
+    cutoff = horizon(now)
+    with connection.cursor() as c:
+        c.execute(
+            f"SELECT count(*), count(*) FILTER (WHERE exit_time < %s) FROM {TABLE}",
+            [cutoff],  # None (archiving off) counts nothing as due
+        )
+        hot, due = c.fetchone()
+        c.execute(f"SELECT count(*) FROM {ARCHIVE_TABLE}")
+        archived = c.fetchone()[0]
+        # A partitioned journal_trade is the sum of its partitions; pg_partition_tree() lists none for a plain one.
+        c.execute(
+            "SELECT coalesce((SELECT sum(pg_total_relation_size(relid)) FROM pg_partition_tree(%s) WHERE isleaf), "
+            "pg_total_relation_size(%s)), pg_total_relation_size(%s), current_setting('shared_buffers')",
+            [TABLE, TABLE, ARCHIVE_TABLE],
+        )
+        hot_bytes, archive_bytes, shared_buffers = c.fetchone()
+    return {
+        "horizon": cutoff,
+        "hot": hot,
+        "due": due,
+        "archived": archived,
+        "hot_bytes": int(hot_bytes),
+        "archive_bytes": int(archive_bytes),
+        "shared_buffers": shared_buffers,
+    }
@@ -0,0 +1,103 @@
+"""
+Short-lived caching of the per-request user and trade-settings lookups.
+
+Every authenticated request loads the user row, and the trade form and profile
+pages also load UserTradeSettings. Both change rarely, so they are kept in the
+default cache for JOURNAL_USER_CACHE_SECONDS and dropped by the post_save /
+post_delete handlers in journal.signals whenever they change.
+
+The session user is cached by config.middleware.CachedAuthenticationMiddleware,
+in front of the stock authentication backends. The entry holds the user's
+fields without the password hash, plus the session auth hash that
+django.contrib.auth checks each session against.
+
+With the per-process LocMemCache, other worker processes may serve a stale copy
+until it expires; configure a shared cache (DJANGO_CACHE_BACKEND) when running
+several workers.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import constant_time_compare
+
+from .models import UserTradeSettings
+
+_MISSING = object()
+
+
+def _ttl():
+    return getattr(settings, "JOURNAL_USER_CACHE_SECONDS", 60)
+
+
+def _user_key(user_id):
+    return f"journal:user:{user_id}"
+
+
+def _settings_key(user_id):
+    return f"journal:trade_settings:{user_id}"
+
+
+def _user_entry(user):
+    # The password stays out: it is left deferred on cached users and only
+    # loaded if something (a password change, login) reads it.
+    fields = {f.attname: getattr(user, f.attname) for f in user._meta.concrete_fields if f.name != "password"}
+    return {
+        "fields": fields,
+        "session_hash": user.get_session_auth_hash(),
+        "usable_password": user.has_usable_password(),
+    }
+
+
+def get_session_user(request):
+    """
+    django.contrib.auth.get_user() with the user served from the cache while
+    the session's auth hash still matches; falls back to it (a query, plus the
+    session checks and flushes it does) otherwise.
+    """
+    if not _ttl():
+        return auth.get_user(request)
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    if user_id is None:
+        return auth.get_user(request)
+    entry = cache.get(_user_key(user_id))
+    session_hash = session.get(auth.HASH_SESSION_KEY)
+    if (entry is not None and session_hash and session.get(auth.BACKEND_SESSION_KEY) in settings.AUTHENTICATION_BACKENDS
+            and constant_time_compare(session_hash, entry["session_hash"])):
+        fields = entry["fields"]
+        user = get_user_model().from_db(DEFAULT_DB_ALIAS, list(fields), list(fields.values()))
+        # The admin header and the profile page ask this on every request; answer it
+        # without loading the deferred password.
+        user.has_usable_password = lambda: entry["usable_password"]
+        return user
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(_user_key(user.pk), _user_entry(user), _ttl())
+    return user
+
+
+def get_trade_settings(user, create=False):
+    """
+    Return the user's UserTradeSettings (cached), or None if they have none.
+    With create=True a missing row is created, as for users that predate the
+    post_save handler.
+    """
+    key = _settings_key(user.pk)
+    obj = cache.get(key, _MISSING) if _ttl() else _MISSING
+    if obj is _MISSING:
+        obj = UserTradeSettings.objects.filter(user_id=user.pk).first()
+        if _ttl():
+            cache.set(key, obj, _ttl())
+    if obj is None and create:
+        obj, _ = UserTradeSettings.objects.get_or_create(user=user)
+    return obj
+
+
+def invalidate_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+def invalidate_trade_settings(user_id):
+    cache.delete(_settings_key(user_id))
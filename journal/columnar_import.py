@@ -0,0 +1,271 @@
+"""
+Parquet, Arrow and JSON-lines trade imports, validated a column at a time.
+
+The CSV/XLSX import (journal.importing) coerces and checks each row in a
+Python loop. Columnar files arrive typed, so here each column is normalized
+once with pyarrow.compute and every rule becomes a boolean mask over the
+whole upload. Python objects are only built for the rows shown in the preview
+and, on commit, for the rows being inserted.
+
+Needs pyarrow; AVAILABLE is False without it.
+"""
+import os
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .importing import COLUMNAR_EXTENSIONS as EXTENSIONS
+from .models import Trade
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+except ImportError:  # optional; CSV and XLSX imports work without it
+    pa = None
+
+AVAILABLE = pa is not None
+
+COLUMNS = ["entry_time", "symbol", "side", "quantity", "price", "exit_price", "exit_time", "notes"]
+REQUIRED = [c for c in COLUMNS if c != "notes"]
+TIME_COLUMNS = ("entry_time", "exit_time")
+NUMBER_COLUMNS = ("quantity", "price", "exit_price")
+
+# Wide enough for any int64 or the model's decimal fields; values are rounded on save.
+_NUMBER = pa.decimal128(38, 6) if AVAILABLE else None
+_UTC = pa.timestamp("us", tz="UTC") if AVAILABLE else None
+_NUMBER_RE = r"^[+-]?(\d+\.?\d*|\.\d+)$"
+_OFFSET_RE = r"(Z|[+-]\d{2}:?\d{2})$"
+
+
+class ImportFileError(ValueError):
+    """The upload can't be read or lacks required columns."""
+
+
+def handles(filename):
+    return os.path.splitext(filename.lower())[1] in EXTENSIONS
+
+
+def read_table(upload):
+    """Read an uploaded Parquet, Arrow IPC/Feather or JSONL file into a table of COLUMNS."""
+    ext = os.path.splitext(upload.name.lower())[1]
+    fh = upload.file
+    try:
+        if ext == ".parquet":
+            present = set(pq.read_schema(fh).names)
+            fh.seek(0)
+            _check_columns(present)
+            # Only the columns we use are decoded.
+            table = pq.read_table(fh, columns=[c for c in COLUMNS if c in present])
+        elif ext in (".arrow", ".feather"):
+            table = feather.read_table(fh)
+            _check_columns(set(table.column_names))
+        else:
+            # Timestamps are parsed below; pyarrow's own inference would drop their offsets.
+            schema = pa.schema([(c, pa.string()) for c in TIME_COLUMNS])
+            table = pa_json.read_json(
+                fh, parse_options=pa_json.ParseOptions(explicit_schema=schema),
+            )
+            _check_columns(set(table.column_names))
+    except (pa.ArrowException, OSError) as exc:
+        raise ImportFileError(f"Could not read {ext[1:]} file: {exc}")
+    return table
+
+
+def _check_columns(present):
+    missing = [c for c in REQUIRED if c not in present]
+    if missing:
+        raise ImportFileError(f"Missing required columns: {', '.join(missing)}")
+
+
+def _blank_to_null(arr):
+    arr = pc.utf8_trim_whitespace(arr)
+    return pc.if_else(pc.equal(arr, ""), pa.scalar(None, pa.string()), arr)
+
+
+def _text(table, name):
+    if name not in table.column_names:
+        return pa.nulls(table.num_rows, pa.string())
+    arr = table.column(name).combine_chunks()
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    if not pa.types.is_string(arr.type):
+        arr = pc.cast(arr, pa.string())
+    return _blank_to_null(arr)
+
+
+def _none(n):
+    return pa.repeat(False, n)
+
+
+def _number(arr):
+    """Return (values as decimals, mask of values present but not numbers)."""
+    arr = arr.combine_chunks()
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    if pa.types.is_decimal(arr.type) or pa.types.is_integer(arr.type):
+        return pc.cast(arr, _NUMBER), _none(len(arr))
+    if pa.types.is_floating(arr.type):
+        # NaN and infinities can't be stored; treat them as invalid numbers.
+        bad = pc.fill_null(pc.invert(pc.is_finite(arr)), False)
+        arr = pc.round(pc.if_else(bad, pa.scalar(None, arr.type), arr), 6)
+        return pc.cast(arr, _NUMBER, safe=False), bad
+    text = _blank_to_null(pc.cast(arr, pa.string()))
+    text = pc.replace_substring(text, ",", "")
+    ok = pc.match_substring_regex(text, _NUMBER_RE)
+    values = pc.cast(pc.if_else(ok, text, pa.scalar(None, pa.string())), _NUMBER)
+    return values, pc.fill_null(pc.invert(ok), False)
+
+
+def _localize(arr):
+    """Naive timestamps are wall-clock time in TIME_ZONE, as in the CSV import."""
+    return pc.assume_timezone(
+        arr, settings.TIME_ZONE, ambiguous="earliest", nonexistent="earliest",
+    ).cast(_UTC)
+
+
+def _parse_times_slowly(text):
+    """Per-value fallback for strings Arrow's ISO-8601 cast rejects."""
+    out = []
+    for s in text.to_pylist():
+        dt = None
+        if s is not None:
+            try:
+                dt = parse_datetime(s)
+                if dt is None and parse_date(s) is not None:
+                    dt = parse_datetime(s + "T00:00:00")
+            except ValueError:
+                dt = None
+            if dt is not None and timezone.is_naive(dt):
+                dt = timezone.make_aware(dt)
+        out.append(dt)
+    return pa.array(out, _UTC)
+
+
+def _timestamp(arr):
+    """Return (values as UTC timestamps, mask of values present but not date/times)."""
+    arr = arr.combine_chunks()
+    if pa.types.is_timestamp(arr.type) and arr.type.tz:
+        return pc.cast(arr, _UTC, safe=False), _none(len(arr))
+    if pa.types.is_timestamp(arr.type) or pa.types.is_date(arr.type):
+        return _localize(pc.cast(arr, pa.timestamp("us"), safe=False)), _none(len(arr))
+    text = _blank_to_null(pc.cast(arr, pa.string()))
+    try:
+        with_offset = pc.fill_null(pc.match_substring_regex(text, _OFFSET_RE), False)
+        aware = pc.cast(pc.if_else(with_offset, text, pa.scalar(None, pa.string())), _UTC)
+        naive = _localize(pc.cast(pc.if_else(with_offset, pa.scalar(None, pa.string()), text), pa.timestamp("us")))
+        values = pc.if_else(with_offset, aware, naive)
+    except pa.ArrowInvalid:
+        values = _parse_times_slowly(text)
+    return values, pc.and_(pc.is_valid(text), pc.is_null(values))
+
+
+def _max_value(field):
+    return 10 ** (field.max_digits - field.decimal_places)
+
+
+def normalize(table):
+    """
+    Cleaned columns (upper-cased symbol/side, decimal numbers, UTC timestamps)
+    plus "<column>_invalid" masks for values that were present but unparseable.
+    """
+    cols = {"symbol": pc.utf8_upper(_text(table, "symbol")), "side": pc.utf8_upper(_text(table, "side"))}
+    notes = _text(table, "notes")
+    cols["notes"] = pc.fill_null(notes, "")
+    for name in NUMBER_COLUMNS:
+        cols[name], cols[f"{name}_invalid"] = _number(table.column(name))
+    for name in TIME_COLUMNS:
+        cols[name], cols[f"{name}_invalid"] = _timestamp(table.column(name))
+    return cols
+
+
+def error_masks(cols):
+    """(message, mask) for every rule; a row is valid when no mask is set for it."""
+    fields = {f.name: f for f in Trade._meta.fields}
+    zero = pa.scalar(0, _NUMBER)
+
+    def too_big(name):
+        return pc.greater_equal(pc.abs(cols[name]), pa.scalar(_max_value(fields[name]), _NUMBER))
+
+    exit_price_set = pc.is_valid(cols["exit_price"])
+    exit_time_set = pc.is_valid(cols["exit_time"])
+    masks = [
+        ("symbol required", pc.is_null(cols["symbol"])),
+        (f"symbol longer than {fields['symbol'].max_length} characters",
+         pc.greater(pc.utf8_length(cols["symbol"]), fields["symbol"].max_length)),
+        ("side must be BUY or SELL", pc.invert(pc.is_in(cols["side"], pa.array(["BUY", "SELL"])))),
+        ("quantity required", pc.and_(pc.is_null(cols["quantity"]), pc.invert(cols["quantity_invalid"]))),
+        ("quantity is not a number", cols["quantity_invalid"]),
+        ("quantity must be greater than 0", pc.less_equal(cols["quantity"], zero)),
+        ("quantity too large", too_big("quantity")),
+        ("price required", pc.and_(pc.is_null(cols["price"]), pc.invert(cols["price_invalid"]))),
+        ("price is not a number", cols["price_invalid"]),
+        ("price must be greater than 0", pc.less_equal(cols["price"], zero)),
+        ("price too large", too_big("price")),
+        ("exit_price is not a number", cols["exit_price_invalid"]),
+        ("exit_price must be greater than 0", pc.less_equal(cols["exit_price"], zero)),
+        ("exit_price too large", too_big("exit_price")),
+        ("entry_time required", pc.and_(pc.is_null(cols["entry_time"]), pc.invert(cols["entry_time_invalid"]))),
+        ("entry_time is not a date/time", cols["entry_time_invalid"]),
+        ("exit_time is not a date/time", cols["exit_time_invalid"]),
+        ("exit_price and exit_time must be set together", pc.xor(exit_price_set, exit_time_set)),
+        ("exit_time before entry_time", pc.less(cols["exit_time"], cols["entry_time"])),
+    ]
+    # Comparisons with a null are null; only a definite True is an error.
+    return [(message, pc.fill_null(mask, False)) for message, mask in masks]
+
+
+class ColumnarUpload:
+    """A normalized, validated upload."""
+    def __init__(self, table):
+        self.num_rows = table.num_rows
+        self.cols = normalize(table)
+        self.masks = error_masks(self.cols)
+        invalid = _none(self.num_rows)
+        for _, mask in self.masks:
+            invalid = pc.or_(invalid, mask)
+        self.invalid = invalid
+        self.error_count = pc.sum(invalid).as_py() or 0
+
+    def preview(self, limit):
+        """
+        Up to limit rows in the shape the import template renders: the rows
+        with errors if there are any, otherwise the first rows.
+        """
+        if self.error_count:
+            indices = pc.indices_nonzero(self.invalid).slice(0, limit).to_pylist()
+        else:
+            indices = list(range(min(limit, self.num_rows)))
+        errors = self._errors_for(indices)
+        data = self._rows(pa.array(indices, pa.int64()))
+        return [{"line": i + 1, "data": d, "errors": errors[i]} for i, d in zip(indices, data)]
+
+    def batches(self, size):
+        """Yield lists of trade field dicts, size rows at a time."""
+        for start in range(0, self.num_rows, size):
+            yield self._rows(slice(start, start + size))
+
+    def _errors_for(self, indices):
+        errors = {i: [] for i in indices}
+        if not indices:
+            return errors
+        picks = pa.array(indices, pa.int64())
+        for message, mask in self.masks:
+            for i, hit in zip(indices, pc.take(mask, picks).to_pylist()):
+                if hit:
+                    errors[i].append(message)
+        return errors
+
+    def _rows(self, which):
+        picked = {}
+        for name in COLUMNS:
+            arr = self.cols[name]
+            if isinstance(which, slice):
+                arr = arr.slice(which.start, which.stop - which.start)
+            else:
+                arr = pc.take(arr, which)
+            picked[name] = arr.to_pylist()
+        return [dict(zip(COLUMNS, values)) for values in zip(*(picked[name] for name in COLUMNS))]
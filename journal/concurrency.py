@@ -0,0 +1,63 @@
+"""
+Helpers for async views that run independent ORM queries at the same time.
+
+Django's async ORM methods funnel every query through one thread-sensitive
+executor, so awaiting several of them with asyncio.gather still runs them one
+after another. run_concurrently() instead gives each callable its own worker
+thread, and therefore its own database connection, so the queries really
+overlap on the server.
+
+The worker threads live in one process-wide pool, so with CONN_MAX_AGE > 0
+their connections are reused across requests instead of reconnecting.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+_workers = getattr(settings, "JOURNAL_QUERY_WORKERS", 0)
+# JOURNAL_QUERY_WORKERS=0 (the default) disables the pool and runs queries sequentially.
+_executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="journal-query") if _workers else None
+
+
+def enabled():
+    """Whether run_concurrently() can overlap queries (JOURNAL_QUERY_WORKERS > 0)."""
+    return _executor is not None
+
+
+def _in_own_connection(func):
+    """Wrap func so it runs against, then releases, the worker thread's connection."""
+    def run():
+        close_old_connections()
+        try:
+            return func()
+        finally:
+            # Honors CONN_MAX_AGE: persistent connections stay with the pooled
+            # worker thread, otherwise the connection is closed here.
+            close_old_connections()
+    return run
+
+
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+async def run_concurrently(*funcs):
+    """
+    Run zero-argument callables that issue blocking ORM queries concurrently.
+    Returns their results in order.
+
+    When the request's connection is inside a transaction (ATOMIC_REQUESTS, or
+    the transaction wrapping each TestCase), other connections can't see its
+    uncommitted rows, so the callables run one after another on that connection.
+    """
+    if _executor is None or await sync_to_async(_in_transaction)():
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(
+        *(
+            sync_to_async(_in_own_connection(func), thread_sensitive=False, executor=_executor)()
+            for func in funcs
+        )
+    )
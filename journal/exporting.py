@@ -0,0 +1,198 @@
+"""
+Trade exports as CSV, XLSX and Parquet, each written while reading trades
+through a server-side cursor.
+
+Only the export views import this module, and openpyxl and pyarrow are only
+imported once an export in their format starts, so worker boot and
+autoreload don't pay for them.
+"""
+import csv
+import importlib.util
+import io
+import tempfile
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse
+from django.utils import timezone
+
+HEADER = ["id","entry_time","symbol","side","quantity","price","exit_price","exit_time","pnl","notes"]
+# Without importing it: pyarrow is optional, and only Parquet export needs it.
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+CHUNK_BYTES = 64 * 1024
+
+
+class AsyncChunks:
+    """
+    Async iterator over a sync chunk generator, for responses served under ASGI.
+
+    Django reads a sync streaming_content there by collecting it into a list
+    first, so nothing reaches the client until the whole export is built.
+    This produces one chunk at a time in the request's sync thread, which
+    holds the server-side cursor's connection, and closes the generator
+    (and with it the cursor) when Django closes the response.
+    """
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await sync_to_async(next)(self._chunks, None)
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
+
+    def close(self):
+        self._chunks.close()
+
+
+def csv_chunks(qs):
+    """Yield the export CSV in ~64 KiB pieces, reading trades through a server-side cursor."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(HEADER)
+    for t in qs.iterator(chunk_size=2000):
+        w.writerow([
+            t.id,
+            t.entry_time.isoformat(timespec="seconds"),
+            t.symbol,
+            t.side,
+            t.quantity,
+            t.price,
+            "" if t.exit_price is None else t.exit_price,
+            "" if not t.exit_time else t.exit_time.isoformat(timespec="seconds"),
+            "" if t.pnl_value is None else f"{t.pnl_value:.2f}",
+            (t.notes or "").replace("\r", " ").replace("\n", " "),
+        ])
+        if buf.tell() >= CHUNK_BYTES:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+PNL_QUANT = Decimal("0.01")
+
+
+def _pnl_2dp(value):
+    return None if value is None else value.quantize(PNL_QUANT)
+
+
+def _excel_dt(dt):
+    """Excel has no time zones; write local wall-clock time, which is how the importer reads it back."""
+    return None if dt is None else timezone.make_naive(dt)
+
+
+def xlsx_response(qs):
+    """
+    Build the workbook with openpyxl's write-only mode, which streams rows to a
+    temporary file instead of keeping every cell in memory.
+    """
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("trades")
+    ws.append(HEADER)
+    for t in qs.iterator(chunk_size=2000):
+        ws.append([
+            t.id, _excel_dt(t.entry_time), t.symbol, t.side, t.quantity, t.price,
+            t.exit_price, _excel_dt(t.exit_time), _pnl_2dp(t.pnl_value), t.notes,
+        ])
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return FileResponse(
+        tmp, as_attachment=True, filename="trades_export.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+PARQUET_ROW_GROUP = 50_000
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    ts = pa.timestamp("us", tz="UTC")
+    return pa.schema([
+        ("id", pa.int64()),
+        ("entry_time", ts),
+        ("symbol", pa.string()),
+        ("side", pa.dictionary(pa.int8(), pa.string())),
+        ("quantity", pa.decimal128(10, 2)),
+        ("price", pa.decimal128(10, 4)),
+        ("exit_price", pa.decimal128(10, 4)),
+        ("exit_time", ts),
+        ("pnl", pa.decimal128(18, 2)),
+        ("notes", pa.string()),
+    ])
+
+
+class _ChunkSink:
+    """Write-only file object that collects what ParquetWriter writes until drained."""
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parquet_chunks(qs):
+    """
+    Yield a Parquet file one row group at a time. Trades are read through a
+    server-side cursor and converted to typed Arrow columns in batches, so
+    memory is bounded by PARQUET_ROW_GROUP rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    columns = {name: [] for name in schema.names}
+
+    def flush():
+        writer.write_table(pa.table(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+        return sink.drain()
+
+    for t in qs.iterator(chunk_size=5000):
+        columns["id"].append(t.id)
+        columns["entry_time"].append(t.entry_time)
+        columns["symbol"].append(t.symbol)
+        columns["side"].append(t.side)
+        columns["quantity"].append(t.quantity)
+        columns["price"].append(t.price)
+        columns["exit_price"].append(t.exit_price)
+        columns["exit_time"].append(t.exit_time)
+        columns["pnl"].append(_pnl_2dp(t.pnl_value))
+        columns["notes"].append(t.notes)
+        if len(columns["id"]) >= PARQUET_ROW_GROUP:
+            yield flush()
+    if columns["id"]:
+        yield flush()
+    writer.close()
+    yield sink.drain()
@@ -1,14 +1,35 @@
 from django import forms
-from .models import Trade, UserTradeSettings
+from .caching import get_trade_settings
+from .models import Trade, UserTradeSettings, normalize_tags, validate_tags
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+
+class TagsField(forms.CharField):
+    """Comma-separated tags in the form, a normalized list in cleaned_data."""
+    def __init__(self, *, base_field=None, **kwargs):
+        # ArrayField.formfield() passes its item field; tags are checked by validate_tags().
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        if isinstance(value, (list, tuple)):
+            return ", ".join(value)
+        return value
+
+    def to_python(self, value):
+        tags = normalize_tags((value or "").split(","))
+        validate_tags(tags)
+        return tags
+
+
 class TradeForm(forms.ModelForm):
     """Form for creating and editing Trade instances."""
     class Meta:
         model = Trade
-        fields = ["symbol", "side", "quantity", "price", "entry_time", "exit_price", "exit_time", "notes"]
+        fields = ["symbol", "side", "quantity", "price", "entry_time", "exit_price", "exit_time", "tags", "notes"]
+        field_classes = {"tags": TagsField}
+        help_texts = {"tags": "Comma-separated, e.g. breakout, earnings"}
         widgets = {
             # Nice browser picker; user enters local time
             "entry_time": forms.DateTimeInput(attrs={"type": "datetime-local", "step": 1}),
@@ -20,7 +41,7 @@ class TradeForm(forms.ModelForm):
         user = kwargs.pop("user", None)  # pass request.user from the view
         super().__init__(*args, **kwargs)
         if user and not self.instance.pk:
-            s = getattr(user, "trade_settings", None)
+            s = get_trade_settings(user)
             if s:
                 if s.default_symbol:
                     self.fields["symbol"].initial = s.default_symbol
@@ -40,11 +61,22 @@ class UserTradeSettingsForm(forms.ModelForm):
 
 
 class TradesImportForm(forms.Form):
-    """Form for importing trades from a file (CSV/XLSX)."""
-    file = forms.FileField(help_text="Upload a CSV or XLSX exported from this app.")
+    """Form for importing trades from a file (CSV/XLSX/Parquet/Arrow/JSONL)."""
+    file = forms.FileField(required=False, help_text="Upload a CSV, XLSX or Parquet file exported from this app, or an Arrow or JSONL file.")
+    # Set instead of file when the file was sent in chunks (journal.uploads).
+    upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
     dry_run = forms.BooleanField(required=False, initial=True, help_text="Preview without saving")
     skip_existing = forms.BooleanField(required=False, initial=True, help_text="Skip trades that already exist (by entry time and symbol).")
 
+    def clean(self):
+        """Require either a file or a finished chunked upload."""
+        cleaned = super().clean()
+        if cleaned.get("file"):
+            cleaned["upload"] = None  # a newly chosen file wins
+        elif not cleaned.get("upload"):
+            self.add_error("file", "Choose a file to import.")
+        return cleaned
+
 
 class ProfileForm(forms.ModelForm):
     """Form for editing user profile information."""
@@ -0,0 +1,204 @@
+"""
+CSV and XLSX trade imports: read the rows of an uploaded file, then coerce and
+check each one.
+
+This module, like journal.exporting, is only imported by the views that use
+it, and openpyxl is only imported when an XLSX file arrives, so worker boot
+and autoreload don't pay for either. Columnar files are handled by
+journal.columnar_import, which needs pyarrow.
+"""
+import csv
+import os
+from datetime import date, datetime, timedelta
+from io import TextIOWrapper
+
+from django.utils import timezone
+
+EXPECTED = ["entry_time","symbol","side","quantity","price","exit_price","exit_time","notes"]
+
+# Known here rather than in columnar_import so that checking a file name
+# (journal.uploads) doesn't load pyarrow.
+COLUMNAR_EXTENSIONS = (".parquet", ".arrow", ".feather", ".jsonl", ".ndjson")
+EXTENSIONS = (".csv", ".xlsx") + COLUMNAR_EXTENSIONS
+
+
+def is_columnar(filename):
+    return os.path.splitext(filename.lower())[1] in COLUMNAR_EXTENSIONS
+
+
+def _excel_serial_to_datetime(n: float):
+    """Convert Excel serial date/time to a timezone-aware datetime."""
+    # Excel's day 0 is 1899-12-30 (with the 1900 leap-year bug baked in).
+    origin = datetime(1899, 12, 30)
+    dt = origin + timedelta(days=float(n))
+    # openpyxl/pure Excel serials are naive; make aware in project TZ
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+def _coerce_dt_any(val):
+    """
+    Accepts:
+      - datetime/date objects
+      - Excel serial numbers (int/float)
+      - strings in many common formats
+    Returns a timezone-aware datetime or None.
+    """
+    if val in (None, ""):
+        return None
+
+    # 1) Python datetime/date
+    if isinstance(val, datetime):
+        return timezone.make_aware(val) if timezone.is_naive(val) else val
+    if isinstance(val, date):
+        dt = datetime(val.year, val.month, val.day)
+        return timezone.make_aware(dt)
+
+    # 2) Excel serial (int/float)
+    if isinstance(val, (int, float)):
+        try:
+            return _excel_serial_to_datetime(val)
+        except Exception:
+            pass  # fall through to string parsing
+
+    # 3) Strings
+    s = str(val).strip()
+    # common ISO variants and “datetime-local” variants
+    fmts = [
+        "%Y-%m-%dT%H:%M:%S.%f%z",
+        "%Y-%m-%dT%H:%M:%S%z",
+        "%Y-%m-%dT%H:%M:%S.%f",
+        "%Y-%m-%dT%H:%M:%S",
+        "%Y-%m-%dT%H:%M",
+
+        "%Y-%m-%d %H:%M:%S.%f%z",
+        "%Y-%m-%d %H:%M:%S%z",
+        "%Y-%m-%d %H:%M:%S.%f",
+        "%Y-%m-%d %H:%M:%S",
+        "%Y-%m-%d %H:%M",
+
+        "%Y-%m-%d",  # date-only
+    ]
+    # allow trailing 'Z' for UTC
+    if s.endswith("Z"):
+        s = s[:-1] + "+0000"
+    for fmt in fmts:
+        try:
+            dt = datetime.strptime(s, fmt)
+            # if parsed with %z it’s already aware; else make aware
+            return dt if dt.tzinfo else timezone.make_aware(dt)
+        except ValueError:
+            continue
+
+    return None
+
+
+def _coerce_decimal(s):
+    if s in (None, ""):
+        return None
+    # allow commas, spaces
+    return float(str(s).replace(",", "").strip())
+
+
+def read_rows(f):
+    """
+    Return (rows, [file errors]) for a CSV or XLSX upload, where rows yields
+    (line number, {column: value}) as the file is read, so a large file is
+    never held in memory. There are no rows when a required column is missing.
+    """
+    rows = iter(())
+    errors = []
+    # --- CSV ---
+    if f.name.lower().endswith(".csv"):
+        text = TextIOWrapper(f.file, encoding="utf-8", errors="replace")
+        reader = csv.DictReader(text)
+        headers = [h.strip() for h in reader.fieldnames or []]
+        # allow extra columns like id/pnl; we only require our set to be present
+        missing = [c for c in EXPECTED if c not in headers]
+        if missing:
+            errors.append(f"Missing required columns in CSV: {', '.join(missing)}")
+        else:
+            rows = enumerate(reader, start=2)  # header is line 1
+
+    # --- XLSX ---
+    elif f.name.lower().endswith(".xlsx"):
+        try:
+            import openpyxl
+        except ImportError:
+            errors.append("openpyxl not installed in the container.")
+        else:
+            wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+            ws = wb.active
+            headers = [str(c.value).strip() if c.value is not None else "" for c in next(ws.rows)]
+            missing = [c for c in EXPECTED if c not in headers]
+            if missing:
+                errors.append(f"Missing required columns in XLSX: {', '.join(missing)}")
+            else:
+                rows = _xlsx_rows(ws, headers)
+    else:
+        errors.append("Unsupported file type. Please upload .csv, .xlsx, .parquet, .arrow or .jsonl.")
+    return rows, errors
+
+
+def _xlsx_rows(ws, headers):
+    idx = {h: headers.index(h) for h in headers}
+    for r_i, r in enumerate(ws.iter_rows(min_row=2), start=2):
+        row = {h: (r[idx[h]].value if h in idx else None) for h in headers}
+        # cast all cell values to string except numbers/dates we’ll parse
+        for k, v in row.items():
+            if isinstance(v, str):
+                row[k] = v.strip()
+        yield r_i, row
+
+
+def parse_rows(rows):
+    """Yield {"line", "data": Trade fields, "errors": [...]} for the rows from read_rows()."""
+    for line_no, row in rows:
+        # map/clean
+        symbol = (row.get("symbol") or "").strip().upper()
+        side   = (row.get("side") or "").strip().upper()
+        q      = _coerce_decimal(row.get("quantity"))
+        price  = _coerce_decimal(row.get("price"))
+        exitp  = _coerce_decimal(row.get("exit_price"))
+        notes  = (row.get("notes") or "").strip()
+
+        # dates: if xlsx gave Python datetimes, accept them
+        et = row.get("entry_time")
+        xt = row.get("exit_time")
+        entry_time = et if isinstance(et, datetime) else _coerce_dt_any(row.get("entry_time"))
+        exit_time  = xt if isinstance(xt, datetime) else _coerce_dt_any(row.get("exit_time"))
+
+        row_errs = []
+        if not symbol:
+            row_errs.append("symbol required")
+        if side not in {"BUY","SELL"}:
+            row_errs.append("side must be BUY or SELL")
+        if q is None:
+            row_errs.append("quantity required")
+        elif q <= 0:
+            row_errs.append("quantity must be greater than 0")
+        if price is None:
+            row_errs.append("price required")
+        elif price <= 0:
+            row_errs.append("price must be greater than 0")
+        if exitp is not None and exitp <= 0:
+            row_errs.append("exit_price must be greater than 0")
+        if not entry_time:
+            row_errs.append("entry_time required")
+        elif exit_time and _coerce_dt_any(exit_time) < _coerce_dt_any(entry_time):
+            row_errs.append("exit_time before entry_time")
+        if (exitp is None) != (exit_time is None):
+            row_errs.append("exit_price and exit_time must be set together")
+
+        yield {
+            "line": line_no,
+            "data": {
+                "symbol": symbol,
+                "side": side,
+                "quantity": q,
+                "price": price,
+                "entry_time": entry_time,
+                "exit_price": exitp,
+                "exit_time": exit_time,
+                "notes": notes,
+            },
+            "errors": row_errs,
+        }
@@ -0,0 +1,286 @@
+"""
+Live updates for open dashboard and chart pages, streamed to the browser as
+server-sent events by views.live_events.
+
+Saving or deleting a trade publishes one small event for its owner once the
+transaction commits (see journal.signals). The event carries the change the
+trade makes to the closed-trade stats:
+
+    {"type": "trade", "action": "closed", "id": 42,
+     "delta": {"trades": 1, "wins": 1, "pnl": 12.5, "days": {"2024-06-03": 12.5}},
+     "legs": [{"sign": 1, "symbol": "AAPL", "side": "BUY", "tags": [],
+               "exit": "2024-06-03T15:30:00+00:00", "day": "2024-06-03", "pnl": 12.5}]}
+
+"delta" is the change to the unfiltered totals and daily buckets. "legs" are
+the closed versions of the trade that were removed (sign -1) and added
+(sign +1), so a page showing filtered numbers can apply only the legs that
+match its filters. An edit that leaves the closed trade unchanged has no
+legs. Bulk changes (imports) publish a single {"type": "reset"} instead,
+which tells pages to refetch.
+
+Events fan out through a broker, chosen by JOURNAL_LIVE_BACKEND:
+
+- "memory": in-process only; for runserver and single-process deployments.
+- "postgres": LISTEN/NOTIFY on the journal database. Each worker process with
+  open streams keeps one extra connection, LISTENing from a background
+  thread, so events published by any worker reach every other one.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "journal_live"
+QUEUE_SIZE = 100  # events a slow client may fall behind before it is reset
+POLL_SECONDS = 1.0
+RECONNECT_SECONDS = 5.0
+RETRY_MS = 5000  # how soon the browser reconnects a dropped stream
+
+RESET = {"type": "reset"}
+
+_suppressed = contextvars.ContextVar("journal_live_suppressed", default=False)
+
+
+def enabled():
+    return settings.JOURNAL_LIVE and not _suppressed.get()
+
+
+# Events
+
+
+def _leg(trade, sign):
+    """The closed trade's contribution to the stats, or None while it is open."""
+    pnl = trade.pnl
+    if pnl is None:
+        return None
+    return {
+        "sign": sign,
+        "symbol": trade.symbol,
+        "side": trade.side,
+        "tags": list(trade.tags or []),
+        "exit": trade.exit_time.isoformat(timespec="seconds"),  # as api_trade_pnl_series labels it
+        "day": timezone.localdate(trade.exit_time).isoformat(),  # as TruncDate buckets it
+        "pnl": round(float(pnl), 2),
+    }
+
+
+def _delta(legs):
+    days = defaultdict(float)
+    for leg in legs:
+        days[leg["day"]] += leg["sign"] * leg["pnl"]
+    return {
+        "trades": sum(leg["sign"] for leg in legs),
+        "wins": sum(leg["sign"] for leg in legs if leg["pnl"] > 0),
+        "pnl": round(sum(leg["sign"] * leg["pnl"] for leg in legs), 2),
+        "days": {day: round(pnl, 2) for day, pnl in sorted(days.items()) if round(pnl, 2)},
+    }
+
+
+def trade_event(before, after):
+    """
+    The event for a trade going from before to after; before is None for a new
+    trade and after is None for a deleted one.
+    """
+    old = _leg(before, -1) if before is not None else None
+    new = _leg(after, 1) if after is not None else None
+    if old and new and {**old, "sign": 1} == new:
+        old = new = None  # nothing the stats show has changed
+    if before is None:
+        action = "created"
+    elif after is None:
+        action = "deleted"
+    elif before.pnl is None and new:
+        action = "closed"
+    else:
+        action = "edited"
+    legs = [leg for leg in (old, new) if leg]
+    return {
+        "type": "trade",
+        "action": action,
+        "id": (after or before).pk,
+        "delta": _delta(legs),
+        "legs": legs,
+    }
+
+
+def publish_on_commit(user_id, event, using=DEFAULT_DB_ALIAS):
+    """Publish event to user_id's streams once the current transaction commits."""
+    transaction.on_commit(lambda: get_broker().publish(user_id, event), using=using)
+
+
+@contextmanager
+def batch(user_id, using=DEFAULT_DB_ALIAS):
+    """
+    Suppress per-trade events inside the block and publish one reset when it
+    completes, for bulk changes to user_id's trades.
+    """
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+    if settings.JOURNAL_LIVE:
+        publish_on_commit(user_id, RESET, using)
+
+
+# Brokers
+
+
+class Subscription:
+    """One open stream: the events for a user, delivered on the subscriber's event loop."""
+    def __init__(self, broker, user_id):
+        self.broker, self.user_id = broker, user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def deliver(self, event):
+        # Runs on self.loop.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind to catch up one event at a time.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class MemoryBroker:
+    """Fans events out to the subscriptions in this process."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, user_id):
+        """A Subscription to user_id's events; call from the event loop that will read it."""
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        self.dispatch(user_id, event)
+
+    def dispatch(self, user_id, event):
+        """Hand event to user_id's subscriptions in this process; callable from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:  # its loop has closed; the stream is gone
+                self.unsubscribe(subscription)
+
+    def dispatch_all(self, event):
+        with self._lock:
+            user_ids = list(self._subscriptions)
+        for user_id in user_ids:
+            self.dispatch(user_id, event)
+
+    def close(self):
+        pass
+
+
+class PostgresBroker(MemoryBroker):
+    """
+    Publishes with pg_notify() and listens for every worker's events on a
+    dedicated connection, from a thread started by the first subscription.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        super().__init__()
+        self.using = using
+        self.listening = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self, user_id, event):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, json.dumps({"user": user_id, "event": event})])
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name="journal-live", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def close(self):
+        """Stop listening and close the connection (tests; workers just exit)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _listen(self):
+        reconnected = False
+        while not self._stop.is_set():
+            try:
+                self._listen_once(reconnected)
+            except Exception:
+                logger.exception("Live update listener failed; reconnecting in %ss.", RECONNECT_SECONDS)
+            self.listening.clear()
+            reconnected = True
+            self._stop.wait(RECONNECT_SECONDS)
+
+    def _listen_once(self, reconnected):
+        connection = connections.create_connection(self.using)
+        try:
+            connection.ensure_connection()
+            connection.set_autocommit(True)
+            raw = connection.connection
+            with raw.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self.listening.set()
+            if reconnected:
+                # Events sent while disconnected are lost; have every page refetch.
+                self.dispatch_all(RESET)
+            while not self._stop.is_set():
+                if not select.select([raw], [], [], POLL_SECONDS)[0]:
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    message = json.loads(raw.notifies.pop(0).payload)
+                    self.dispatch(message["user"], message["event"])
+        finally:
+            connection.close()
+
+
+BACKENDS = {"memory": MemoryBroker, "postgres": PostgresBroker}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker for JOURNAL_LIVE_BACKEND, replaced if the setting changes."""
+    global _broker
+    backend = BACKENDS[settings.JOURNAL_LIVE_BACKEND]
+    with _broker_lock:
+        if type(_broker) is not backend:
+            if _broker is not None:
+                _broker.close()
+            _broker = backend()
+        return _broker
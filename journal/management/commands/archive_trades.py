@@ -0,0 +1,97 @@
+"""
+Move old closed trades between the hot trade table and the archive (Postgres only).
+
+Examples:
+    python manage.py archive_trades                  # run from cron, e.g. nightly
+    python manage.py archive_trades --vacuum --status
+    python manage.py archive_trades --compact          # after the first, large run
+    python manage.py archive_trades --restore --since 2024-01-01 --user alice
+
+Trades that exited more than JOURNAL_ARCHIVE_AFTER_DAYS days ago are moved in
+batches of --batch-size, each in its own short transaction, so the app keeps
+running meanwhile. Deleting rows doesn't shrink a table: --vacuum lets new
+trades reuse the space, and --compact rewrites the hot table to its live rows
+(VACUUM FULL; it locks the table, briefly since it is small by then). Run
+--restore (without --since) before turning archiving off.
+"""
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from journal import archive
+
+
+def _size(n):
+    for unit in ("B", "kB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class Command(BaseCommand):
+    help = "Archive closed trades older than JOURNAL_ARCHIVE_AFTER_DAYS, or restore archived ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restore", action="store_true", help="Move archived trades back to the trade table.")
+        parser.add_argument("--since", help="With --restore: only trades that exited on or after this date (YYYY-MM-DD).")
+        parser.add_argument("--user", help="With --restore: only this user's trades.")
+        parser.add_argument("--batch-size", type=int, help="Trades per transaction (default JOURNAL_ARCHIVE_BATCH).")
+        parser.add_argument("--vacuum", action="store_true",
+                            help="VACUUM ANALYZE both tables afterwards, so the freed space is reused.")
+        parser.add_argument("--compact", action="store_true",
+                            help="VACUUM FULL the hot table afterwards, shrinking its files (locks it meanwhile).")
+        parser.add_argument("--status", action="store_true", help="Show row counts and table sizes.")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("Archiving needs PostgreSQL.")
+        if opts["batch_size"] is not None and opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be >= 1.")
+        if (opts["since"] or opts["user"]) and not opts["restore"]:
+            raise CommandError("--since and --user only apply to --restore.")
+
+        if opts["restore"]:
+            since = None
+            if opts["since"]:
+                try:
+                    since = timezone.make_aware(datetime.combine(date.fromisoformat(opts["since"]), time.min))
+                except ValueError:
+                    raise CommandError("--since must be a date (YYYY-MM-DD).")
+            user = None
+            if opts["user"]:
+                try:
+                    user = get_user_model().objects.get(username=opts["user"])
+                except get_user_model().DoesNotExist:
+                    raise CommandError(f"No user named {opts['user']!r}.")
+            restored = archive.restore(since=since, user=user, batch_size=opts["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Restored {restored} trades."))
+        elif archive.enabled():
+            archived, restored = archive.archive(batch_size=opts["batch_size"])
+            if restored:
+                self.stdout.write(f"Restored {restored} trades the archive horizon no longer covers.")
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {archived} trades that exited before {archive.horizon():%Y-%m-%d}."
+            ))
+        elif not (opts["status"] or opts["compact"] or opts["vacuum"]):
+            raise CommandError("Archiving is off; set JOURNAL_ARCHIVE_AFTER_DAYS.")
+
+        with connection.cursor() as c:
+            if opts["compact"]:
+                c.execute(f'VACUUM (FULL, ANALYZE) "{archive.TABLE}"')
+            if opts["vacuum"]:
+                for table in (archive.TABLE, archive.ARCHIVE_TABLE)[opts["compact"]:]:
+                    c.execute(f'VACUUM (ANALYZE) "{table}"')
+        if opts["status"]:
+            self._status()
+
+    def _status(self):
+        s = archive.status()
+        horizon = f"{s['horizon']:%Y-%m-%d}" if s["horizon"] else "off"
+        self.stdout.write(f"horizon          {horizon} (JOURNAL_ARCHIVE_AFTER_DAYS={settings.JOURNAL_ARCHIVE_AFTER_DAYS})")
+        self.stdout.write(f"hot trades       {s['hot']:>10}  {_size(s['hot_bytes']):>10}  (shared_buffers {s['shared_buffers']})")
+        self.stdout.write(f"  past horizon   {s['due']:>10}")
+        self.stdout.write(f"archived trades  {s['archived']:>10}  {_size(s['archive_bytes']):>10}")
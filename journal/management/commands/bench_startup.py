@@ -0,0 +1,109 @@
+"""
+Measure how long a fresh worker takes to boot and how much memory it holds.
+
+Example:
+    python manage.py bench_startup --runs 5 --output bench/startup.json
+
+Each run starts a new Python process that calls django.setup(), then loads the
+URLconf, which imports every view module, as the first request would. It
+reports the time for each step, the resident memory, and any LAZY_MODULES
+that got imported. Those are only needed by a few views (imports, exports) and
+must be imported inside them. With --check the command fails when the medians
+exceed BUDGET_SECONDS / BUDGET_RSS_MB or a lazy module was imported;
+SeedAndBenchmarkTests runs it that way.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+LAZY_MODULES = ("openpyxl", "pyarrow")
+BUDGET_SECONDS = 1.5  # setup + URLconf
+BUDGET_RSS_MB = 100
+
+_PROBE = """
+import json, os, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+try:
+    # Peak RSS of this process only; on Linux ru_maxrss carries over the
+    # parent's across fork and exec.
+    with open("/proc/self/status") as fh:
+        rss_kib = next(int(line.split()[1]) for line in fh if line.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_kib = rss / 1024 if sys.platform == "darwin" else rss  # bytes on macOS
+print(json.dumps({
+    "setup_s": setup - start,
+    "urlconf_s": urls - setup,
+    "rss_mb": rss_kib / 1024,
+    "modules": len(sys.modules),
+    "lazy_loaded": [m for m in json.loads(os.environ["JOURNAL_LAZY_MODULES"]) if m in sys.modules],
+}))
+"""
+
+
+def measure():
+    """Boot one fresh process and return its measurements."""
+    env = dict(os.environ, JOURNAL_LAZY_MODULES=json.dumps(LAZY_MODULES))
+    env.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=settings.BASE_DIR, env=env,
+        capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode:
+        raise CommandError(f"Startup probe failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    help = "Measure django.setup() plus URLconf load time and resident memory in fresh processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Fresh processes to start.")
+        parser.add_argument("--output", default="", help="Write results JSON here.")
+        parser.add_argument("--check", action="store_true", help="Fail when over budget or a lazy module was imported.")
+
+    def handle(self, *args, **opts):
+        if opts["runs"] < 1:
+            raise CommandError("--runs must be at least 1.")
+        runs = [measure() for _ in range(opts["runs"])]
+        result = {
+            "runs": opts["runs"],
+            "setup_s": round(statistics.median(r["setup_s"] for r in runs), 4),
+            "urlconf_s": round(statistics.median(r["urlconf_s"] for r in runs), 4),
+            "total_s": round(statistics.median(r["setup_s"] + r["urlconf_s"] for r in runs), 4),
+            "rss_mb": round(statistics.median(r["rss_mb"] for r in runs), 1),
+            "modules": runs[-1]["modules"],
+            "lazy_loaded": sorted({m for r in runs for m in r["lazy_loaded"]}),
+            "budget": {"total_s": BUDGET_SECONDS, "rss_mb": BUDGET_RSS_MB},
+        }
+        self.stdout.write(
+            f"setup {result['setup_s'] * 1000:.0f} ms  urlconf {result['urlconf_s'] * 1000:.0f} ms  "
+            f"total {result['total_s'] * 1000:.0f} ms  rss {result['rss_mb']:.1f} MB  "
+            f"{result['modules']} modules"
+        )
+        if opts["output"]:
+            with open(opts["output"], "w") as fh:
+                json.dump(result, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {opts['output']}"))
+
+        if opts["check"]:
+            problems = []
+            if result["lazy_loaded"]:
+                problems.append(f"imported at startup: {', '.join(result['lazy_loaded'])}")
+            if result["total_s"] > BUDGET_SECONDS:
+                problems.append(f"startup took {result['total_s']:.2f}s, budget {BUDGET_SECONDS}s")
+            if result["rss_mb"] > BUDGET_RSS_MB:
+                problems.append(f"startup RSS {result['rss_mb']:.1f} MB, budget {BUDGET_RSS_MB} MB")
+            if problems:
+                raise CommandError("Startup over budget: " + "; ".join(problems))
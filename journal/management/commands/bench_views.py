@@ -0,0 +1,251 @@
+"""
+Time the journal's heavy views against a seeded user and record the results.
+
+Example:
+    python manage.py seed_trades --users 1 --trades 50000
+    python manage.py bench_views --user bench0000 --output bench/after.json --compare bench/before.json
+
+Each view is requested --repeat times for wall-clock timing, then once more
+under tracemalloc to record the peak Python memory and the number of queries.
+Per-user throttling (config.throttling) is off for the run, since every
+request comes from the same user.
+"""
+import csv
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from config.metrics import track_queries
+
+from journal.models import Trade
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; the columnar import scenarios are skipped
+    pa = None
+
+User = get_user_model()
+
+
+IMPORT_COLUMNS = ["entry_time", "symbol", "side", "quantity", "price", "exit_price", "exit_time", "notes"]
+
+
+def _import_files(user, rows):
+    """
+    Build import files from the user's own most recent trades: CSV always,
+    Parquet and JSONL when pyarrow is installed. Returns {extension: bytes}.
+    """
+    trades = list(Trade.objects.filter(owner=user).order_by("-entry_time")[:rows])
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(IMPORT_COLUMNS)
+    for t in trades:
+        w.writerow([
+            t.entry_time.isoformat(timespec="seconds"), t.symbol, t.side, t.quantity, t.price,
+            "" if t.exit_price is None else t.exit_price,
+            "" if t.exit_time is None else t.exit_time.isoformat(timespec="seconds"),
+            t.notes,
+        ])
+    files = {"csv": buf.getvalue().encode()}
+    if pa is None:
+        return files
+
+    jsonl = io.StringIO()
+    for t in trades:
+        jsonl.write(json.dumps({
+            "entry_time": t.entry_time.isoformat(timespec="seconds"), "symbol": t.symbol, "side": t.side,
+            "quantity": float(t.quantity), "price": float(t.price),
+            "exit_price": None if t.exit_price is None else float(t.exit_price),
+            "exit_time": None if t.exit_time is None else t.exit_time.isoformat(timespec="seconds"),
+            "notes": t.notes,
+        }) + "\n")
+    files["jsonl"] = jsonl.getvalue().encode()
+
+    ts = pa.timestamp("us", tz="UTC")
+    schema = pa.schema([
+        ("entry_time", ts), ("symbol", pa.string()), ("side", pa.string()),
+        ("quantity", pa.decimal128(10, 2)), ("price", pa.decimal128(10, 4)),
+        ("exit_price", pa.decimal128(10, 4)), ("exit_time", ts), ("notes", pa.string()),
+    ])
+    table = pa.Table.from_pylist([{c: getattr(t, c) for c in IMPORT_COLUMNS} for t in trades], schema=schema)
+    parquet = io.BytesIO()
+    pq.write_table(table, parquet)
+    files["parquet"] = parquet.getvalue()
+    return files
+
+
+def _scenarios(user, import_rows):
+    """Return (name, method, url, data) tuples for every benchmarked view."""
+    latest = Trade.objects.filter(owner=user).order_by("-entry_time").values_list("entry_time", flat=True).first()
+    month = {"year": latest.year, "month": latest.month} if latest else {}
+    import_files = _import_files(user, import_rows)
+
+    def upload(ext):
+        return lambda: {"file": SimpleUploadedFile(f"bench.{ext}", import_files[ext]), "dry_run": True}
+
+    scenarios = [
+        ("home", "get", reverse("home"), None),
+        ("profile", "get", reverse("profile"), None),
+        ("trades_create_form", "get", reverse("trades_create"), None),
+        ("trades_charts_page", "get", reverse("trades_charts"), None),
+        ("trades_list", "get", reverse("trades_list"), None),
+        ("trades_list_filtered", "get", reverse("trades_list"), {"side": "BUY", "page": 2}),
+        ("trades_list_tagged", "get", reverse("trades_list"), {"tag": "breakout,vwap"}),
+        ("trades_export_csv", "get", reverse("trades_export_csv"), None),
+        ("trades_calendar_page", "get", reverse("trades_calendar"), None),
+        ("trades_calendar_page_month", "get", reverse("trades_calendar"), month),
+        ("api_daily_pnl", "get", reverse("api_daily_pnl"), None),
+        ("api_symbol_pnl", "get", reverse("api_symbol_pnl"), None),
+        ("api_symbol_stats_top", "get", reverse("api_symbol_stats"), {"top": 20}),
+        ("api_tag_stats", "get", reverse("api_tag_stats"), None),
+        ("api_daily_pnl_tagged", "get", reverse("api_daily_pnl"), {"tag": "breakout"}),
+        ("api_open_positions", "get", reverse("api_open_positions"), None),
+        ("api_trade_pnl_series", "get", reverse("api_trade_pnl_series"), None),
+        ("api_trade_list", "get", reverse("trade-list"), None),
+        ("trades_import_dry_run", "post", reverse("trades_import"), upload("csv")),
+    ]
+    for ext in ("parquet", "jsonl"):
+        if ext in import_files:
+            scenarios.append((f"trades_import_dry_run_{ext}", "post", reverse("trades_import"), upload(ext)))
+    return scenarios
+
+
+def _consume(resp):
+    """Read the whole body (including streaming responses) and return its size."""
+    if resp.streaming:
+        return sum(len(chunk) for chunk in resp.streaming_content)
+    return len(resp.content)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark heavy views (wall time, queries, peak memory) and write a JSON results file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", default="bench0000", help="Username to benchmark as (see seed_trades).")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per view.")
+        parser.add_argument("--warmup", type=int, default=1, help="Untimed runs per view.")
+        parser.add_argument("--import-rows", type=int, default=1000, help="Rows in the dry-run import file.")
+        parser.add_argument("--only", nargs="*", help="Only run these scenario names.")
+        parser.add_argument("--output", default="", help="Write results JSON here.")
+        parser.add_argument("--compare", default="", help="Previous results JSON to diff against.")
+
+    def handle(self, *args, **opts):
+        try:
+            user = User.objects.get(username=opts["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {opts['user']} not found; run seed_trades first.")
+        if opts["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        # Record failing views as their status code instead of aborting the run.
+        client = Client(HTTP_HOST="localhost", raise_request_exception=False)
+        client.force_login(user)
+
+        results = {}
+        for name, method, url, data in _scenarios(user, opts["import_rows"]):
+            if opts["only"] and name not in opts["only"]:
+                continue
+            with override_settings(JOURNAL_THROTTLE_BUDGET=0, JOURNAL_THROTTLE_MAX_HEAVY=0):
+                results[name] = self._run(client, method, url, data, opts)
+            r = results[name]
+            self.stdout.write(
+                f"{name:<28} {r['wall_ms']['median']:>9.1f} ms  {r['queries']:>4} q  "
+                f"{r['peak_kib']:>9.0f} KiB  {r['bytes']:>10} B  [{r['status']}]"
+            )
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+                "git": _git_revision(),
+                "python": platform.python_version(),
+                "db_vendor": connection.vendor,
+                "user": user.username,
+                "user_trades": Trade.objects.filter(owner=user).count(),
+                "repeat": opts["repeat"],
+            },
+            "results": results,
+        }
+        if opts["output"]:
+            with open(opts["output"], "w") as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {opts['output']}"))
+        if opts["compare"]:
+            self._compare(opts["compare"], results)
+
+    def _request(self, client, method, url, data):
+        payload = data() if callable(data) else data
+        resp = getattr(client, method)(url, payload or {})
+        size = _consume(resp)
+        return resp, size
+
+    def _run(self, client, method, url, data, opts):
+        for _ in range(opts["warmup"]):
+            self._request(client, method, url, data)
+
+        timings = []
+        for _ in range(opts["repeat"]):
+            start = time.perf_counter()
+            resp, size = self._request(client, method, url, data)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # Separate pass: tracemalloc and query capture would skew the timings.
+        tracemalloc.start()
+        try:
+            # Counts queries on every connection, including async views' worker threads.
+            with track_queries() as db:
+                self._request(client, method, url, data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "status": resp.status_code,
+            "bytes": size,
+            "queries": db.count,
+            "peak_kib": round(peak / 1024, 1),
+            "wall_ms": {
+                "min": round(min(timings), 2),
+                "median": round(statistics.median(timings), 2),
+                "mean": round(statistics.fmean(timings), 2),
+                "max": round(max(timings), 2),
+            },
+        }
+
+    def _compare(self, path, results):
+        with open(path) as fh:
+            previous = json.load(fh)["results"]
+        self.stdout.write(f"\nCompared with {path} (median wall time, queries, peak memory):")
+        for name, r in results.items():
+            old = previous.get(name)
+            if not old:
+                self.stdout.write(f"{name:<28} (new)")
+                continue
+            before, after = old["wall_ms"]["median"], r["wall_ms"]["median"]
+            change = ((after - before) / before * 100) if before else 0.0
+            self.stdout.write(
+                f"{name:<28} {before:>9.1f} -> {after:>9.1f} ms ({change:+6.1f}%)  "
+                f"{old['queries']:>4} -> {r['queries']:<4} q  "
+                f"{old['peak_kib']:>9.0f} -> {r['peak_kib']:<9.0f} KiB"
+            )
@@ -0,0 +1,407 @@
+"""
+Concurrent load test for the journal with a configurable traffic mix.
+
+Examples:
+    python manage.py seed_trades --users 20 --trades 5000
+    # drive config.wsgi.application in-process from 20 threads for 30s
+    python manage.py loadtest --mode wsgi --concurrency 20 --duration 30
+    # drive config.asgi.application in-process from 50 coroutines
+    python manage.py loadtest --mode asgi --concurrency 50 --duration 30
+    # drive a running server (runserver, gunicorn, uvicorn...) over HTTP
+    python manage.py loadtest --mode http --url http://localhost:8000 --mix list=50,api_write=50
+
+Simulated users are the seeded accounts (see seed_trades). Each one gets a real
+session row and CSRF cookie, so requests go through the full middleware stack
+exactly like a browser's, and the same sessions work against an external server
+sharing the database. Use the regular POSTGRES_* settings to point at a local
+Postgres; the load test never creates or migrates databases itself.
+"""
+import asyncio
+import http.client
+import io
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.middleware.csrf import _get_new_csrf_string
+
+from journal.management.commands.seed_trades import generated_users
+from journal.models import Trade
+
+User = get_user_model()
+
+DEFAULT_MIX = "dashboard=10,list=25,chart=25,calendar=15,import=5,api_write=20"
+LOADTEST_NOTE = "[loadtest]"
+BOUNDARY = "loadtestboundary"
+
+
+def _parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint '{name}'. Choose from: {', '.join(ENDPOINTS)}.")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Bad weight in --mix: {part!r}")
+    return mix
+
+
+def _import_body(rng):
+    lines = ["entry_time,symbol,side,quantity,price,exit_price,exit_time,notes"]
+    for i in range(20):
+        lines.append(f"2024-0{1 + i % 9}-1{i % 10}T10:00:00Z,LT{i % 4},BUY,{1 + i},{rng.uniform(10, 50):.2f},"
+                     f"{rng.uniform(10, 50):.2f},2024-0{1 + i % 9}-1{i % 10}T15:00:00Z,")
+    csv_bytes = "\n".join(lines).encode()
+    parts = [
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"dry_run\"\r\n\r\non\r\n".encode(),
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"lt.csv\"\r\n"
+        f"Content-Type: text/csv\r\n\r\n".encode() + csv_bytes + b"\r\n",
+        f"--{BOUNDARY}--\r\n".encode(),
+    ]
+    return b"".join(parts), f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def _dashboard(rng):
+    return "GET", "/", None, None
+
+
+def _list(rng):
+    return "GET", f"/trades/?page={rng.randint(1, 20)}", None, None
+
+
+def _chart(rng):
+    path = rng.choice(["/api/stats/daily-pnl/", "/api/stats/symbol-pnl/", "/api/stats/trade-pnl/"])
+    return "GET", path, None, None
+
+
+def _calendar(rng):
+    return "GET", f"/trades/calendar/?year=2024&month={rng.randint(1, 12)}", None, None
+
+
+def _import(rng):
+    body, content_type = _import_body(rng)
+    return "POST", "/trades/import/", body, content_type
+
+
+def _api_write(rng):
+    price = round(rng.uniform(10, 500), 2)
+    body = json.dumps({
+        "symbol": rng.choice(["LTA", "LTB", "LTC"]),
+        "side": rng.choice(["BUY", "SELL"]),
+        "quantity": rng.choice([1, 10, 100]),
+        "price": price,
+        "entry_time": "2024-06-03T14:30:00Z",
+        "exit_price": round(price * rng.uniform(0.95, 1.05), 2),
+        "exit_time": "2024-06-03T15:30:00Z",
+        "notes": LOADTEST_NOTE,
+    }).encode()
+    return "POST", "/api/trades/", body, "application/json"
+
+
+ENDPOINTS = {
+    "dashboard": _dashboard,
+    "list": _list,
+    "chart": _chart,
+    "calendar": _calendar,
+    "import": _import,
+    "api_write": _api_write,
+}
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class _Session:
+    """Cookies and CSRF token for one simulated user."""
+    def __init__(self, user):
+        store = SessionStore()
+        store[SESSION_KEY] = str(user.pk)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        self.session_key = store.session_key
+        self.csrf = _get_new_csrf_string()
+        self.cookie = (
+            f"{settings.SESSION_COOKIE_NAME}={self.session_key}; "
+            f"{settings.CSRF_COOKIE_NAME}={self.csrf}"
+        )
+
+    def headers(self, content_type):
+        headers = {"Cookie": self.cookie, "X-CSRFToken": self.csrf, "Host": "localhost"}
+        if content_type:
+            headers["Content-Type"] = content_type
+        return headers
+
+
+class _Recorder:
+    """Thread-safe latency and status collection per endpoint."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, endpoint, status, seconds):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+
+def _wsgi_environ(method, path, body, headers):
+    path, _, query = path.partition("?")
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body or b""),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.version": (1, 0),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "CONTENT_LENGTH": str(len(body or b"")),
+    }
+    for key, value in headers.items():
+        if key == "Content-Type":
+            environ["CONTENT_TYPE"] = value
+        else:
+            environ["HTTP_" + key.upper().replace("-", "_")] = value
+    return environ
+
+
+class Command(BaseCommand):
+    help = "Run a concurrent load test (in-process WSGI/ASGI or HTTP) and report throughput and latency percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["wsgi", "asgi", "http"], default="wsgi")
+        parser.add_argument("--url", default="http://localhost:8000", help="Base URL for --mode http.")
+        parser.add_argument("--concurrency", type=int, default=10, help="Simulated concurrent users.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run.")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted traffic mix, e.g. list=30,chart=25.")
+        parser.add_argument("--think-ms", type=float, default=0.0, help="Pause between a user's requests.")
+        parser.add_argument("--prefix", default="bench", help="Username prefix of seeded users to log in as.")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for request selection.")
+        parser.add_argument("--output", default="", help="Write the report as JSON here.")
+        parser.add_argument("--keep-data", action="store_true", help="Keep trades created by api_write.")
+
+    def handle(self, *args, **opts):
+        mix = _parse_mix(opts["mix"])
+        users = list(generated_users(opts["prefix"]).order_by("username"))
+        if not users:
+            raise CommandError(f"No users with prefix '{opts['prefix']}'; run seed_trades first.")
+        if opts["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        sessions = [_Session(users[i % len(users)]) for i in range(opts["concurrency"])]
+        recorder = _Recorder()
+        self.stdout.write(
+            f"{opts['mode']}: {opts['concurrency']} users x {opts['duration']:.0f}s, mix {opts['mix']}"
+        )
+        try:
+            started = time.perf_counter()
+            if opts["mode"] == "asgi":
+                asyncio.run(self._run_asgi(sessions, mix, recorder, opts))
+            else:
+                self._run_threads(sessions, mix, recorder, opts)
+            elapsed = time.perf_counter() - started
+        finally:
+            SessionStore.get_model_class().objects.filter(
+                session_key__in=[s.session_key for s in sessions]
+            ).delete()
+            if not opts["keep_data"]:
+                Trade.objects.filter(owner__in=users, notes=LOADTEST_NOTE).delete()
+
+        report = self._report(recorder, elapsed, opts)
+        if opts["output"]:
+            with open(opts["output"], "w") as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {opts['output']}"))
+
+    # --- drivers ---------------------------------------------------------
+
+    def _pick(self, rng, mix):
+        return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+    def _run_threads(self, sessions, mix, recorder, opts):
+        if opts["mode"] == "wsgi":
+            from config.wsgi import application
+            send = lambda conn, *req: self._send_wsgi(application, *req)  # noqa: E731
+        else:
+            send = self._send_http
+
+        deadline = time.perf_counter() + opts["duration"]
+
+        def worker(index, session):
+            rng = random.Random(f"{opts['seed']}:{index}")
+            conn = None
+            if opts["mode"] == "http":
+                parts = urlsplit(opts["url"])
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+            try:
+                while time.perf_counter() < deadline:
+                    endpoint = self._pick(rng, mix)
+                    method, path, body, content_type = ENDPOINTS[endpoint](rng)
+                    start = time.perf_counter()
+                    try:
+                        status = send(conn, method, path, body, session.headers(content_type))
+                    except Exception:
+                        status = "error"
+                    recorder.add(endpoint, status, time.perf_counter() - start)
+                    if opts["think_ms"]:
+                        time.sleep(opts["think_ms"] / 1000)
+            finally:
+                if conn is not None:
+                    conn.close()
+                # Each thread holds its own DB connection in wsgi mode.
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i, s), daemon=True) for i, s in enumerate(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def _send_wsgi(self, application, method, path, body, headers):
+        status_holder = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            status_holder["status"] = int(status.split(" ", 1)[0])
+
+        result = application(_wsgi_environ(method, path, body, headers), start_response)
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return status_holder.get("status", "error")
+
+    def _send_http(self, conn, method, path, body, headers):
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+
+    async def _run_asgi(self, sessions, mix, recorder, opts):
+        from config.asgi import application
+
+        deadline = time.perf_counter() + opts["duration"]
+
+        async def user(index, session):
+            rng = random.Random(f"{opts['seed']}:{index}")
+            while time.perf_counter() < deadline:
+                endpoint = self._pick(rng, mix)
+                method, path, body, content_type = ENDPOINTS[endpoint](rng)
+                start = time.perf_counter()
+                try:
+                    status = await self._send_asgi(application, method, path, body, session.headers(content_type))
+                except Exception:
+                    status = "error"
+                recorder.add(endpoint, status, time.perf_counter() - start)
+                if opts["think_ms"]:
+                    await asyncio.sleep(opts["think_ms"] / 1000)
+
+        await asyncio.gather(*(user(i, s) for i, s in enumerate(sessions)))
+        from asgiref.sync import sync_to_async
+        await sync_to_async(close_old_connections)()
+
+    async def _send_asgi(self, application, method, path, body, headers):
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body or b"", "more_body": False}
+            # Park until the app is done; Django only listens for disconnects here.
+            await asyncio.Event().wait()
+
+        status_holder = {}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+
+        await application(scope, receive, send)
+        return status_holder.get("status", "error")
+
+    # --- reporting -------------------------------------------------------
+
+    def _report(self, recorder, elapsed, opts):
+        endpoints = {}
+        total = redirected = 0
+        self.stdout.write(
+            f"\n{'endpoint':<12}{'reqs':>8}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        )
+        for name in sorted(recorder.latencies):
+            lat = sorted(recorder.latencies[name])
+            statuses = dict(recorder.statuses[name])
+            # None of the endpoints redirects a logged-in user; a 3xx is a login redirect.
+            errors = sum(n for s, n in statuses.items() if s == "error" or s >= 300)
+            redirected += sum(n for s, n in statuses.items() if s != "error" and 300 <= s < 400)
+            total += len(lat)
+            endpoints[name] = {
+                "requests": len(lat),
+                "throughput_rps": round(len(lat) / elapsed, 2),
+                "errors": errors,
+                "statuses": {str(k): v for k, v in statuses.items()},
+                "p50_ms": round(_percentile(lat, 50) * 1000, 2),
+                "p95_ms": round(_percentile(lat, 95) * 1000, 2),
+                "p99_ms": round(_percentile(lat, 99) * 1000, 2),
+                "max_ms": round(lat[-1] * 1000, 2),
+            }
+            e = endpoints[name]
+            self.stdout.write(
+                f"{name:<12}{e['requests']:>8}{e['throughput_rps']:>9.1f}{e['errors']:>8}"
+                f"{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['p99_ms']:>9.1f}{e['max_ms']:>9.1f}"
+            )
+        self.stdout.write(f"\nTotal: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+        if redirected:
+            self.stdout.write(self.style.WARNING(
+                f"{redirected} requests were redirected: the simulated users aren't logged in, "
+                "so these numbers measure the login redirect."
+            ))
+        return {
+            "mode": opts["mode"],
+            "concurrency": opts["concurrency"],
+            "duration_s": round(elapsed, 2),
+            "mix": opts["mix"],
+            "total_requests": total,
+            "redirected": redirected,
+            "throughput_rps": round(total / elapsed, 2),
+            "endpoints": endpoints,
+        }
@@ -0,0 +1,135 @@
+"""
+Generate deterministic synthetic trading histories for benchmarks.
+
+Example:
+    python manage.py seed_trades --users 5 --trades 100000 --symbols 300 --seed 7
+"""
+import math
+import random
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from journal.models import Trade
+
+User = get_user_model()
+
+NOTES = [
+    "Breakout above premarket high",
+    "Faded the open, stopped out",
+    "Earnings gap and go",
+    "VWAP reclaim",
+    "Scaled out into strength",
+    "Chased, poor entry",
+]
+
+TAGS = ["breakout", "gap-and-go", "vwap", "reversal", "earnings", "scalp", "swing", "momentum"]
+
+
+def generated_users(prefix):
+    """The users seed_trades created with this prefix: the prefix plus four digits, nobody else."""
+    return User.objects.filter(username__regex=rf"^{re.escape(prefix)}\d{{4}}$")
+
+
+def _symbol_names(count, rng):
+    """Return `count` unique uppercase tickers of 2-5 letters."""
+    names = set()
+    while len(names) < count:
+        length = rng.choice((2, 3, 3, 4, 4, 4, 5))
+        names.add("".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(length)))
+    return sorted(names)
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate deterministic synthetic trades (N users x M trades) for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1, help="Number of users to create.")
+        parser.add_argument("--trades", type=int, default=10000, help="Trades per user.")
+        parser.add_argument("--symbols", type=int, default=50, help="Distinct symbols per user.")
+        parser.add_argument("--open-ratio", type=float, default=0.05, help="Fraction of trades left open (0-1).")
+        parser.add_argument("--days", type=int, default=365, help="Time span of the history in days.")
+        parser.add_argument("--end", default="2025-01-01", help="Last day of the history (YYYY-MM-DD).")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed gives the same data.")
+        parser.add_argument("--prefix", default="bench", help="Username prefix for generated users.")
+        parser.add_argument("--password", default="bench-pass", help="Password for generated users.")
+        parser.add_argument("--notes-ratio", type=float, default=0.3, help="Fraction of trades with notes.")
+        parser.add_argument("--tags-ratio", type=float, default=0.5, help="Fraction of trades with 1-3 tags.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk_create batch.")
+        parser.add_argument("--clear", action="store_true", help="Delete users generated with this prefix first.")
+
+    def handle(self, *args, **opts):
+        if not 0 <= opts["open_ratio"] <= 1:
+            raise CommandError("--open-ratio must be between 0 and 1.")
+        if opts["users"] < 1 or opts["trades"] < 0 or opts["symbols"] < 1 or opts["days"] < 1:
+            raise CommandError("--users, --symbols and --days must be positive; --trades must be >= 0.")
+        try:
+            end = datetime.strptime(opts["end"], "%Y-%m-%d").replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            raise CommandError("--end must be YYYY-MM-DD.")
+
+        prefix = opts["prefix"]
+        if opts["clear"]:
+            deleted, _ = generated_users(prefix).delete()
+            self.stdout.write(f"Deleted {deleted} existing rows for prefix '{prefix}'.")
+
+        password = make_password(opts["password"])
+        total = 0
+        for u in range(opts["users"]):
+            username = f"{prefix}{u:04d}"
+            if User.objects.filter(username=username).exists():
+                raise CommandError(f"User {username} already exists; use --clear or another --prefix.")
+            # Each user gets its own stream so adding users doesn't change earlier ones.
+            rng = random.Random(f"{opts['seed']}:{u}")
+            with transaction.atomic():
+                user = User.objects.create(username=username, email=f"{username}@example.com", password=password)
+                total += self._seed_user(user, rng, end, opts)
+            self.stdout.write(f"{username}: {opts['trades']} trades")
+
+        self.stdout.write(self.style.SUCCESS(f"Created {opts['users']} users and {total} trades."))
+
+    def _seed_user(self, user, rng, end, opts):
+        symbols = _symbol_names(opts["symbols"], rng)
+        # Popularity follows a rough power law: a few tickers dominate, like real journals.
+        weights = [1.0 / (i + 1) ** 0.8 for i in range(len(symbols))]
+        prices = {s: rng.uniform(5, 500) for s in symbols}
+        span = timedelta(days=opts["days"])
+        start = end - span
+
+        batch = []
+        count = 0
+        for _ in range(opts["trades"]):
+            symbol = rng.choices(symbols, weights)[0]
+            # Random walk keeps each symbol's price history plausible.
+            prices[symbol] = max(0.5, prices[symbol] * math.exp(rng.gauss(0, 0.01)))
+            price = Decimal(f"{prices[symbol]:.4f}")
+            side = "BUY" if rng.random() < 0.6 else "SELL"
+            quantity = Decimal(rng.choice((1, 5, 10, 25, 50, 100, 200, 500)))
+            entry_time = start + timedelta(seconds=rng.uniform(0, span.total_seconds()))
+
+            exit_price = exit_time = None
+            if rng.random() >= opts["open_ratio"]:
+                # Holding time: minutes for most trades, occasionally days.
+                hold = timedelta(minutes=rng.lognormvariate(3.5, 1.5))
+                exit_time = min(entry_time + hold, end)
+                exit_price = Decimal(f"{max(0.01, float(price) * (1 + rng.gauss(0.001, 0.02))):.4f}")
+
+            notes = rng.choice(NOTES) if rng.random() < opts["notes_ratio"] else ""
+            tags = rng.sample(TAGS, rng.randint(1, 3)) if rng.random() < opts["tags_ratio"] else []
+            batch.append(Trade(
+                owner=user, symbol=symbol, side=side, quantity=quantity, price=price,
+                entry_time=entry_time, exit_price=exit_price, exit_time=exit_time, notes=notes, tags=tags,
+            ))
+            if len(batch) >= opts["batch_size"]:
+                Trade.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            Trade.objects.bulk_create(batch)
+            count += len(batch)
+        return count
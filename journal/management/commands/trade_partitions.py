@@ -0,0 +1,94 @@
+"""
+Manage range partitioning of the trade table (Postgres only).
+
+Examples:
+    python manage.py trade_partitions --convert --interval month
+    python manage.py trade_partitions --ahead 6        # run from cron, e.g. daily
+    python manage.py trade_partitions --status        # report only
+
+Partitions are pre-created ahead of time so new trades never land in the
+DEFAULT partition; rows that already did are moved when their partition is created.
+Trades stored with their exit before their entry are swapped back, since reads by
+exit date also bound entry_time.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from journal import partitioning
+
+
+class Command(BaseCommand):
+    help = "Convert the trade table to entry_time range partitions and pre-create future partitions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", choices=partitioning.INTERVALS,
+            help="Partition size. --convert defaults to JOURNAL_PARTITION_TRADES or month; "
+                 "otherwise the table's existing interval is used.",
+        )
+        parser.add_argument("--ahead", type=int, help="Future partitions to keep ready (default 3).")
+        parser.add_argument("--convert", action="store_true", help="Convert the plain table first (locks it while copying).")
+        parser.add_argument("--revert", action="store_true", help="Turn the table back into a plain table.")
+        parser.add_argument(
+            "--status", action="store_true",
+            help="List partitions with estimated row counts. On its own, nothing is created.",
+        )
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("Table partitioning needs PostgreSQL.")
+        if opts["status"] and not (opts["convert"] or opts["revert"] or opts["interval"] or opts["ahead"] is not None):
+            if partitioning.is_partitioned():
+                self._status()
+            else:
+                self.stdout.write("The trade table is not partitioned.")
+            return
+        if opts["ahead"] is None:
+            opts["ahead"] = 3
+        if opts["ahead"] < 0:
+            raise CommandError("--ahead must be >= 0.")
+
+        if opts["revert"]:
+            if partitioning.revert():
+                self.stdout.write(self.style.SUCCESS("Converted the trade table back to a plain table."))
+            else:
+                self.stdout.write("The trade table is not partitioned.")
+            return
+
+        if opts["convert"]:
+            interval = opts["interval"] or settings.JOURNAL_PARTITION_TRADES or "month"
+            created = partitioning.convert(interval=interval, ahead=opts["ahead"])
+            if created:
+                self.stdout.write(self.style.SUCCESS(f"Partitioned the trade table into {len(created)} partitions."))
+            else:
+                self.stdout.write("The trade table is already partitioned.")
+        elif not partitioning.is_partitioned():
+            raise CommandError("The trade table is not partitioned; run with --convert first.")
+        else:
+            try:
+                created = partitioning.ensure_partitions(interval=opts["interval"], ahead=opts["ahead"])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            for name in created:
+                self.stdout.write(f"Created {name}")
+            self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created."))
+            swapped = partitioning.swap_reversed_times()
+            if swapped:
+                self.stdout.write(self.style.WARNING(f"Swapped entry and exit times of {swapped} trades that exited before entry."))
+
+        if opts["status"]:
+            self._status()
+
+    def _status(self):
+        with connection.cursor() as c:
+            c.execute(
+                "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples "
+                "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = %s::regclass ORDER BY child.relname",
+                [partitioning.TABLE],
+            )
+            for name, bound, rows in c.fetchall():
+                # reltuples is -1 until the partition has been analyzed.
+                estimate = "?" if rows < 0 else f"~{int(rows)}"
+                self.stdout.write(f"{name:<28} {estimate:>10} rows  {bound}")
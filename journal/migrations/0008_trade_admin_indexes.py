@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0007_usertradesettings_default_symbol'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['-entry_time'], name='trade_entry_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(condition=models.Q(('exit_price__isnull', True)), fields=['-entry_time'], name='trade_open_entry_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:48
+
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_trades(apps, schema_editor):
+    """Opt-in: only converts when JOURNAL_PARTITION_TRADES is set on Postgres."""
+    from journal import partitioning
+    if settings.JOURNAL_PARTITION_TRADES and schema_editor.connection.vendor == "postgresql":
+        partitioning.convert(interval=settings.JOURNAL_PARTITION_TRADES)
+
+
+def unpartition_trades(apps, schema_editor):
+    from journal import partitioning
+    if schema_editor.connection.vendor == "postgresql":
+        partitioning.revert()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0008_trade_admin_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_trades, unpartition_trades),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:36
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0010_import_upload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='tags',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=32), blank=True, default=list, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='trade_tags_gin'),
+        ),
+    ]
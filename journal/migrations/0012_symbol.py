@@ -0,0 +1,77 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Existing symbols were only normalized by Trade.save(); bulk imports could
+# leave lower case or padding behind.
+INTERN_SYMBOLS = """
+UPDATE journal_trade SET symbol = upper(btrim(symbol)) WHERE symbol <> upper(btrim(symbol));
+INSERT INTO journal_symbol (name) SELECT DISTINCT symbol FROM journal_trade ORDER BY 1;
+UPDATE journal_trade SET symbol_id = journal_symbol.id FROM journal_symbol WHERE journal_symbol.name = journal_trade.symbol;
+"""
+
+# Normalizes Trade.symbol and points symbol_id at its dictionary row, adding
+# the row if it is new, for every write path (save, bulk_create, update, SQL).
+CREATE_TRIGGER = """
+CREATE FUNCTION journal_trade_intern_symbol() RETURNS trigger AS $$
+BEGIN
+    NEW.symbol := upper(btrim(NEW.symbol));
+    SELECT id INTO NEW.symbol_id FROM journal_symbol WHERE name = NEW.symbol;
+    IF NOT FOUND THEN
+        INSERT INTO journal_symbol (name) VALUES (NEW.symbol)
+        ON CONFLICT (name) DO NOTHING
+        RETURNING id INTO NEW.symbol_id;
+        IF NEW.symbol_id IS NULL THEN
+            -- Another transaction added it first.
+            SELECT id INTO NEW.symbol_id FROM journal_symbol WHERE name = NEW.symbol;
+        END IF;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER journal_trade_intern_symbol
+    BEFORE INSERT OR UPDATE OF symbol, symbol_id ON journal_trade
+    FOR EACH ROW EXECUTE FUNCTION journal_trade_intern_symbol();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER journal_trade_intern_symbol ON journal_trade;
+DROP FUNCTION journal_trade_intern_symbol();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0011_trade_tags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Symbol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=10, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='symbol_ref',
+            field=models.ForeignKey(blank=True, db_column='symbol_id', db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='trades', to='journal.symbol'),
+        ),
+        migrations.RunSQL(INTERN_SYMBOLS, migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AlterField(
+            model_name='trade',
+            name='symbol_ref',
+            field=models.ForeignKey(blank=True, db_column='symbol_id', db_index=False, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='trades', to='journal.symbol'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['owner', 'symbol_ref'], name='trade_owner_symbol_idx'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:21
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Every trade, hot or archived, for reads whose date range reaches into the
+# archive (models.TradeHistory). Filters are pushed down into both branches.
+# The LEFT JOIN names archived symbols; Postgres drops it from queries that
+# don't select the symbol text.
+CREATE_VIEW = """
+CREATE VIEW journal_trade_history AS
+SELECT id, owner_id, symbol, symbol_id, side, quantity, entry_time, price,
+       exit_price, exit_time, created_at, notes, tags, false AS archived
+FROM journal_trade
+UNION ALL
+SELECT a.id, a.owner_id, s.name, a.symbol_id, a.side, a.quantity, a.entry_time, a.price,
+       a.exit_price, a.exit_time, a.created_at, a.notes, a.tags, true
+FROM journal_trade_archive a LEFT JOIN journal_symbol s ON s.id = a.symbol_id
+"""
+
+DROP_VIEW = "DROP VIEW journal_trade_history"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0012_symbol'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTrade',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('side', models.CharField(max_length=4)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('entry_time', models.DateTimeField()),
+                ('price', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('exit_price', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('exit_time', models.DateTimeField()),
+                ('created_at', models.DateTimeField()),
+                ('notes', models.TextField(blank=True)),
+                ('tags', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=32), blank=True, default=list, size=None)),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('symbol_ref', models.ForeignKey(db_column='symbol_id', db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='journal.symbol')),
+            ],
+            options={
+                'db_table': 'journal_trade_archive',
+                'indexes': [models.Index(fields=['owner', 'exit_time'], name='trade_archive_owner_exit_idx'), models.Index(fields=['owner', 'entry_time'], name='trade_archive_owner_entry_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TradeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('trades', models.IntegerField()),
+                ('wins', models.IntegerField()),
+                ('pnl', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'journal_trade_rollup',
+                'constraints': [models.UniqueConstraint(fields=('owner', 'day'), name='trade_rollup_owner_day_uniq')],
+            },
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+        migrations.CreateModel(
+            name='TradeHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=10)),
+                ('side', models.CharField(max_length=4)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('entry_time', models.DateTimeField()),
+                ('price', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('exit_price', models.DecimalField(decimal_places=4, max_digits=10, null=True)),
+                ('exit_time', models.DateTimeField(null=True)),
+                ('created_at', models.DateTimeField()),
+                ('notes', models.TextField()),
+                ('tags', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=32), size=None)),
+                ('archived', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'journal_trade_history',
+                'ordering': ['-entry_time'],
+                'managed': False,
+            },
+        ),
+    ]
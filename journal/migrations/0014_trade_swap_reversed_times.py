@@ -0,0 +1,21 @@
+from django.db import migrations
+
+# Reads by exit date also bound entry_time, which drops trades stored with
+# their exit before their entry. Take those to have the two times the wrong
+# way round and swap them (journal.partitioning.swap_reversed_times() does the
+# same from the trade_partitions command).
+SWAP_REVERSED_TIMES = """
+UPDATE journal_trade SET entry_time = exit_time, exit_time = entry_time
+WHERE exit_time < entry_time
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0013_trade_archive'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SWAP_REVERSED_TIMES, migrations.RunSQL.noop),
+    ]
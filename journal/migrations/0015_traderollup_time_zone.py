@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_time_zone(apps, schema_editor):
+    # Existing rollups were bucketed by archive_trades in the TIME_ZONE it ran with.
+    apps.get_model("journal", "TradeRollup").objects.update(time_zone=settings.TIME_ZONE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0014_trade_swap_reversed_times'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='traderollup',
+            name='time_zone',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(record_time_zone, migrations.RunPython.noop),
+    ]
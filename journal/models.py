@@ -1,17 +1,78 @@
 from django.db import models
 from decimal import Decimal
-from django.db.models import Q
+import re
+import uuid
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models import Case, DecimalField, F, Q, When
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from django.utils import timezone
 
 
 
+TAG_MAX_LENGTH = 32
+MAX_TAGS = 10
+TAG_RE = re.compile(r"[a-z0-9][a-z0-9_.-]*")
+
+
+def normalize_tags(tags):
+    """Lower-case, strip and de-duplicate tags, keeping their order and dropping blanks."""
+    seen = []
+    for tag in tags or ():
+        tag = str(tag).strip().lower()
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+
+def validate_tags(tags):
+    """Raise ValidationError unless tags (already normalized) are acceptable."""
+    if len(tags) > MAX_TAGS:
+        raise ValidationError(f"At most {MAX_TAGS} tags per trade.")
+    for tag in tags:
+        if len(tag) > TAG_MAX_LENGTH or not TAG_RE.fullmatch(tag):
+            raise ValidationError(
+                f"Invalid tag {tag!r}: use up to {TAG_MAX_LENGTH} letters, digits, '-', '_' or '.'."
+            )
+
+
+# The SQL form of Trade.pnl, for annotations and aggregates. Open trades get
+# NULL: trade_exit_fields_both_or_neither makes exit_price NULL exactly when
+# exit_time is.
+PNL_EXPR = Case(
+    When(side="BUY",  then=(F("exit_price") - F("price")) * F("quantity")),
+    When(side="SELL", then=(F("price") - F("exit_price")) * F("quantity")),
+    default=None,
+    output_field=DecimalField(max_digits=16, decimal_places=2),
+)
+
+
+class Symbol(models.Model):
+    """
+    The symbol dictionary, shared by all users. Trades point at it by integer
+    id (Trade.symbol_ref) so filters and group-bys compare integers. Rows are
+    never renamed or deleted, so an id's name can be cached forever (see
+    journal.symbols).
+    """
+    name = models.CharField(max_length=10, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 # Create your models here.
 class Trade(models.Model):
     """Model representing a single trade entry in the journal."""
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="trades", null=True, blank=True)
     symbol = models.CharField(max_length=10)
+    # Set from symbol by the journal_trade_intern_symbol trigger on every insert
+    # and update, including bulk_create() and update(), which bypass save().
+    # Instances created through the ORM hold None until reloaded.
+    symbol_ref = models.ForeignKey(
+        Symbol, on_delete=models.PROTECT, related_name="trades",
+        db_column="symbol_id", db_index=False, blank=True, editable=False,
+    )
     side = models.CharField(max_length=4, choices=[("BUY", "Buy"), ("SELL", "Sell")])
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     entry_time = models.DateTimeField(default=timezone.now)
@@ -20,6 +81,8 @@ class Trade(models.Model):
     exit_time = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
+    # Strategy/setup labels, normalized by normalize_tags(); filtered with tags__contains.
+    tags = ArrayField(models.CharField(max_length=TAG_MAX_LENGTH), default=list, blank=True)
 
     def __str__(self):
         """String representation of the trade."""
@@ -27,7 +90,7 @@ class Trade(models.Model):
 
     @property
     def pnl(self):
-        """Return profit and loss for the trade, or None if not closed."""
+        """Return profit and loss for the trade, or None if not closed; see PNL_EXPR."""
         if self.exit_price is None or self.exit_time is None:
             return None
         q = Decimal(self.quantity)
@@ -51,6 +114,10 @@ class Trade(models.Model):
             raise ValidationError({"price": "Entry price must be greater than 0."})
         if self.exit_price is not None and self.exit_price <= 0:
             raise ValidationError({"exit_price": "Exit price must be greater than 0."})
+        try:
+            validate_tags(normalize_tags(self.tags))
+        except ValidationError as exc:
+            raise ValidationError({"tags": exc.messages})
 
     class Meta:
         ordering = ['-entry_time']
@@ -65,13 +132,99 @@ class Trade(models.Model):
                 name="trade_exit_fields_both_or_neither",
             ),
         ]
+        indexes = [
+            # Admin changelist ordering, date hierarchy probes and date filters.
+            models.Index(fields=["-entry_time"], name="trade_entry_time_idx"),
+            # Open trades are a small slice of the table; keep them cheap to find.
+            models.Index(fields=["-entry_time"], condition=Q(exit_price__isnull=True), name="trade_open_entry_idx"),
+            # Tag filters (tags @> ARRAY[...]) and the per-tag stats.
+            GinIndex(fields=["tags"], name="trade_tags_gin"),
+            # Symbol filters, resolved to symbol ids first.
+            models.Index(fields=["owner", "symbol_ref"], name="trade_owner_symbol_idx"),
+        ]
 
     def save(self, *args, **kwargs):
-        """Ensure symbol is uppercase and stripped before saving."""
+        """Ensure symbol is uppercase and stripped, and tags normalized, before saving."""
         if self.symbol:
             self.symbol = self.symbol.upper().strip()
+        self.tags = normalize_tags(self.tags)
         super().save(*args, **kwargs)
 
+class ArchivedTrade(models.Model):
+    """
+    A closed trade moved out of journal_trade by the archive_trades command
+    (see journal.archive). Same columns, minus the symbol text (symbol_ref
+    names it), and only the two indexes date-bounded reads need.
+    """
+    id = models.BigIntegerField(primary_key=True)  # the trade's id, kept for restore
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", db_index=False)
+    symbol_ref = models.ForeignKey(Symbol, on_delete=models.PROTECT, related_name="+", db_column="symbol_id", db_index=False)
+    side = models.CharField(max_length=4)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    entry_time = models.DateTimeField()
+    price = models.DecimalField(max_digits=10, decimal_places=4)
+    exit_price = models.DecimalField(max_digits=10, decimal_places=4)
+    exit_time = models.DateTimeField()
+    created_at = models.DateTimeField()
+    notes = models.TextField(blank=True)
+    tags = ArrayField(models.CharField(max_length=TAG_MAX_LENGTH), default=list, blank=True)
+
+    class Meta:
+        db_table = "journal_trade_archive"
+        indexes = [
+            models.Index(fields=["owner", "exit_time"], name="trade_archive_owner_exit_idx"),
+            models.Index(fields=["owner", "entry_time"], name="trade_archive_owner_entry_idx"),
+        ]
+
+
+class TradeRollup(models.Model):
+    """
+    Closed-trade totals per owner and exit day (in TIME_ZONE, as TruncDate
+    buckets them) for the archived trades, kept in step by journal.archive.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", db_index=False)
+    day = models.DateField()
+    trades = models.IntegerField()
+    wins = models.IntegerField()
+    pnl = models.DecimalField(max_digits=20, decimal_places=6)  # exact: price (4 dp) x quantity (2 dp)
+    time_zone = models.CharField(max_length=64)  # the TIME_ZONE day is in; archive rebuilds on a change
+
+    class Meta:
+        db_table = "journal_trade_rollup"
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "day"], name="trade_rollup_owner_day_uniq"),
+        ]
+
+
+class TradeHistory(models.Model):
+    """
+    Read-only view over journal_trade and journal_trade_archive (UNION ALL),
+    for queries whose date range reaches into the archive. "archived" tells
+    the two apart; only the journal_trade rows can be edited.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, related_name="+", null=True)
+    symbol = models.CharField(max_length=10)
+    symbol_ref = models.ForeignKey(Symbol, on_delete=models.DO_NOTHING, related_name="+", db_column="symbol_id")
+    side = models.CharField(max_length=4)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    entry_time = models.DateTimeField()
+    price = models.DecimalField(max_digits=10, decimal_places=4)
+    exit_price = models.DecimalField(max_digits=10, decimal_places=4, null=True)
+    exit_time = models.DateTimeField(null=True)
+    created_at = models.DateTimeField()
+    notes = models.TextField()
+    tags = ArrayField(models.CharField(max_length=TAG_MAX_LENGTH))
+    archived = models.BooleanField()
+
+    __str__ = Trade.__str__
+    pnl = Trade.pnl
+
+    class Meta:
+        managed = False
+        db_table = "journal_trade_history"
+        ordering = ["-entry_time"]
+
+
 class UserTradeSettings(models.Model):
     """Model for storing user-specific default trade settings."""
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="trade_settings")
@@ -83,4 +236,22 @@ class UserTradeSettings(models.Model):
 
     def __str__(self):
         """String representation of the user trade settings."""
-        return f"{self.user.username} settings"
\ No newline at end of file
+        return f"{self.user.username} settings"
+
+class ImportUpload(models.Model):
+    """An import file being uploaded in resumable chunks (see journal.uploads)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="import_uploads")
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Total size in bytes, announced by the client.")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Optional hex digest of the whole file.")
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+    @property
+    def complete(self):
+        return self.received == self.size
@@ -0,0 +1,261 @@
+"""
+Optional range partitioning of journal_trade by entry_time (Postgres only).
+
+convert() rebuilds the table as a declaratively partitioned table with one
+partition per month or year plus a DEFAULT partition for anything outside the
+pre-created ranges, and ensure_partitions() adds partitions ahead of time (see
+the trade_partitions management command). Queries bounded by entry_time then
+only scan the partitions that can match.
+
+Postgres requires the partition key in every unique index, so the primary key
+becomes (id, entry_time). Ids still come from a single identity sequence and
+stay unique, so the ORM keeps addressing trades by id alone.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+TABLE = "journal_trade"
+DEFAULT_PARTITION = f"{TABLE}_default"
+INTERVALS = ("month", "year")
+
+
+def _is_partitioned(c):
+    c.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+    return c.fetchone() is not None
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as c:
+        return _is_partitioned(c)
+
+
+def swap_reversed_times():
+    """
+    Swap entry_time and exit_time of trades stored with their exit first, so
+    that reads by exit date, which also bound entry_time for pruning, find
+    them. Returns how many were swapped.
+    """
+    with connection.cursor() as c:
+        c.execute(f'UPDATE "{TABLE}" SET entry_time = exit_time, exit_time = entry_time WHERE exit_time < entry_time')
+        return c.rowcount
+
+
+def _period_start(dt, interval):
+    dt = dt.astimezone(dt_timezone.utc)
+    if interval == "year":
+        return datetime(dt.year, 1, 1, tzinfo=dt_timezone.utc)
+    return datetime(dt.year, dt.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_period(start, interval):
+    if interval == "year":
+        return start.replace(year=start.year + 1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+_NAME_RE = re.compile(rf"{TABLE}_p\d{{4}}(_\d{{2}})?")
+
+
+def _partition_name(start, interval):
+    if interval == "year":
+        return f"{TABLE}_p{start:%Y}"
+    return f"{TABLE}_p{start:%Y_%m}"
+
+
+def _periods(first, last, interval):
+    """Yield period starts covering first..last (inclusive)."""
+    start = _period_start(first, interval)
+    while start <= last:
+        yield start
+        start = _next_period(start, interval)
+
+
+def _existing_partitions(c):
+    c.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = %s::regclass",
+        [TABLE],
+    )
+    return {row[0] for row in c.fetchall()}
+
+
+def _create_partition(c, start, interval):
+    """
+    Create and attach one partition. Rows already sitting in the DEFAULT
+    partition for that range are moved into it, since Postgres refuses to attach
+    a range that the default partition still holds rows for.
+    """
+    end = _next_period(start, interval)
+    name = _partition_name(start, interval)
+    c.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    c.execute(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE entry_time >= %s AND entry_time < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        [start, end],
+    )
+    c.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [start, end])
+    return name
+
+
+def _detect_interval(partitions):
+    for name in partitions:
+        match = _NAME_RE.fullmatch(name)
+        if match:
+            return "month" if match.group(1) else "year"
+    return None
+
+
+def ensure_partitions(interval=None, ahead=3, now=None):
+    """
+    Make sure partitions exist from the current period through `ahead` periods
+    after it. The interval defaults to the one the table was converted with.
+    Returns the names of partitions created.
+    """
+    now = now or datetime.now(dt_timezone.utc)
+    created = []
+    with transaction.atomic(), connection.cursor() as c:
+        existing = _existing_partitions(c)
+        detected = _detect_interval(existing)
+        interval = interval or detected or "month"
+        if interval not in INTERVALS:
+            raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+        if detected and interval != detected:
+            raise ValueError(f"the table is partitioned by {detected}, not {interval}")
+        last = _period_start(now, interval)
+        for _ in range(ahead):
+            last = _next_period(last, interval)
+        for start in _periods(now, last, interval):
+            if _partition_name(start, interval) not in existing:
+                created.append(_create_partition(c, start, interval))
+    return created
+
+
+def convert(interval="month", ahead=3, now=None):
+    """
+    Rebuild journal_trade as a range-partitioned table, keeping every row,
+    index, constraint and the id sequence position. Runs in one transaction and
+    holds an exclusive lock on the table while it copies the data.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+    old = f"{TABLE}_unpartitioned"
+    now = now or datetime.now(dt_timezone.utc)
+    with transaction.atomic(), connection.cursor() as c:
+        if _is_partitioned(c):
+            return []
+        # Deferred FK checks queued earlier in this transaction would block ALTER TABLE.
+        c.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        schema = _capture_schema(c)
+        c.execute(f'SELECT min(entry_time), max(entry_time) FROM "{TABLE}"')
+        first, last = c.fetchone()
+
+        c.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        c.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+            f"INCLUDING IDENTITY INCLUDING STORAGE) PARTITION BY RANGE (entry_time)"
+        )
+        c.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+        stop = _period_start(now, interval)
+        for _ in range(ahead):
+            stop = _next_period(stop, interval)
+        created = [
+            _create_partition(c, start, interval)
+            for start in _periods(min(first or now, now), max(last or now, stop), interval)
+        ]
+
+        # Load before building indexes; it's much faster than maintaining them row by row.
+        c.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+        _move_sequence(c, old)
+        c.execute(f'DROP TABLE "{old}"')
+        c.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, entry_time)')
+        _restore_schema(c, *schema)
+        c.execute(f'ANALYZE "{TABLE}"')
+    return created
+
+
+def revert():
+    """Rebuild journal_trade as a plain table with the original primary key."""
+    old = f"{TABLE}_partitioned"
+    with transaction.atomic(), connection.cursor() as c:
+        if not _is_partitioned(c):
+            return False
+        c.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        schema = _capture_schema(c)
+        c.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        c.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+            f"INCLUDING IDENTITY INCLUDING STORAGE)"
+        )
+        c.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+        _move_sequence(c, old)
+        c.execute(f'DROP TABLE "{old}"')
+        c.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id)')
+        _restore_schema(c, *schema)
+        c.execute(f'ANALYZE "{TABLE}"')
+    return True
+
+
+def _capture_schema(c):
+    """
+    Index definitions (minus the primary key), foreign keys, triggers and
+    dependent views, to replay on the new table; CREATE TABLE ... LIKE copies
+    none of them. The views are dropped here: they would follow the rename
+    and keep the old table from being dropped.
+    """
+    c.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s",
+        [TABLE, f"{TABLE}_pkey"],
+    )
+    indexes = [row[0] for row in c.fetchall()]
+    c.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    foreign_keys = c.fetchall()
+    c.execute(
+        "SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal",
+        [TABLE],
+    )
+    triggers = [row[0] for row in c.fetchall()]
+    c.execute(
+        "SELECT DISTINCT view.relname, pg_get_viewdef(view.oid) FROM pg_depend "
+        "JOIN pg_rewrite ON pg_rewrite.oid = pg_depend.objid "
+        "JOIN pg_class view ON view.oid = pg_rewrite.ev_class "
+        "WHERE pg_depend.refobjid = %s::regclass AND view.oid <> pg_depend.refobjid",
+        [TABLE],
+    )
+    views = c.fetchall()
+    for name, _definition in views:
+        c.execute(f'DROP VIEW "{name}"')
+    return indexes, foreign_keys, triggers, views
+
+
+def _restore_schema(c, indexes, foreign_keys, triggers, views):
+    for indexdef in indexes:
+        # The old table and its indexes are gone by now, so the names are free again.
+        # Partitioned parents report "ON ONLY"; the rebuilt index must cover every partition.
+        c.execute(indexdef.replace(" ON ONLY ", " ON ", 1))
+    for name, definition in foreign_keys:
+        c.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+    for triggerdef in triggers:
+        # Added after the copy; the old table's triggers already maintained those rows.
+        c.execute(triggerdef)
+    for name, definition in views:
+        c.execute(f'CREATE VIEW "{name}" AS {definition}')
+
+
+def _move_sequence(c, old):
+    """Carry the id sequence position over and give the new sequence the usual name."""
+    c.execute("SELECT pg_get_serial_sequence(%s, 'id'), pg_get_serial_sequence(%s, 'id')", [TABLE, old])
+    new_seq, old_seq = c.fetchone()
+    c.execute(f"SELECT setval(%s, (SELECT last_value FROM {old_seq}), (SELECT is_called FROM {old_seq}))", [new_seq])
+    # Dropping the old table drops its sequence; rename ours afterwards.
+    c.execute(f'ALTER TABLE "{old}" ALTER COLUMN id DROP IDENTITY')
+    c.execute(f"ALTER SEQUENCE {new_seq} RENAME TO {TABLE}_id_seq")
@@ -0,0 +1,208 @@
+"""
+Last-price quotes for marking open trades to market.
+
+Quotes come from a local file written by our market-data process, set with
+JOURNAL_QUOTES_PATH:
+
+- CSV with a header row: symbol,price and optionally time (ISO 8601).
+- JSON: {"time": "...", "quotes": {"AAPL": "190.12", ...}}; a quote may also be
+  {"price": ..., "time": ...} to carry its own time.
+
+Quotes without a time are as old as the file. The file is re-read when its
+modification time changes, checked at most every JOURNAL_QUOTES_CHECK_SECONDS,
+so the writer should replace it atomically (write elsewhere, then rename).
+Between reloads quotes live in a per-process dict keyed by symbol; a quote
+older than JOURNAL_QUOTES_TTL_SECONDS is evicted rather than used to price a
+position.
+
+unrealized_pnl() marks all of a user's open trades in one pass: a single
+grouped query sums quantity and cost per symbol and side, and each group is
+priced with one multiplication, since sum((mark - price) * qty) equals
+mark * sum(qty) - sum(price * qty).
+"""
+import csv
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import symbols
+from .models import Trade
+
+Quote = namedtuple("Quote", "price time")
+
+PNL_QUANT = Decimal("0.01")
+
+
+def _parse_price(value):
+    try:
+        price = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return price if price.is_finite() and price > 0 else None
+
+
+def _parse_time(value, default):
+    if not value:
+        return default
+    dt = parse_datetime(str(value).strip())
+    if dt is None:
+        return default
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+def _read_csv(fh, file_time):
+    quotes = {}
+    for row in csv.DictReader(fh):
+        row = {(k or "").strip().lower(): v for k, v in row.items()}
+        symbol = (row.get("symbol") or "").strip().upper()
+        price = _parse_price(row.get("price"))
+        if symbol and price is not None:
+            quotes[symbol] = Quote(price, _parse_time(row.get("time"), file_time))
+    return quotes
+
+
+def _read_json(fh, file_time):
+    data = json.load(fh)
+    snapshot_time = _parse_time(data.get("time"), file_time)
+    quotes = {}
+    for symbol, value in (data.get("quotes") or {}).items():
+        time = snapshot_time
+        if isinstance(value, dict):
+            time = _parse_time(value.get("time"), snapshot_time)
+            value = value.get("price")
+        price = _parse_price(value)
+        if symbol.strip() and price is not None:
+            quotes[symbol.strip().upper()] = Quote(price, time)
+    return quotes
+
+
+class QuoteStore:
+    """Quotes from one file, cached in memory and reloaded when the file changes."""
+    def __init__(self, path, ttl=300, check_interval=2.0):
+        self.path = path
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._quotes = {}
+        self._mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _refresh(self, now):
+        if self._checked_at is not None and (now - self._checked_at).total_seconds() < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                # No snapshot yet (or it was removed); keep what we have until it expires.
+                return
+            if mtime == self._mtime:
+                return
+            file_time = datetime.fromtimestamp(mtime, tz=dt_timezone.utc)
+            reader = _read_json if self.path.lower().endswith(".json") else _read_csv
+            try:
+                with open(self.path, newline="", encoding="utf-8") as fh:
+                    quotes = reader(fh, file_time)
+            except (OSError, ValueError, AttributeError, csv.Error):
+                # A half-written or malformed file; retry once it changes again.
+                return
+            self._quotes, self._mtime = quotes, mtime
+
+    def _fresh(self, quote, now):
+        return not self.ttl or now - quote.time <= timedelta(seconds=self.ttl)
+
+    def get_many(self, symbols):
+        """{symbol: Quote} for those symbols with a quote younger than the TTL."""
+        now = timezone.now()
+        self._refresh(now)
+        found, expired = {}, []
+        for symbol in symbols:
+            quote = self._quotes.get(symbol)
+            if quote is None:
+                continue
+            if self._fresh(quote, now):
+                found[symbol] = quote
+            else:
+                expired.append(symbol)
+        if expired:
+            with self._lock:
+                for symbol in expired:
+                    self._quotes.pop(symbol, None)
+        return found
+
+    def get(self, symbol):
+        return self.get_many([symbol]).get(symbol)
+
+
+_store = None
+
+
+def get_store():
+    """The process-wide store for the configured file, or None when none is configured."""
+    global _store
+    path = settings.JOURNAL_QUOTES_PATH
+    if not path:
+        return None
+    config = (path, settings.JOURNAL_QUOTES_TTL_SECONDS, settings.JOURNAL_QUOTES_CHECK_SECONDS)
+    if _store is None or (_store.path, _store.ttl, _store.check_interval) != config:
+        _store = QuoteStore(*config)
+    return _store
+
+
+def unrealized_pnl(user, tags=()):
+    """
+    Mark the user's open trades (those with every tag in tags) to market.
+    Returns {"positions": [...], "unrealized_pnl": total over priced positions,
+    "unpriced": [symbols]}; one position per symbol and side.
+    """
+    trades = Trade.objects.filter(owner=user, exit_price__isnull=True)
+    if tags:
+        trades = trades.filter(tags__contains=list(tags))
+    groups = list(
+        trades.values("symbol_ref", "side")
+        .annotate(
+            trades=Count("id"),
+            open_quantity=Sum("quantity"),
+            cost=Sum(ExpressionWrapper(F("price") * F("quantity"), output_field=DecimalField(max_digits=20, decimal_places=6))),
+        )
+        .order_by()
+    )
+    names = symbols.names({g["symbol_ref"] for g in groups})
+    for g in groups:
+        g["symbol"] = names[g["symbol_ref"]]
+    groups.sort(key=lambda g: (g["symbol"], g["side"]))
+    store = get_store()
+    quotes = store.get_many({g["symbol"] for g in groups}) if store else {}
+
+    positions, total, unpriced = [], Decimal(0), []
+    for g in groups:
+        quote = quotes.get(g["symbol"])
+        pnl = None
+        if quote is not None:
+            pnl = quote.price * g["open_quantity"] - g["cost"]
+            if g["side"] == "SELL":
+                pnl = -pnl
+            pnl = pnl.quantize(PNL_QUANT)
+            total += pnl
+        elif g["symbol"] not in unpriced:
+            unpriced.append(g["symbol"])
+        positions.append({
+            "symbol": g["symbol"],
+            "side": g["side"],
+            "trades": g["trades"],
+            "quantity": g["open_quantity"],
+            "avg_price": (g["cost"] / g["open_quantity"]).quantize(Decimal("0.0001")),
+            "mark": quote.price if quote else None,
+            "quote_time": quote.time if quote else None,
+            "unrealized_pnl": pnl,
+        })
+    return {"positions": positions, "unrealized_pnl": total, "unpriced": unpriced}
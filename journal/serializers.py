@@ -1,5 +1,6 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from .models import Trade
+from .models import Trade, normalize_tags, validate_tags
 
 class TradeSerializer(serializers.ModelSerializer):
     """Serializer for the Trade model, including computed PnL and owner display."""
@@ -8,9 +9,26 @@ class TradeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Trade
-        fields = ['id', 'symbol', 'side', 'quantity', 'price', 'entry_time', "exit_price", "exit_time", "pnl", 'notes']
+        fields = ['id', 'owner', 'symbol', 'side', 'quantity', 'price', 'entry_time', "exit_price", "exit_time", "pnl", "tags", 'notes']
         read_only_fields = ['id', "pnl", 'created_at']
 
+    def validate_tags(self, value):
+        """Store tags normalized, as Trade.save() does."""
+        tags = normalize_tags(value)
+        try:
+            validate_tags(tags)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+        return tags
+
+    def validate(self, attrs):
+        """Reject exits before entries, as Trade.clean() does for forms."""
+        entry = attrs.get("entry_time", getattr(self.instance, "entry_time", None))
+        exit_time = attrs.get("exit_time", getattr(self.instance, "exit_time", None))
+        if entry and exit_time and exit_time < entry:
+            raise serializers.ValidationError({"exit_time": "Exit time cannot be earlier than entry time."})
+        return attrs
+
     def get_pnl(self, obj):
         """Return the computed profit and loss for the trade."""
         return obj.pnl
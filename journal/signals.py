@@ -1,20 +1,67 @@
 """
 Django signal handlers for the journal app.
-Includes automatic creation of user trade settings and syncing user email with primary EmailAddress.
+Includes automatic creation of user trade settings, syncing user email with primary EmailAddress,
+invalidating the user/trade-settings cache (journal.caching) and publishing live trade
+updates (journal.live).
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from allauth.account.models import EmailAddress
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import UserTradeSettings
+from . import live
+from .caching import invalidate_trade_settings, invalidate_user
+from .models import Trade, UserTradeSettings
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_trade_settings(sender, instance, created, **kwargs):
-    """Create UserTradeSettings instance when a new user is created."""
+    """Create UserTradeSettings instance when a new user is created; drop the cached user on change."""
     if created:
         UserTradeSettings.objects.create(user=instance)
+    else:
+        invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_deleted_user(sender, instance, **kwargs):
+    """Drop the cached user and settings of a deleted user."""
+    invalidate_user(instance.pk)
+    invalidate_trade_settings(instance.pk)
+
+
+@receiver(post_save, sender=UserTradeSettings)
+@receiver(post_delete, sender=UserTradeSettings)
+def invalidate_cached_trade_settings(sender, instance, **kwargs):
+    """Drop the cached UserTradeSettings whenever they change."""
+    invalidate_trade_settings(instance.user_id)
+
+
+# The fields a live update is computed from (journal.live.trade_event).
+LIVE_FIELDS = ("symbol", "side", "quantity", "price", "exit_price", "exit_time", "tags")
+
+
+@receiver(pre_save, sender=Trade)
+def remember_trade_before_save(sender, instance, raw=False, using=None, **kwargs):
+    """Load the stored version of an edited trade, so its live update can say what changed."""
+    if instance.pk is not None and not raw and live.enabled():
+        instance._live_before = Trade.objects.using(using).filter(pk=instance.pk).only(*LIVE_FIELDS).first()
+
+
+@receiver(post_save, sender=Trade)
+def publish_trade_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    """Send the trade's owner a live update once the save commits."""
+    before = instance.__dict__.pop("_live_before", None)
+    if raw or not live.enabled():
+        return
+    live.publish_on_commit(instance.owner_id, live.trade_event(None if created else before, instance), using)
+
+
+@receiver(post_delete, sender=Trade)
+def publish_trade_deleted(sender, instance, using=None, **kwargs):
+    """Send the trade's owner a live update once the delete commits."""
+    if live.enabled():
+        live.publish_on_commit(instance.owner_id, live.trade_event(instance, None), using)
 
 @receiver(post_save, sender=EmailAddress)
 def sync_primary_email_to_user(sender, instance: EmailAddress, created, **kwargs):
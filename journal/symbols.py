@@ -0,0 +1,62 @@
+"""
+The symbol dictionary (models.Symbol): names for symbol ids, and symbol
+filters resolved to ids.
+
+Queries group by Trade.symbol_ref, an integer, and names are joined in
+afterwards from a per-process cache. Symbols are never renamed or deleted,
+so a cached name can't go stale. Only the ids of symbols first seen since
+the process started cost a query.
+
+A ?symbol= filter matches one symbol exactly, case-insensitively, or every
+symbol starting with a prefix when it ends in "*" (AA* -> AA, AAL, AAPL...).
+It is resolved to a list of ids once per request; the trade queries then
+filter on symbol_ref with the (owner, symbol_ref) index.
+"""
+from .models import Symbol
+
+_names = {}  # id -> name
+
+
+def _missing(ids):
+    return [i for i in ids if i not in _names]
+
+
+def names(ids):
+    """{id: name} for the given symbol ids."""
+    missing = _missing(ids)
+    if missing:
+        _names.update(Symbol.objects.filter(id__in=missing).values_list("id", "name"))
+    return {i: _names[i] for i in ids if i in _names}
+
+
+async def anames(ids):
+    missing = _missing(ids)
+    if missing:
+        async for symbol_id, name in Symbol.objects.filter(id__in=missing).values_list("id", "name"):
+            _names[symbol_id] = name
+    return {i: _names[i] for i in ids if i in _names}
+
+
+def parse_filter(value):
+    """The ?symbol= value as (text, prefix) in dictionary case, or None when blank."""
+    text = (value or "").strip().upper()
+    prefix = text.endswith("*")
+    text = text.rstrip("*").strip()
+    if not text:
+        return None
+    return text, prefix
+
+
+def _matching(spec):
+    text, prefix = spec
+    lookup = {"name__startswith": text} if prefix else {"name": text}
+    return Symbol.objects.filter(**lookup).values_list("id", flat=True)
+
+
+def ids_for(spec):
+    """Ids of the symbols matching a parse_filter() result."""
+    return list(_matching(spec))
+
+
+async def aids_for(spec):
+    return [symbol_id async for symbol_id in _matching(spec)]
@@ -0,0 +1,82 @@
+"""
+Query assertions for the test suite.
+
+QueryLog records every SQL statement issued inside a block, on any database
+alias and in any thread, through config.metrics.track_queries; so the queries
+async views run in sync_to_async helpers or run_concurrently are counted too.
+
+Statements are compared as the driver receives them, with %s placeholders in
+place of their parameters. A template, serializer field or admin column that
+loads a relation per row therefore issues the same statement once per row,
+and QueryLog.repeated() reports it as N+1.
+
+QueryBudgetMixin adds assertQueryBudget() to a TestCase, checking one request
+against the declarative budgets kept with the tests.
+"""
+import re
+from collections import Counter
+
+from config.metrics import track_queries
+
+MAX_RECORDED = 10000
+
+_SAVEPOINT_RE = re.compile(r'^(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT) "?\w+"?$')
+
+
+def normalize(sql):
+    """The statement with savepoint names dropped, so nested atomic() blocks compare equal."""
+    sql = " ".join(sql.split())
+    match = _SAVEPOINT_RE.match(sql)
+    return match.group(1) if match else sql
+
+
+class QueryLog:
+    """Context manager recording the statements issued inside it."""
+    def __init__(self):
+        self.queries = []
+
+    def __enter__(self):
+        self._tracker = track_queries(record=MAX_RECORDED)
+        self._timer = self._tracker.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._tracker.__exit__(*exc)
+        self.queries = [sql for sql, _seconds in self._timer.queries]
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self):
+        """{statement: executions} for data statements issued more than once."""
+        counts = Counter(normalize(sql) for sql in self.queries)
+        return {
+            sql: count for sql, count in counts.items()
+            if count > 1 and not sql.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT"))
+        }
+
+    def report(self):
+        return "\n".join(f"{i:3}. {sql}" for i, sql in enumerate(self.queries, 1))
+
+
+class QueryBudgetMixin:
+    """TestCase mixin for per-request query budgets and N+1 detection."""
+    def assertQueryBudget(self, budget, request, *args, allow_repeated=(), **kwargs):
+        """
+        Call request(*args, **kwargs), typically self.client.get, and check it
+        issued at most `budget` queries and no statement twice, other than
+        those in allow_repeated. Returns the log.
+        """
+        with QueryLog() as log:
+            response = request(*args, **kwargs)
+        self.assertEqual(response.status_code, 200, f"{args}: HTTP {response.status_code}")
+        repeated = {sql: n for sql, n in log.repeated().items() if sql not in allow_repeated}
+        self.assertFalse(
+            repeated,
+            "Repeated statements (N+1?):\n" + "\n".join(f"{n}x {sql}" for sql, n in repeated.items()),
+        )
+        self.assertLessEqual(
+            len(log), budget,
+            f"{args}: {len(log)} queries, budget {budget}:\n{log.report()}",
+        )
+        return log
@@ -2,12 +2,16 @@
 """
 Unit and integration tests for the journal app, including models, views, API, and import/export.
 """
-from django.test import TestCase
+from unittest import skipUnless
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.http import HttpResponse
-from .models import Trade, UserTradeSettings
+from . import columnar_import, quotes
+from .testing import QueryBudgetMixin
+from .models import ImportUpload, Trade, UserTradeSettings
 from django.core.files.uploadedfile import SimpleUploadedFile
 import csv
 from io import TextIOWrapper
@@ -54,6 +58,15 @@ class TradeModelTests(TestCase):
         )
         self.assertIsNone(trade.pnl)
 
+    def test_pnl_expression_matches_property(self):
+        from .models import PNL_EXPR
+        now = timezone.now()
+        Trade.objects.create(owner=self.user, symbol="A", side="BUY", quantity="2.5", price="10.1234", exit_price="12.5", exit_time=now)
+        Trade.objects.create(owner=self.user, symbol="B", side="SELL", quantity=3, price=50, exit_price="55.75", exit_time=now)
+        Trade.objects.create(owner=self.user, symbol="C", side="SELL", quantity=1, price=50)
+        for trade in Trade.objects.annotate(pnl_value=PNL_EXPR):
+            self.assertEqual(trade.pnl_value, trade.pnl, trade.symbol)
+
 
 
 class AuthAndPermissionsTests(TestCase):
@@ -146,6 +159,25 @@ class TradesCRUDTests(TestCase):
         resp = self.client.post(reverse("trades_delete", args=[trade.pk]))
         self.assertEqual(resp.status_code, 404)
 
+    def test_list_fetches_a_notes_preview(self):
+        from .testing import QueryLog
+        journal = "Opened on the breakout. " * 1000
+        trade = Trade.objects.create(owner=self.user, symbol="AMD", side="SELL", quantity=2, price=100,
+                                     exit_price=90, exit_time=timezone.now(), notes=journal)
+        self.client.force_login(self.user)
+        with QueryLog() as log:
+            resp = self.client.get(reverse("trades_list"))
+        row = resp.context["trades"][0]
+        self.assertEqual(row["pnl_value"], trade.pnl)
+        self.assertNotIn("notes", row)
+        self.assertContains(resp, journal[:79] + "…")
+        self.assertNotContains(resp, journal[:81])
+        sql = " ".join(q for q in log.queries if "journal_trade" in q)
+        self.assertIn('SUBSTRING("journal_trade"."notes", %s, %s) AS "notes_preview"', sql)
+        self.assertNotIn('"journal_trade"."notes"', sql.replace('SUBSTRING("journal_trade"."notes"', ""))
+        # The edit page still has the whole text.
+        self.assertContains(self.client.get(reverse("trades_edit", args=[trade.pk])), journal.strip())
+
 
 
 class ImportExportTests(TestCase):
@@ -158,7 +190,7 @@ class ImportExportTests(TestCase):
         Trade.objects.create(owner=self.user, symbol="AMD", side="BUY", quantity=1, price=10, exit_price=12, exit_time=timezone.now())
         resp = self.client.get(reverse("trades_export_csv"))
         self.assertEqual(resp.status_code, 200)
-        content = resp.content.decode()
+        content = b"".join(resp.streaming_content).decode()
         self.assertIn("AMD", content)
         self.assertTrue(content.startswith("id,entry_time,symbol"))
 
@@ -184,6 +216,242 @@ class ImportExportTests(TestCase):
         # (self.user, self.user1, etc.)
         self.assertEqual(Trade.objects.filter(owner=self.user, symbol="IBM").count(), 1)
 
+    def test_import_csv_preview_is_bounded_and_commit_is_batched(self):
+        from unittest import mock
+        header = b"entry_time,symbol,side,quantity,price,exit_price,exit_time,notes\n"
+        rows = [b"2025-01-0%dT10:00:00Z,IBM,BUY,1,100,,,n" % day for day in range(1, 6)]
+        bad = b"2025-01-06T10:00:00Z,IBM,HOLD,1,100,,,n"
+
+        def post(lines, dry_run):
+            upload = SimpleUploadedFile("trades.csv", header + b"\n".join(lines))
+            return self.client.post(reverse("trades_import"), {"file": upload, "dry_run": dry_run})
+
+        with mock.patch("journal.views.IMPORT_PREVIEW_ROWS", 2), mock.patch("journal.views.IMPORT_BATCH_ROWS", 2):
+            resp = post(rows, dry_run=True)
+            self.assertEqual([p["line"] for p in resp.context["preview"]], [2, 3])
+            self.assertEqual((resp.context["count_ok"], resp.context["count_total"]), (5, 5))
+            self.assertEqual(resp.context["preview_note"], "Showing the first 2 of 5 rows.")
+
+            # A bad row at the end rolls back the batches already saved.
+            resp = post(rows + [bad], dry_run=False)
+            self.assertEqual([p["line"] for p in resp.context["preview"]], [7])
+            self.assertFalse(Trade.objects.exists())
+
+            with mock.patch.object(Trade.objects, "bulk_create", wraps=Trade.objects.bulk_create) as bulk_create:
+                resp = post(rows, dry_run=False)
+        self.assertRedirects(resp, reverse("trades_list"))
+        self.assertEqual(Trade.objects.filter(owner=self.user).count(), 5)
+        self.assertEqual([len(c.args[0]) for c in bulk_create.call_args_list], [2, 2, 1])
+
+    def test_export_xlsx_round_trips_through_import(self):
+        now = timezone.now()
+        Trade.objects.create(
+            owner=self.user, symbol="AMD", side="BUY", quantity=2, price=10,
+            entry_time=now - timezone.timedelta(hours=1), exit_price=12, exit_time=now,
+        )
+        Trade.objects.create(owner=self.user, symbol="TSLA", side="SELL", quantity=1, price=50, notes="short")
+        resp = self.client.get(reverse("trades_export"), {"format": "xlsx", "symbol": "amd"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("trades_export.xlsx", resp["Content-Disposition"])
+        data = b"".join(resp.streaming_content)
+
+        upload = SimpleUploadedFile("trades.xlsx", data)
+        resp = self.client.post(reverse("trades_import"), {"file": upload, "dry_run": False})
+        self.assertRedirects(resp, reverse("trades_list"))
+        self.assertEqual(Trade.objects.filter(owner=self.user, symbol="AMD").count(), 2)
+        self.assertEqual(Trade.objects.filter(owner=self.user, symbol="TSLA").count(), 1)
+
+    def test_export_parquet_is_typed(self):
+        from decimal import Decimal
+        from . import exporting
+        if not exporting.PARQUET_AVAILABLE:
+            self.skipTest("pyarrow is not installed")
+        Trade.objects.create(owner=self.user, symbol="AMD", side="BUY", quantity=3, price="10.1200", exit_price="12.5000", exit_time=timezone.now())
+        Trade.objects.create(owner=self.user, symbol="NVDA", side="SELL", quantity=1, price=50)
+        resp = self.client.get(reverse("trades_export"), {"format": "parquet", "side": "BUY"})
+        self.assertEqual(resp.status_code, 200)
+        import pyarrow as pa, pyarrow.parquet as pq
+        table = pq.read_table(pa.BufferReader(b"".join(resp.streaming_content)))
+        self.assertEqual(table.num_rows, 1)
+        self.assertEqual(str(table.schema.field("entry_time").type), "timestamp[us, tz=UTC]")
+        row = table.to_pylist()[0]
+        self.assertEqual(row["symbol"], "AMD")
+        self.assertEqual(row["price"], Decimal("10.1200"))
+        self.assertEqual(row["pnl"], Decimal("7.14"))
+
+    def test_export_unknown_format(self):
+        resp = self.client.get(reverse("trades_export"), {"format": "pdf"})
+        self.assertEqual(resp.status_code, 400)
+
+
+@skipUnless(columnar_import.AVAILABLE, "pyarrow is not installed")
+class ColumnarImportTests(TestCase):
+    """Tests for Parquet/Arrow/JSONL imports and their column-at-a-time validation."""
+    def setUp(self):
+        self.user = User.objects.create_user("gina", "g@example.com", "pw123")
+        self.client.force_login(self.user)
+
+    def _import(self, name, data, dry_run):
+        upload = SimpleUploadedFile(name, data)
+        return self.client.post(reverse("trades_import"), {"file": upload, "dry_run": dry_run})
+
+    def test_parquet_export_round_trips(self):
+        now = timezone.now()
+        Trade.objects.create(owner=self.user, symbol="AMD", side="BUY", quantity=2, price="10.5",
+                             entry_time=now - timezone.timedelta(hours=1), exit_price=12, exit_time=now)
+        Trade.objects.create(owner=self.user, symbol="TSLA", side="SELL", quantity=1, price=50, notes="open")
+        data = b"".join(self.client.get(reverse("trades_export"), {"format": "parquet"}).streaming_content)
+
+        resp = self._import("trades.parquet", data, dry_run=False)
+        self.assertRedirects(resp, reverse("trades_list"))
+        amd = Trade.objects.filter(owner=self.user, symbol="AMD").order_by("id")
+        self.assertEqual(amd.count(), 2)
+        self.assertEqual(amd[1].price, amd[0].price)
+        self.assertEqual(amd[1].exit_time, amd[0].exit_time)
+        self.assertEqual(list(Trade.objects.filter(owner=self.user, symbol="TSLA").values_list("notes", flat=True)), ["open", "open"])
+
+    def test_jsonl_rows_are_validated_by_column(self):
+        jsonl = (
+            b'{"entry_time": "2025-01-01T10:00:00Z", "symbol": "ibm", "side": "buy", "quantity": 1, "price": 100, "exit_price": 105, "exit_time": "2025-01-01 15:00:00", "notes": "ok"}\n'
+            b'{"entry_time": "2025-01-02T10:00:00Z", "symbol": "", "side": "HOLD", "quantity": 0, "price": 5, "exit_price": 6, "exit_time": null}\n'
+            b'{"entry_time": "2025-01-03T10:00:00+02:00", "symbol": "X", "side": "SELL", "quantity": 1, "price": 5, "exit_price": 6, "exit_time": "2025-01-02T10:00:00Z"}\n'
+        )
+        resp = self._import("trades.jsonl", jsonl, dry_run=False)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(Trade.objects.exists())
+        self.assertEqual(resp.context["count_ok"], 1)
+        errors = {row["line"]: row["errors"] for row in resp.context["preview"]}
+        self.assertEqual(set(errors), {2, 3})
+        self.assertEqual(errors[2], [
+            "symbol required", "side must be BUY or SELL", "quantity must be greater than 0",
+            "exit_price and exit_time must be set together",
+        ])
+        self.assertEqual(errors[3], ["exit_time before entry_time"])
+
+        resp = self._import("trades.jsonl", jsonl.splitlines(keepends=True)[0], dry_run=False)
+        self.assertRedirects(resp, reverse("trades_list"))
+        trade = Trade.objects.get(owner=self.user)
+        self.assertEqual((trade.symbol, trade.side), ("IBM", "BUY"))
+
+    def test_missing_columns(self):
+        resp = self._import("trades.jsonl", b'{"symbol": "IBM"}\n', dry_run=True)
+        self.assertIn("Missing required columns", resp.context["file_errors"][0])
+
+
+class ChunkedUploadTests(TestCase):
+    """Tests for resumable chunked import uploads."""
+    CSV = (
+        b"entry_time,symbol,side,quantity,price,exit_price,exit_time,notes\n"
+        b"2025-01-01T10:00:00Z,IBM,BUY,1,100,105,2025-01-01T15:00:00Z,first\n"
+        b"2025-01-02T10:00:00Z,AMD,SELL,2,50,,,second\n"
+    )
+
+    def setUp(self):
+        import tempfile
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.settings_override = override_settings(JOURNAL_UPLOAD_DIR=tmp.name, JOURNAL_UPLOAD_CHUNK_BYTES=128)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = User.objects.create_user("hank", "h@example.com", "pw123")
+        self.client.force_login(self.user)
+
+    def _start(self, **extra):
+        resp = self.client.post(reverse("import_uploads"), {"filename": "broker.csv", "size": len(self.CSV), **extra})
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()
+
+    def _put(self, url, first, last, checksum=True, body=None):
+        import hashlib
+        body = self.CSV[first:last + 1] if body is None else body
+        headers = {"Content-Range": f"bytes {first}-{last}/{len(self.CSV)}"}
+        if checksum:
+            headers["X-Chunk-SHA256"] = hashlib.sha256(body).hexdigest()
+        return self.client.put(url, body, content_type="application/octet-stream", headers=headers)
+
+    def test_resume_after_failures_then_import(self):
+        import os
+        from .uploads import path_for
+        state = self._start()
+        url = state["url"]
+        self.assertEqual(self._put(url, 0, 63).json()["offset"], 64)
+
+        # A corrupted chunk is rejected and leaves nothing behind.
+        bad = self.client.put(url, b"x" * 64, content_type="application/octet-stream", headers={
+            "Content-Range": f"bytes 64-127/{len(self.CSV)}", "X-Chunk-SHA256": "0" * 64,
+        })
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(bad.json()["offset"], 64)
+
+        # Resending an already stored chunk reports where to continue.
+        again = self._put(url, 0, 63)
+        self.assertEqual(again.status_code, 409)
+        self.assertEqual(again.json()["offset"], 64)
+
+        self.assertEqual(self.client.get(url).json()["offset"], 64)
+        done = self._put(url, 64, len(self.CSV) - 1).json()
+        self.assertTrue(done["complete"])
+
+        resp = self.client.post(reverse("trades_import"), {"upload": state["id"], "dry_run": True})
+        self.assertEqual(resp.context["count_ok"], 2)
+        resp = self.client.post(reverse("trades_import"), {"upload": state["id"], "dry_run": False})
+        self.assertRedirects(resp, reverse("trades_list"))
+        self.assertEqual(sorted(Trade.objects.filter(owner=self.user).values_list("symbol", flat=True)), ["AMD", "IBM"])
+        self.assertFalse(ImportUpload.objects.exists())
+        self.assertEqual(os.listdir(os.path.dirname(path_for(ImportUpload(pk=state["id"])))), [])
+
+    def test_whole_file_checksum_is_verified(self):
+        state = self._start(sha256="a" * 64)
+        self._put(state["url"], 0, 63)
+        self._put(state["url"], 64, len(self.CSV) - 1)
+        resp = self.client.post(reverse("trades_import"), {"upload": state["id"], "dry_run": False})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("checksum", resp.context["file_errors"][0])
+        self.assertFalse(Trade.objects.exists())
+
+    def test_chunks_arrive_without_holding_the_row_lock(self):
+        from io import BytesIO
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import uploads
+        state = self._start()
+        upload = ImportUpload.objects.get(pk=state["id"])
+        locked_while_reading = []
+
+        class Stream(BytesIO):
+            def read(self, n=-1):
+                locked_while_reading.append(any("FOR UPDATE" in q["sql"] for q in ctx.captured_queries))
+                return super().read(n)
+
+        with CaptureQueriesContext(connection) as ctx:
+            upload = uploads.append_chunk(upload, Stream(self.CSV[:64]), f"bytes 0-63/{len(self.CSV)}", 64)
+        self.assertEqual(upload.received, 64)
+        self.assertEqual(set(locked_while_reading), {False})
+        self.assertTrue(any("FOR UPDATE" in q["sql"] for q in ctx.captured_queries))
+        with open(uploads.path_for(upload), "rb") as fh:
+            self.assertEqual(fh.read(), self.CSV[:64])
+
+    def test_concurrent_uploads_per_user_are_capped(self):
+        with override_settings(JOURNAL_UPLOAD_MAX_ACTIVE=1):
+            state = self._start()
+            resp = self.client.post(reverse("import_uploads"), {"filename": "more.csv", "size": 10})
+            self.assertEqual(resp.status_code, 429)
+            other = User.objects.create_user("ivy", "i@example.com", "pw123")
+            self.client.force_login(other)
+            self._start()
+            self.client.force_login(self.user)
+            self.client.delete(state["url"])
+            self._start()
+
+    def test_uploads_are_private(self):
+        state = self._start()
+        other = User.objects.create_user("ivy", "i@example.com", "pw123")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(state["url"]).status_code, 404)
+        self.assertEqual(self._put(state["url"], 0, 63).status_code, 404)
+        resp = self.client.post(reverse("trades_import"), {"upload": state["id"], "dry_run": True})
+        self.assertEqual(resp.status_code, 404)
+
 
 
 
@@ -207,6 +475,27 @@ class CalendarTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertContains(resp, self.trade.exit_time.strftime("%B"))
 
+    def test_entry_lookup_only_runs_as_a_fallback_without_the_query_pool(self):
+        from unittest import mock
+        from django.db import connection
+        from journal import concurrency
+
+        def lookups():
+            sql = []
+
+            def record(execute, query, params, many, context):
+                sql.append(query)
+                return execute(query, params, many, context)
+
+            with connection.execute_wrapper(record):
+                self.assertEqual(self.client.get(reverse("trades_calendar")).status_code, 200)
+            return [q for q in sql if q.startswith('SELECT "journal_trade"."entry_time" AS "entry_time"')]
+
+        with mock.patch.object(concurrency, "_executor", None):
+            self.assertEqual(lookups(), [])
+            Trade.objects.filter(pk=self.trade.pk).update(exit_price=None, exit_time=None)
+            self.assertEqual(len(lookups()), 1)
+
     def test_calendar_context_includes_month_total_pnl(self):
         resp = self.client.get(reverse("trades_calendar"))
         self.assertEqual(resp.status_code, 200)
@@ -250,6 +539,190 @@ class APITests(TestCase):
         self.assertEqual(data["values"][0], 10.0)
 
 
+class SymbolStatsTests(TestCase):
+    """Tests for the per-symbol leaderboard API."""
+    def setUp(self):
+        self.user = User.objects.create_user("jack", "j@example.com", "pw123")
+        self.client.force_login(self.user)
+        now = timezone.now()
+        closed = {"entry_time": now - timezone.timedelta(days=1), "exit_time": now, "quantity": 1, "side": "BUY"}
+        for symbol, price, exit_price in [
+            ("AAA", 100, 130), ("AAA", 100, 110), ("AAA", 100, 90),
+            ("BBB", 50, 45),
+            ("CCC", 10, 12), ("CCC", 10, 8),
+        ]:
+            Trade.objects.create(owner=self.user, symbol=symbol, price=price, exit_price=exit_price, **closed)
+        Trade.objects.create(owner=self.user, symbol="AAA", side="BUY", quantity=1, price=100)  # open: ignored
+
+    def test_stats_per_symbol(self):
+        data = self.client.get(reverse("api_symbol_stats")).json()
+        self.assertEqual(data["count"], 3)
+        self.assertEqual([row["symbol"] for row in data["symbols"]], ["AAA", "CCC", "BBB"])
+        self.assertEqual(data["symbols"][0], {
+            "symbol": "AAA", "trades": 3, "wins": 2, "win_rate": 0.6667,
+            "avg_win": 20.0, "avg_loss": -10.0, "best": 30.0, "worst": -10.0, "pnl": 30.0,
+        })
+        self.assertIsNone(data["symbols"][2]["avg_win"])
+
+    def test_top_with_other_bucket(self):
+        data = self.client.get(reverse("api_symbol_stats"), {"top": 1, "sort": "-win_rate"}).json()
+        self.assertEqual([row["symbol"] for row in data["symbols"]], ["AAA"])
+        self.assertEqual(data["other"], {
+            "symbol": None, "symbols": 2, "trades": 3, "wins": 1, "win_rate": 0.3333,
+            "avg_win": 2.0, "avg_loss": -3.5, "best": 2.0, "worst": -5.0, "pnl": -5.0,
+        })
+
+    def test_pagination_and_validation(self):
+        data = self.client.get(reverse("api_symbol_stats"), {"sort": "symbol", "page": 2, "page_size": 2}).json()
+        self.assertEqual([row["symbol"] for row in data["symbols"]], ["CCC"])
+        self.assertEqual((data["count"], data["pages"]), (3, 2))
+        self.assertEqual(self.client.get(reverse("api_symbol_stats"), {"sort": "fees"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_symbol_stats"), {"page_size": 1000}).status_code, 400)
+
+
+class TagTests(TestCase):
+    """Tests for trade tags: normalization, filters and per-tag stats."""
+    def setUp(self):
+        self.user = User.objects.create_user("lee", "l@example.com", "pw123")
+        self.client.force_login(self.user)
+        now = timezone.now()
+        closed = {"owner": self.user, "side": "BUY", "quantity": 1, "price": 100,
+                  "entry_time": now - timezone.timedelta(days=1), "exit_time": now}
+        self.both = Trade.objects.create(symbol="AAA", exit_price=120, tags=[" Breakout", "VWAP", "breakout"], **closed)
+        Trade.objects.create(symbol="BBB", exit_price=90, tags=["breakout"], **closed)
+        Trade.objects.create(symbol="CCC", exit_price=105, **closed)
+
+    def test_tags_are_normalized_and_validated(self):
+        self.assertEqual(self.both.tags, ["breakout", "vwap"])
+        resp = self.client.post("/api/trades/", {
+            "symbol": "DDD", "side": "BUY", "quantity": "1", "price": "10", "tags": ["Swing", "swing"],
+        }, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["tags"], ["swing"])
+        resp = self.client.post("/api/trades/", {
+            "symbol": "DDD", "side": "BUY", "quantity": "1", "price": "10", "tags": ["no spaces"],
+        }, content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("tags", resp.json())
+
+    def test_filters(self):
+        resp = self.client.get(reverse("trades_list"), {"tag": "breakout, vwap"})
+        self.assertEqual([t["symbol"] for t in resp.context["trades"]], ["AAA"])
+        data = self.client.get("/api/trades/", {"tag": "Breakout"}).json()
+        results = data["results"] if isinstance(data, dict) else data
+        self.assertEqual(sorted(t["symbol"] for t in results), ["AAA", "BBB"])
+        data = self.client.get(reverse("api_symbol_pnl"), {"tag": ["breakout", "vwap"]}).json()
+        self.assertEqual(data["labels"], ["AAA"])
+
+    def test_tag_stats(self):
+        data = self.client.get(reverse("api_tag_stats")).json()
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(data["tags"][0], {
+            "tag": "vwap", "trades": 1, "wins": 1, "win_rate": 1.0,
+            "avg_win": 20.0, "avg_loss": None, "best": 20.0, "worst": 20.0, "pnl": 20.0,
+        })
+        self.assertEqual((data["tags"][1]["tag"], data["tags"][1]["pnl"]), ("breakout", 10.0))
+        data = self.client.get(reverse("api_tag_stats"), {"sort": "tag", "top": 1}).json()
+        self.assertEqual(data["tags"][0]["tag"], "breakout")
+        self.assertEqual((data["other"]["tags"], data["other"]["pnl"]), (1, 20.0))
+
+
+class SymbolTests(TestCase):
+    """Tests for the symbol dictionary: interning, exact/prefix filters and grouping by id."""
+    def setUp(self):
+        self.user = User.objects.create_user("sam", "s@example.com", "pw123")
+        self.client.force_login(self.user)
+        now = timezone.now()
+        closed = {"owner": self.user, "side": "BUY", "quantity": 1, "price": 100,
+                  "entry_time": now - timezone.timedelta(days=1), "exit_time": now}
+        Trade.objects.create(symbol="AAPL", exit_price=110, **closed)
+        Trade.objects.create(symbol="AA", exit_price=95, **closed)
+        Trade.objects.create(symbol="MSFT", exit_price=130, **closed)
+
+    def test_every_write_path_interns_the_symbol(self):
+        from journal.models import Symbol
+        Trade.objects.bulk_create([Trade(owner=self.user, symbol=" aapl ", side="BUY", quantity=1, price=1,
+                                         entry_time=timezone.now())])
+        self.assertEqual(Trade.objects.filter(symbol="AAPL").values("symbol_ref").distinct().count(), 1)
+        Trade.objects.filter(symbol="MSFT").update(symbol="nvda")
+        trade = Trade.objects.select_related("symbol_ref").get(symbol="NVDA")
+        self.assertEqual(trade.symbol_ref.name, "NVDA")
+        self.assertEqual(Symbol.objects.filter(name__in=["AAPL", "NVDA"]).count(), 2)
+
+    def test_exact_and_prefix_filters(self):
+        resp = self.client.get(reverse("trades_list"), {"symbol": "aa"})
+        self.assertEqual([t["symbol"] for t in resp.context["trades"]], ["AA"])
+        resp = self.client.get(reverse("trades_list"), {"symbol": "AA*"})
+        self.assertEqual(sorted(t["symbol"] for t in resp.context["trades"]), ["AA", "AAPL"])
+        resp = self.client.get(reverse("trades_list"), {"symbol": "ZZZ"})
+        self.assertEqual(list(resp.context["trades"]), [])
+        data = self.client.get(reverse("api_daily_pnl"), {"symbol": "ms*"}).json()
+        self.assertEqual(data["values"], [30.0])
+
+    def test_group_bys_are_named_after_aggregation(self):
+        data = self.client.get(reverse("api_symbol_pnl")).json()
+        self.assertEqual(data["labels"], ["AA", "AAPL", "MSFT"])
+        self.assertEqual(data["values"], [-5.0, 10.0, 30.0])
+        data = self.client.get(reverse("api_symbol_stats"), {"sort": "-symbol", "symbol": "AA*"}).json()
+        self.assertEqual([(s["symbol"], s["pnl"]) for s in data["symbols"]], [("AAPL", 10.0), ("AA", -5.0)])
+
+
+class OpenPositionsTests(TestCase):
+    """Tests for marking open trades to market from the quote store."""
+    def setUp(self):
+        self.user = User.objects.create_user("kim", "k@example.com", "pw123")
+        self.client.force_login(self.user)
+        for symbol, side, quantity, price in [
+            ("AAA", "BUY", 2, 100), ("AAA", "BUY", 1, 130), ("BBB", "SELL", 5, 20), ("CCC", "BUY", 1, 10),
+        ]:
+            Trade.objects.create(owner=self.user, symbol=symbol, side=side, quantity=quantity, price=price)
+        Trade.objects.create(
+            owner=self.user, symbol="AAA", side="BUY", quantity=1, price=1, exit_price=2, exit_time=timezone.now(),
+        )  # closed: ignored
+        import tempfile
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def _quotes(self, name, content):
+        import os
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as fh:
+            fh.write(content)
+        return self.settings(JOURNAL_QUOTES_PATH=path, JOURNAL_QUOTES_CHECK_SECONDS=0)
+
+    def test_unrealized_pnl_per_position(self):
+        stale = (timezone.now() - timezone.timedelta(hours=1)).isoformat()
+        with self._quotes("quotes.csv", f"symbol,price,time\nAAA,120,\nbbb,18.5,\nCCC,11,{stale}\n"):
+            data = self.client.get(reverse("api_open_positions")).json()
+        aaa, bbb, ccc = data["positions"]
+        self.assertEqual((aaa["quantity"], aaa["avg_price"], aaa["mark"]), (3.0, 110.0, 120.0))
+        self.assertEqual(aaa["unrealized_pnl"], 30.0)   # 3 * 120 - (200 + 130)
+        self.assertEqual(bbb["unrealized_pnl"], 7.5)    # short: 5 * (20 - 18.5)
+        self.assertIsNone(ccc["unrealized_pnl"])        # quote older than the TTL
+        self.assertEqual((data["unrealized_pnl"], data["unpriced"]), (37.5, ["CCC"]))
+
+    def test_reloads_changed_snapshot(self):
+        import os, time
+        from decimal import Decimal
+        with self._quotes("quotes.json", '{"quotes": {"AAA": "100"}}'):
+            store = quotes.get_store()
+            self.assertEqual(store.get("AAA").price, Decimal("100"))
+            self._quotes("quotes.json", '{"quotes": {"AAA": {"price": 125}}}')
+            os.utime(store.path, (1, time.time() + 5))
+            self.assertEqual(store.get("AAA").price, Decimal("125"))
+
+    def test_dashboard_and_no_store(self):
+        from decimal import Decimal
+        with self._quotes("quotes.csv", "symbol,price\nAAA,120\n"):
+            response = self.client.get(reverse("home"))
+        self.assertContains(response, "Open positions")
+        self.assertEqual(response.context["unrealized_pnl"], Decimal("30.00"))
+        self.assertEqual(response.context["unpriced"], ["BBB", "CCC"])
+        with self.settings(JOURNAL_QUOTES_PATH=""):
+            data = self.client.get(reverse("api_open_positions")).json()
+        self.assertEqual(data["unpriced"], ["AAA", "BBB", "CCC"])
+
+
 
 class ProfileTests(TestCase):
     """Tests for user profile update and profile page content."""
@@ -276,3 +749,1374 @@ class ProfileTests(TestCase):
     def test_profile_page_contains_password_links(self):
         resp = self.client.get(reverse("profile"))
         self.assertContains(resp, "Change password")
+
+
+class TradeAdminTests(TestCase):
+    """Tests for the Trade admin changelist, including at-scale mode."""
+    def setUp(self):
+        self.admin = User.objects.create_superuser("root", "root@example.com", "pw123")
+        self.client.force_login(self.admin)
+        now = timezone.now()
+        self.win = Trade.objects.create(owner=self.admin, symbol="WIN", side="SELL", quantity=1, price=100, exit_price=90, exit_time=now)
+        self.loss = Trade.objects.create(owner=self.admin, symbol="LOSS", side="BUY", quantity=1, price=100, exit_price=90, exit_time=now)
+        self.open = Trade.objects.create(owner=self.admin, symbol="OPEN", side="BUY", quantity=1, price=100)
+        self.url = reverse("admin:journal_trade_changelist")
+
+    def _symbols(self, resp):
+        return {t.symbol for t in resp.context["cl"].result_list}
+
+    def test_pnl_filter_uses_price_comparison(self):
+        self.assertEqual(self._symbols(self.client.get(self.url, {"pnl": "g"})), {"WIN"})
+        self.assertEqual(self._symbols(self.client.get(self.url, {"pnl": "l"})), {"LOSS"})
+
+    def test_status_filter(self):
+        self.assertEqual(self._symbols(self.client.get(self.url, {"status": "open"})), {"OPEN"})
+        self.assertEqual(self._symbols(self.client.get(self.url, {"status": "closed"})), {"WIN", "LOSS"})
+
+    @override_settings(JOURNAL_ADMIN_AT_SCALE=True, JOURNAL_ADMIN_ESTIMATE_THRESHOLD=0)
+    def test_at_scale_changelist(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        cl = resp.context["cl"]
+        self.assertIsNone(cl.full_result_count)
+        self.assertIsInstance(cl.paginator.count, int)
+        self.assertEqual(len(cl.result_list), 3)
+        self.assertContains(resp, str(timezone.localtime(self.win.entry_time).year))
+        # Filtered changelists fall back to the planner estimate.
+        resp = self.client.get(self.url, {"status": "closed"})
+        self.assertEqual(self._symbols(resp), {"WIN", "LOSS"})
+        self.assertGreaterEqual(resp.context["cl"].paginator.count, 1)
+
+    @override_settings(JOURNAL_ADMIN_AT_SCALE=True)
+    def test_date_hierarchy_probes_buckets(self):
+        from .admin import IndexedDateHierarchyQuerySet
+        Trade.objects.create(owner=self.admin, symbol="OLD", side="BUY", quantity=1, price=1,
+                             entry_time=timezone.now() - timezone.timedelta(days=800))
+        qs = IndexedDateHierarchyQuerySet(Trade)
+        expected = list(Trade.objects.datetimes("entry_time", "year"))
+        self.assertEqual(list(qs.datetimes("entry_time", "year")), expected)
+
+
+class MetricsTests(TestCase):
+    """Tests for per-view metrics middleware and the /metrics endpoint."""
+    def setUp(self):
+        from config.metrics import REGISTRY
+        REGISTRY.reset()
+        self.staff = User.objects.create_user("mia", "m@example.com", "pw123", is_staff=True)
+
+    def test_metrics_requires_staff(self):
+        user = User.objects.create_user("nick", "n@example.com", "pw123")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("metrics"))
+        self.assertEqual(resp.status_code, 302)
+
+    def test_metrics_records_view_and_db_usage(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse("trades_list"))
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('journal_http_requests_total{view="trades_list",method="GET",status="200"} 1', body)
+        self.assertIn('journal_http_request_duration_seconds_count{view="trades_list"} 1', body)
+        self.assertRegex(body, r'journal_db_queries_total\{view="trades_list"\} [1-9]')
+
+    def test_streamed_responses_are_observed_once_sent(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from config.metrics import REGISTRY
+        Trade.objects.create(owner=self.staff, symbol="AMD", side="BUY", quantity=1, price=10)
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("trades_export_csv"))
+            self.assertNotIn("trades_export_csv", REGISTRY.snapshot())
+            self.assertIn(b"AMD", b"".join(resp.streaming_content))
+        stats = REGISTRY.snapshot()["trades_export_csv"]
+        self.assertEqual(stats["requests"], {"GET 200": 1})
+        # Including the export's own read, which runs while the body is sent.
+        self.assertTrue(any("journal_trade" in q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(stats["db_queries"], len(ctx.captured_queries))
+
+    def test_collect_merges_worker_snapshots(self):
+        import json, os, tempfile
+        from config.metrics import MetricsRegistry
+        with tempfile.TemporaryDirectory() as tmp:
+            worker_a = MetricsRegistry(directory=tmp)
+            worker_b = MetricsRegistry()
+            worker_a.observe("home", "GET", 200, 0.02, 3, 0.001)
+            worker_b.observe("home", "GET", 200, 0.2, 5, 0.002)
+            # The second worker's snapshot file, as another process would write it.
+            with open(os.path.join(tmp, "metrics-999999.json"), "w") as fh:
+                json.dump(worker_b.snapshot(), fh)
+            merged = worker_a.collect()
+        self.assertEqual(merged["home"]["requests"]["GET 200"], 2)
+        self.assertEqual(merged["home"]["db_queries"], 8)
+        self.assertEqual(merged["home"]["latency_count"], 2)
+
+    def test_concurrent_flushes_dont_fail_requests(self):
+        import json, os, tempfile, threading
+        from config.metrics import MetricsRegistry
+        errors = []
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = MetricsRegistry(directory=tmp, flush_interval=0)
+
+            def requests():
+                try:
+                    for _ in range(50):
+                        registry.observe("home", "GET", 200, 0.01, 1, 0.001)
+                except Exception as exc:
+                    errors.append(exc)
+
+            threads = [threading.Thread(target=requests) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            registry.flush()
+            self.assertEqual(os.listdir(tmp), [f"metrics-{os.getpid()}.json"])
+            with open(os.path.join(tmp, os.listdir(tmp)[0])) as fh:
+                self.assertEqual(json.load(fh)["home"]["latency_count"], 400)
+        self.assertEqual(errors, [])
+
+    def test_flush_failures_are_logged_not_raised(self):
+        from unittest import mock
+        from config.metrics import MetricsRegistry
+        registry = MetricsRegistry(directory="/nonexistent/metrics", flush_interval=0)
+        with mock.patch("os.makedirs", side_effect=PermissionError("read-only")), \
+                self.assertLogs("config.metrics", "ERROR"):
+            registry.observe("home", "GET", 200, 0.01, 1, 0.001)
+        self.assertEqual(registry.snapshot()["home"]["latency_count"], 1)
+
+
+class ProfilingTests(TestCase):
+    """Tests for the staff-only request profiler."""
+    def setUp(self):
+        from config.profiling import BUFFER
+        BUFFER.clear()
+        self.buffer = BUFFER
+        self.staff = User.objects.create_user("olga", "o@example.com", "pw123", is_staff=True)
+
+    def test_only_staff_requests_are_profiled(self):
+        user = User.objects.create_user("pat", "p@example.com", "pw123")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("trades_list"), {"_profile": "1"})
+        self.assertNotIn("X-Profile-Id", resp)
+        self.client.force_login(self.staff)
+        self.assertNotIn("X-Profile-Id", self.client.get(reverse("trades_list")))
+        self.assertEqual(self.buffer.all(), [])
+
+    def test_profile_is_recorded_and_browsable(self):
+        self.client.force_login(self.staff)
+        resp = self.client.get(reverse("trades_list"), HTTP_X_PROFILE="1")
+        profile = self.buffer.get(resp["X-Profile-Id"])
+        self.assertEqual((profile["view"], profile["status"]), ("trades_list", 200))
+        self.assertGreater(profile["query_count"], 0)
+        self.assertTrue(any("journal_trade" in q["sql"] for q in profile["queries"]))
+
+        self.assertContains(self.client.get(reverse("profile_list")), resp["X-Profile-Id"])
+        detail = reverse("profile_detail", args=[resp["X-Profile-Id"]])
+        self.assertContains(self.client.get(detail), "SQL by total time")
+        download = self.client.get(detail, {"download": "json"})
+        self.assertEqual(download.json()["id"], resp["X-Profile-Id"])
+
+    def test_sampler_keeps_only_the_profiled_request(self):
+        import threading, time
+        from django.test import RequestFactory
+        from django.urls import ResolverMatch
+        from config.profiling import _Run
+
+        def slow_view(request):
+            time.sleep(0.1)
+
+        ours, theirs = RequestFactory().get("/"), RequestFactory().get("/")
+        ours.resolver_match = ResolverMatch(slow_view, (), {})
+        other = threading.Thread(target=slow_view, args=(theirs,))
+        other.start()
+        with _Run(ours) as run:
+            slow_view(ours)
+        other.join()
+        self.assertGreater(run.sampler.samples, 0)
+        self.assertTrue(all(stack.count("slow_view") == 1 for stack in run.sampler.stacks))
+        self.assertTrue(all("test_sampler_keeps_only" in stack for stack in run.sampler.stacks))
+
+
+class SeedAndBenchmarkTests(TestCase):
+    """Tests for the seed_trades generator and the bench_views and bench_startup runners."""
+    def _rows(self, prefix):
+        return list(
+            Trade.objects.filter(owner__username__startswith=prefix)
+            .order_by("entry_time", "symbol")
+            .values_list("symbol", "side", "quantity", "price", "entry_time", "exit_price", "exit_time")
+        )
+
+    def test_seed_is_deterministic(self):
+        from django.core.management import call_command
+        from io import StringIO
+        opts = dict(users=2, trades=50, symbols=5, open_ratio=0.2, seed=3, stdout=StringIO())
+        call_command("seed_trades", prefix="seeda", **opts)
+        call_command("seed_trades", prefix="seedb", **opts)
+        a, b = self._rows("seeda"), self._rows("seedb")
+        self.assertEqual(len(a), 100)
+        self.assertEqual(a, b)
+        self.assertTrue(any(row[5] is None for row in a))  # some open trades
+        self.assertLessEqual(len({row[0] for row in a}), 10)
+
+    def test_clear_only_deletes_generated_users(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from journal.management.commands.seed_trades import generated_users
+        real = User.objects.create_user("benchmarker", "b@example.com", "pw123")
+        Trade.objects.create(owner=real, symbol="AMD", side="BUY", quantity=1, price=10)
+        call_command("seed_trades", users=1, trades=5, symbols=2, stdout=StringIO())
+        self.assertEqual(list(generated_users("bench").values_list("username", flat=True)), ["bench0000"])
+        call_command("seed_trades", users=1, trades=5, symbols=2, clear=True, stdout=StringIO())
+        self.assertTrue(Trade.objects.filter(owner=real).exists())
+        self.assertEqual(generated_users("bench").count(), 1)
+
+    def test_bench_writes_results_file(self):
+        import json, os, tempfile
+        from django.core.management import call_command
+        from io import StringIO
+        call_command("seed_trades", users=1, trades=30, symbols=3, prefix="bench", stdout=StringIO())
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "results.json")
+            call_command("bench_views", user="bench0000", repeat=1, warmup=0, import_rows=10,
+                         only=["trades_list", "api_daily_pnl", "trades_import_dry_run"],
+                         output=out, stdout=StringIO())
+            with open(out) as fh:
+                report = json.load(fh)
+        self.assertEqual(report["meta"]["user_trades"], 30)
+        self.assertEqual(set(report["results"]), {"trades_list", "api_daily_pnl", "trades_import_dry_run"})
+        for result in report["results"].values():
+            self.assertEqual(result["status"], 200)
+            self.assertGreater(result["queries"], 0)
+            self.assertIn("median", result["wall_ms"])
+
+    def test_startup_is_within_budget(self):
+        import json, os, tempfile
+        from django.core.management import call_command
+        from io import StringIO
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "startup.json")
+            # Raises CommandError when over budget or openpyxl/pyarrow load at startup.
+            call_command("bench_startup", runs=3, check=True, output=out, stdout=StringIO())
+            with open(out) as fh:
+                result = json.load(fh)
+        self.assertEqual(result["lazy_loaded"], [])
+        self.assertGreater(result["urlconf_s"], 0)
+
+
+class LoadTestHarnessTests(TestCase):
+    """Tests for the loadtest command's helpers and the API write path it drives."""
+    def test_percentile_and_mix(self):
+        from django.core.management.base import CommandError
+        from journal.management.commands.loadtest import _parse_mix, _percentile
+        values = sorted(range(1, 101))
+        self.assertEqual(_percentile(values, 50), 50)
+        self.assertEqual(_percentile(values, 99), 99)
+        self.assertEqual(_parse_mix("list=3,api_write=1"), {"list": 3.0, "api_write": 1.0})
+        with self.assertRaises(CommandError):
+            _parse_mix("nope=1")
+
+    def test_sessions_are_logged_in(self):
+        from django.conf import settings
+        from journal.management.commands.loadtest import _Session
+        session = _Session(User.objects.create_user("kai", "k@example.com", "pw123"))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        self.assertEqual(self.client.get(reverse("trades_list")).status_code, 200)
+
+    def test_api_trade_create_and_list(self):
+        user = User.objects.create_user("lena", "l@example.com", "pw123")
+        self.client.force_login(user)
+        resp = self.client.post(reverse("trade-list"), {
+            "symbol": "LTA", "side": "BUY", "quantity": 1, "price": 10,
+            "entry_time": "2024-06-03T14:30:00Z", "exit_price": 11, "exit_time": "2024-06-03T15:30:00Z",
+        }, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["owner"], "lena")
+        resp = self.client.get(reverse("trade-list"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()), 1)
+
+
+class ConcurrentQueryTests(TransactionTestCase):
+    """Tests for run_concurrently outside a transaction, where each callable gets its own connection."""
+    # The async views it drives read from the replica when one is configured.
+    databases = "__all__"
+
+    def setUp(self):
+        # The pool is off by default (JOURNAL_QUERY_WORKERS=0) and built at import.
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        from . import concurrency
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="journal-query")
+        self.addCleanup(pool.shutdown)
+        patcher = mock.patch.object(concurrency, "_executor", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_runs_on_separate_connections(self):
+        import threading
+        from asgiref.sync import async_to_sync
+        from django.db import connection
+        from .concurrency import run_concurrently
+        user = User.objects.create_user("olga", "o@example.com", "pw123")
+        Trade.objects.create(owner=user, symbol="A", side="BUY", quantity=1, price=1, exit_price=2, exit_time=timezone.now())
+        Trade.objects.create(owner=user, symbol="B", side="BUY", quantity=1, price=1)
+
+        def lookup(qs):
+            return qs.count(), threading.current_thread().name
+
+        (closed, t1), (total, t2) = async_to_sync(run_concurrently)(
+            lambda: lookup(Trade.objects.filter(exit_price__isnull=False)),
+            lambda: lookup(Trade.objects.all()),
+        )
+        self.assertEqual((closed, total), (1, 2))
+        self.assertTrue(t1.startswith("journal-query") and t2.startswith("journal-query"))
+        self.assertFalse(connection.in_atomic_block)
+
+    def test_dashboard_outside_transaction(self):
+        user = User.objects.create_user("pete", "p@example.com", "pw123")
+        Trade.objects.create(owner=user, symbol="WIN", side="BUY", quantity=2, price=10, exit_price=15, exit_time=timezone.now())
+        self.client.force_login(user)
+        resp = self.client.get(reverse("home"))
+        self.assertEqual(resp.context["trade_count"], 1)
+        self.assertEqual(resp.context["total_pnl"], 10)
+        self.assertEqual(resp.context["recent_trades"][0]["symbol"], "WIN")
+
+
+class ReplicaRouterTests(TestCase):
+    """Unit tests for read-replica routing decisions."""
+    def setUp(self):
+        from config.db_routers import ReplicaRouter
+        self.router = ReplicaRouter()
+        self.router.replica = "replica"
+
+    def test_reads_use_primary_unless_opted_in(self):
+        from django.db import connection
+        from config.db_routers import request_routing, use_replica
+        self.assertIsNone(self.router.db_for_read(Trade))
+        with request_routing():
+            self.assertIsNone(self.router.db_for_read(Trade))
+            use_replica()
+            # TestCase wraps every test in a transaction on the primary.
+            self.assertTrue(connection.in_atomic_block)
+            self.assertIsNone(self.router.db_for_read(Trade))
+            connection.in_atomic_block = False
+            try:
+                self.assertEqual(self.router.db_for_read(Trade), "replica")
+            finally:
+                connection.in_atomic_block = True
+
+    def test_write_keeps_reads_on_primary(self):
+        from config.db_routers import request_routing, use_replica
+        with request_routing():
+            use_replica()
+            self.router.db_for_write(Trade)
+            self.assertIsNone(self.router.db_for_read(Trade))
+
+    def test_never_migrates_replica(self):
+        self.assertFalse(self.router.allow_migrate("replica", "journal"))
+        self.assertIsNone(self.router.allow_migrate("default", "journal"))
+
+
+class ReplicaPinTests(TransactionTestCase):
+    """Routing decisions outside a test transaction, so nothing about the connection is patched."""
+    def setUp(self):
+        from django.core.cache import cache
+        from config.db_routers import ReplicaRouter
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.router.replica = "replica"
+        self.user = User.objects.create_user("rosa", "r@example.com", "pw123")
+        self.other = User.objects.create_user("rick", "rk@example.com", "pw123")
+
+    def _read_alias(self, user):
+        from config.db_routers import request_routing, use_replica
+        with request_routing():
+            use_replica(user)
+            return self.router.db_for_read(Trade)
+
+    def test_pin_is_per_user(self):
+        from config.db_routers import pin
+        self.assertEqual(self._read_alias(self.user), "replica")
+        pin(self.user.pk)
+        self.assertIsNone(self._read_alias(self.user))
+        self.assertEqual(self._read_alias(self.other), "replica")
+
+    def test_api_writes_pin_the_user_without_cookies(self):
+        from unittest import mock
+        from config.db_routers import is_pinned
+        self.client.force_login(self.user)
+        with mock.patch("config.middleware.replica_configured", return_value=True):
+            resp = self.client.post(reverse("trade-list"), {
+                "symbol": "PIN", "side": "BUY", "quantity": 1, "price": 5, "entry_time": "2024-06-03T14:30:00Z",
+            }, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(dict(resp.cookies), {})
+        self.assertTrue(is_pinned(self.user.pk))
+        self.assertFalse(is_pinned(self.other.pk))
+
+
+@skipUnless("replica" in settings.DATABASES, "set POSTGRES_REPLICA_HOST to run replica routing tests")
+class ReplicaRoutingIntegrationTests(TransactionTestCase):
+    """End-to-end routing with two database aliases (replica mirrors default in tests)."""
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = User.objects.create_user("quinn", "q@example.com", "pw123")
+        Trade.objects.create(owner=self.user, symbol="RPL", side="BUY", quantity=1, price=1, exit_price=2, exit_time=timezone.now())
+        self.client.force_login(self.user)
+
+    def _replica_queries(self, fn):
+        from django.db import connections
+        seen = []
+        def wrapper(execute, sql, params, many, context):
+            seen.append(sql)
+            return execute(sql, params, many, context)
+        with connections["replica"].execute_wrapper(wrapper):
+            resp = fn()
+        return resp, seen
+
+    def test_stats_read_from_replica_until_user_writes(self):
+        resp, seen = self._replica_queries(lambda: self.client.get(reverse("api_symbol_pnl")))
+        self.assertEqual(resp.json()["labels"], ["RPL"])
+        self.assertTrue(any("journal_trade" in sql for sql in seen))
+
+        resp = self.client.post(reverse("trades_create"), {
+            "symbol": "NEW", "side": "BUY", "quantity": 1, "price": 5,
+            "entry_time": timezone.now().isoformat(timespec="seconds"),
+        })
+        from config.db_routers import is_pinned
+        self.assertTrue(is_pinned(self.user.pk))
+
+        resp, seen = self._replica_queries(lambda: self.client.get(reverse("trade-list")))
+        self.assertEqual({t["symbol"] for t in resp.json()}, {"RPL", "NEW"})
+        self.assertEqual(seen, [])
+
+    def test_streamed_export_reads_from_replica(self):
+        resp, seen = self._replica_queries(
+            lambda: b"".join(self.client.get(reverse("trades_export_csv")).streaming_content)
+        )
+        self.assertIn(b"RPL", resp)
+        self.assertTrue(any("journal_trade" in sql for sql in seen))
+
+    def test_list_page_never_uses_replica(self):
+        _, seen = self._replica_queries(lambda: self.client.get(reverse("trades_list")))
+        self.assertEqual(seen, [])
+
+
+@skipUnless(settings.DATABASES["default"]["ENGINE"].endswith("postgresql"), "partitioning needs PostgreSQL")
+class PartitioningTests(TestCase):
+    """Tests for entry_time range partitioning (DDL is transactional, so each test rolls it back)."""
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        self.user = User.objects.create_user("pat", "p@example.com", "pw123")
+        self.now = datetime(2024, 6, 15, tzinfo=dt_timezone.utc)
+        for month in (1, 3, 5):
+            entry = datetime(2024, month, 10, tzinfo=dt_timezone.utc)
+            Trade.objects.create(
+                owner=self.user, symbol="AAPL", side="BUY", quantity=1, price=10, entry_time=entry,
+                exit_price=12, exit_time=entry + timezone.timedelta(days=2),
+            )
+
+    def _partitions_scanned(self, qs):
+        import re
+        return sorted(set(re.findall(r"journal_trade_(p\d{4}_\d{2}|default)", qs.explain())))
+
+    def test_convert_keeps_rows_and_prunes_by_entry_time(self):
+        from journal import partitioning
+        ids = list(Trade.objects.order_by("id").values_list("id", flat=True))
+        created = partitioning.convert(interval="month", ahead=2, now=self.now)
+        self.assertTrue(partitioning.is_partitioned())
+        self.assertEqual(created[0], "journal_trade_p2024_01")
+        self.assertEqual(created[-1], "journal_trade_p2024_08")
+        self.assertEqual(list(Trade.objects.order_by("id").values_list("id", flat=True)), ids)
+
+        # The id sequence carries on where it was, and the ORM still works by id.
+        t = Trade.objects.create(owner=self.user, symbol="MSFT", side="SELL", quantity=2, price=5,
+                                 entry_time=self.now)
+        self.assertGreater(t.pk, ids[-1])
+        Trade.objects.filter(pk=t.pk).update(notes="edited")
+        self.assertEqual(Trade.objects.get(pk=t.pk).notes, "edited")
+
+        march = Trade.objects.filter(
+            owner=self.user, entry_time__gte=timezone.datetime(2024, 3, 1, tzinfo=self.now.tzinfo),
+            entry_time__lt=timezone.datetime(2024, 4, 1, tzinfo=self.now.tzinfo),
+        )
+        self.assertEqual(self._partitions_scanned(march), ["p2024_03"])
+
+        # The stats views' exit_time upper bound also prunes later partitions.
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse("api_daily_pnl"), {"end": "2024-02-01"})
+        self.assertEqual(resp.json()["values"], [2.0])
+        bounded = Trade.objects.filter(
+            exit_time__lt=timezone.datetime(2024, 2, 1, tzinfo=self.now.tzinfo),
+            entry_time__lt=timezone.datetime(2024, 2, 1, tzinfo=self.now.tzinfo),
+        )
+        self.assertEqual(self._partitions_scanned(bounded), ["default", "p2024_01"])
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        from django.db import connection
+        from journal import partitioning
+        partitioning.convert(interval="month", ahead=0, now=self.now)
+        later = timezone.datetime(2024, 9, 3, tzinfo=self.now.tzinfo)
+        Trade.objects.create(owner=self.user, symbol="AAPL", side="BUY", quantity=1, price=10, entry_time=later)
+
+        created = partitioning.ensure_partitions(ahead=1, now=later)
+        self.assertEqual(created, ["journal_trade_p2024_09", "journal_trade_p2024_10"])
+        self.assertEqual(partitioning.ensure_partitions(ahead=1, now=later), [])
+        with self.assertRaises(ValueError):
+            partitioning.ensure_partitions(interval="year", now=later)
+        with connection.cursor() as c:
+            c.execute("SELECT count(*) FROM journal_trade_default")
+            self.assertEqual(c.fetchone()[0], 0)
+            c.execute("SELECT count(*) FROM journal_trade_p2024_09")
+            self.assertEqual(c.fetchone()[0], 1)
+
+    def test_revert_restores_plain_table(self):
+        from journal import partitioning
+        partitioning.convert(interval="year", now=self.now)
+        self.assertTrue(partitioning.revert())
+        self.assertFalse(partitioning.is_partitioned())
+        self.assertEqual(Trade.objects.count(), 3)
+        # The symbol-interning trigger is carried over both ways.
+        Trade.objects.filter(pk=Trade.objects.first().pk).update(symbol="new1")
+        self.assertEqual(Trade.objects.filter(symbol_ref__name="NEW1").count(), 1)
+
+    def test_command_requires_conversion(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            call_command("trade_partitions")
+
+    def test_status_alone_creates_nothing(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from journal import partitioning
+        created = partitioning.convert(interval="month", ahead=0, now=self.now)
+        out = StringIO()
+        call_command("trade_partitions", "--status", stdout=out)
+        self.assertNotIn("Created", out.getvalue())
+        for name in created:
+            self.assertIn(name, out.getvalue())
+        self.assertEqual(partitioning.ensure_partitions(ahead=0, now=self.now), [])
+        out = StringIO()
+        call_command("trade_partitions", "--status", "--ahead", "1", stdout=out)
+        self.assertIn("Created", out.getvalue())
+
+    def test_exit_before_entry_is_swapped_back(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from journal import partitioning
+        partitioning.convert(interval="month", ahead=0, now=self.now)
+        trade = Trade.objects.order_by("id").first()
+        entry, exit_time = trade.entry_time, trade.exit_time
+        Trade.objects.filter(pk=trade.pk).update(entry_time=exit_time, exit_time=entry)
+        out = StringIO()
+        call_command("trade_partitions", "--ahead", "0", stdout=out)
+        self.assertIn("Swapped entry and exit times of 1 trades", out.getvalue())
+        trade.refresh_from_db()
+        self.assertEqual((trade.entry_time, trade.exit_time), (entry, exit_time))
+        self.assertEqual(partitioning.swap_reversed_times(), 0)
+
+
+@override_settings(JOURNAL_ARCHIVE_AFTER_DAYS=90, JOURNAL_THROTTLE_BUDGET=0)
+class ArchiveTests(TestCase):
+    """Tests for hot/cold archiving of old closed trades (journal.archive)."""
+    def setUp(self):
+        self.user = User.objects.create_user("arch", "a@example.com", "pw123")
+        self.client.force_login(self.user)
+        now = timezone.now()
+        self.old_exit = now - timezone.timedelta(days=400)
+        specs = [  # (days ago entered, days ago exited or None, exit price, tags)
+            (402, 400, 12, ["swing"]),
+            (401, 400, 9, []),
+            (300, 299, 15, ["swing"]),
+            (400, None, None, []),  # still open: never archived
+            (3, 1, 11, []),
+        ]
+        for entered, exited, exit_price, tags in specs:
+            Trade.objects.create(
+                owner=self.user, symbol="ARC", side="BUY", quantity=2, price=10, tags=tags,
+                entry_time=now - timezone.timedelta(days=entered),
+                exit_price=exit_price, exit_time=exited and now - timezone.timedelta(days=exited),
+            )
+
+    def _snapshot(self):
+        home = self.client.get(reverse("home")).context
+        month = self.old_exit
+        return {
+            "home": (home["trade_count"], home["wins"], float(home["total_pnl"]), float(home["avg_pnl"]),
+                     [t["pnl_value"] for t in home["recent_trades"]]),
+            "daily": self.client.get(reverse("api_daily_pnl")).json(),
+            "daily_tagged": self.client.get(reverse("api_daily_pnl"), {"tag": "swing"}).json(),
+            "series": self.client.get(reverse("api_trade_pnl_series")).json(),
+            "symbols": self.client.get(reverse("api_symbol_stats")).json(),
+            "calendar": self.client.get(reverse("trades_calendar"), {"year": month.year, "month": month.month})
+                            .context["month_total_pnl"],
+            "list": self.client.get(reverse("trades_list")).context["page_obj"].paginator.count,
+            "export": self.client.get(reverse("trades_export_csv")).getvalue().count(b"\n"),
+            "api": len(self.client.get("/api/trades/").json()),
+        }
+
+    def test_archive_keeps_every_view_unchanged(self):
+        from journal import archive
+        from journal.models import ArchivedTrade, TradeRollup
+        before = self._snapshot()
+        self.assertEqual(archive.archive(batch_size=2), (3, 0))
+        self.assertEqual(Trade.objects.count(), 2)
+        self.assertEqual(ArchivedTrade.objects.count(), 3)
+        # Two trades closed on the same day share a rollup row.
+        self.assertEqual(sorted(TradeRollup.objects.values_list("trades", "wins")), [(1, 1), (2, 1)])
+        self.assertEqual(self._snapshot(), before)
+
+    def test_reads_use_the_archive_only_when_the_range_reaches_it(self):
+        from journal import archive
+        from journal.models import TradeHistory
+        archive.archive()
+        recent = (timezone.now() - timezone.timedelta(days=30)).date().isoformat()
+        resp = self.client.get(reverse("trades_list"), {"start": recent})
+        self.assertIs(resp.context["page_obj"].paginator.object_list.model, Trade)
+        resp = self.client.get(reverse("trades_list"))
+        self.assertIs(resp.context["page_obj"].paginator.object_list.model, TradeHistory)
+        self.assertContains(resp, ">Archived<", count=3)
+        # Archived trades are read-only.
+        archived_id = TradeHistory.objects.filter(archived=True).values_list("id", flat=True).first()
+        self.assertEqual(self.client.get(f"/api/trades/{archived_id}/").status_code, 200)
+        self.assertEqual(self.client.patch(f"/api/trades/{archived_id}/", {"notes": "x"},
+                                           content_type="application/json").status_code, 404)
+        self.assertEqual(self.client.get(reverse("trades_edit", args=[archived_id])).status_code, 404)
+
+    def test_restore_brings_trades_back(self):
+        from journal import archive
+        from journal.models import ArchivedTrade, TradeRollup
+        ids = sorted(Trade.objects.values_list("id", flat=True))
+        archive.archive()
+        self.assertEqual(archive.restore(user=self.user), 3)
+        self.assertEqual(sorted(Trade.objects.values_list("id", flat=True)), ids)
+        self.assertFalse(ArchivedTrade.objects.exists())
+        self.assertFalse(TradeRollup.objects.exists())
+        restored = Trade.objects.filter(tags__contains=["swing"]).order_by("exit_time").first()
+        self.assertEqual((restored.symbol, restored.symbol_ref.name, restored.pnl), ("ARC", "ARC", 4))
+
+    def test_lengthened_horizon_restores_what_it_now_covers(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from journal.models import ArchivedTrade, TradeRollup
+        call_command("archive_trades", stdout=StringIO())
+        with override_settings(JOURNAL_ARCHIVE_AFTER_DAYS=350):
+            out = StringIO()
+            call_command("archive_trades", "--status", stdout=out)
+        self.assertIn("Restored 1 trades", out.getvalue())
+        self.assertEqual(ArchivedTrade.objects.count(), 2)
+        self.assertEqual(list(TradeRollup.objects.values_list("trades", flat=True)), [2])
+
+    def test_trades_exiting_before_entry_are_swapped_not_lost(self):
+        from django.db.models import F, Sum
+        from journal import archive
+        from journal.models import ArchivedTrade, TradeHistory, TradeRollup
+        archive.archive()
+        # One archived and one hot trade stored with their exit before their entry.
+        ArchivedTrade.objects.filter(pk=ArchivedTrade.objects.order_by("id").values("id")[:1]) \
+            .update(entry_time=F("exit_time"), exit_time=F("entry_time"))
+        TradeRollup.objects.update(time_zone="")  # rebuilt with the archived trade as stored
+        self.assertTrue(archive.rebuild_rollups())
+        hot = Trade.objects.get(exit_time__isnull=False)
+        Trade.objects.filter(pk=hot.pk).update(
+            entry_time=timezone.now() - timezone.timedelta(days=300), exit_time=timezone.now() - timezone.timedelta(days=301),
+        )
+        archive.archive()
+        self.assertFalse(TradeHistory.objects.filter(exit_time__lt=F("entry_time")).exists())
+        self.assertTrue(ArchivedTrade.objects.filter(pk=hot.pk).exists())
+        self.assertEqual(TradeHistory.objects.filter(owner=self.user).count(), 5)
+        self.assertEqual(TradeRollup.objects.aggregate(n=Sum("trades"))["n"], ArchivedTrade.objects.count())
+
+    def test_rollups_are_rebuilt_when_the_time_zone_changes(self):
+        from zoneinfo import ZoneInfo
+        from journal import archive
+        from journal.models import ArchivedTrade, TradeRollup
+        archive.archive()
+        self.assertEqual(set(TradeRollup.objects.values_list("time_zone", flat=True)), {"UTC"})
+        self.assertFalse(archive.rebuild_rollups())
+        with override_settings(TIME_ZONE="Pacific/Kiritimati"):
+            archive.archive()
+            self.assertFalse(archive.rebuild_rollups())
+        zone = ZoneInfo("Pacific/Kiritimati")
+        days = {t.exit_time.astimezone(zone).date() for t in ArchivedTrade.objects.all()}
+        self.assertEqual(set(TradeRollup.objects.values_list("day", flat=True)), days)
+        self.assertEqual(set(TradeRollup.objects.values_list("time_zone", flat=True)), {"Pacific/Kiritimati"})
+        self.assertEqual(sorted(TradeRollup.objects.values_list("trades", "wins")), [(1, 1), (2, 1)])
+
+    def test_command_needs_archiving_on(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with override_settings(JOURNAL_ARCHIVE_AFTER_DAYS=0), self.assertRaises(CommandError):
+            call_command("archive_trades")
+
+    def test_history_view_survives_partitioning(self):
+        from journal import archive, partitioning
+        from journal.models import TradeHistory
+        archive.archive()
+        partitioning.convert(interval="year")
+        self.assertEqual(TradeHistory.objects.filter(owner=self.user).count(), 5)
+        self.assertEqual(archive.restore(), 3)
+        self.assertTrue(partitioning.revert())
+        self.assertEqual(TradeHistory.objects.filter(archived=False).count(), 5)
+
+
+class RequestCachingTests(TestCase):
+    """Tests for the cached session user and trade settings (journal.caching)."""
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user("quinn", "q@example.com", "pw123")
+        self.client.login(username="quinn", password="pw123")
+
+    def _queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [q["sql"] for q in ctx.captured_queries]
+
+    def test_user_and_settings_lookups_are_cached(self):
+        url = reverse("trades_create")
+        self._queries(url)
+        sql = self._queries(url)
+        self.assertFalse([q for q in sql if 'FROM "auth_user"' in q])
+        self.assertFalse([q for q in sql if 'FROM "journal_usertradesettings"' in q])
+
+    def test_changes_invalidate_the_cache(self):
+        url = reverse("trades_create")
+        self._queries(url)
+        settings_obj = UserTradeSettings.objects.get(user=self.user)
+        settings_obj.default_symbol = "TSLA"
+        settings_obj.save()
+        self.assertContains(self.client.get(url), 'value="TSLA"')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_cache_holds_no_password_and_saves_keep_it(self):
+        from django.core.cache import cache
+        from .caching import _user_key
+        url = reverse("profile")
+        self._queries(url)
+        entry = cache.get(_user_key(self.user.pk))
+        self.assertNotIn("password", entry["fields"])
+        self.assertNotIn(self.user.password, repr(entry))
+        # The profile form saves request.user, a cached instance with the password deferred.
+        resp = self.client.post(url, {"username": "quinn", "email": "quinn@example.com",
+                                      "first_name": "Q", "last_name": ""})
+        self.assertIn(resp.status_code, (200, 302))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Q")
+        self.assertTrue(self.user.check_password("pw123"))
+
+    def test_password_change_ends_other_cached_sessions(self):
+        url = reverse("trades_create")
+        self._queries(url)
+        self.user.set_password("changed")
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_profile_creates_missing_settings(self):
+        UserTradeSettings.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get(reverse("profile")).status_code, 200)
+        self.assertTrue(UserTradeSettings.objects.filter(user=self.user).exists())
+
+
+class StaticAssetsTests(TestCase):
+    """Tests for the fingerprinted, precompressed static pipeline (config.static_assets)."""
+    @classmethod
+    def setUpClass(cls):
+        import tempfile
+        from django.core.management import call_command
+        from io import StringIO
+        super().setUpClass()
+        # collectstatic (with brotli) is slow; run it once, on the project's own files only.
+        tmp = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp.cleanup)
+        cls.root = tmp.name
+        override = override_settings(
+            STATIC_ROOT=cls.root,
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+        )
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        call_command("collectstatic", interactive=False, verbosity=0, stdout=StringIO())
+
+    def _get(self, path, **headers):
+        from django.test import RequestFactory
+        from config.static_assets import serve
+        return serve(RequestFactory().get("/static/" + path, headers=headers), path)
+
+    def test_docker_image_settings_route_static_to_serve(self):
+        import os, re, subprocess, sys
+        from django.conf import settings as live
+        # The environment the Dockerfile's ENV lines give the production image.
+        with open(os.path.join(live.BASE_DIR, "Dockerfile")) as fh:
+            dockerfile = fh.read().replace("\\\n", " ")
+        env = {k: v for k, v in os.environ.items() if not k.startswith(("DJANGO_", "JOURNAL_"))}
+        for line in re.findall(r"^ENV (.+)$", dockerfile, re.M):
+            env.update(pair.split("=", 1) for pair in line.split())
+        script = (
+            "import django; django.setup()\n"
+            "from django.conf import settings; from django.urls import resolve\n"
+            "match = resolve('/' + settings.STATIC_URL.lstrip('/') + 'vendor/chart.js/chart.umd.min.js')\n"
+            "print(settings.DEBUG, match.func.__module__ + '.' + match.func.__name__)"
+        )
+        out = subprocess.run([sys.executable, "-c", script], env={**env, "DJANGO_SETTINGS_MODULE": "config.settings"},
+                             cwd=live.BASE_DIR, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.split(), ["False", "config.static_assets.serve"])
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        import os
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        hashed = staticfiles_storage.stored_name("vendor/chart.js/chart.umd.min.js")
+        self.assertRegex(hashed, r"chart\.umd\.min\.[0-9a-f]{12}\.js$")
+        self.assertTrue(os.path.exists(os.path.join(self.root, hashed + ".gz")))
+        from config.static_assets import brotli
+        if brotli is not None:
+            self.assertTrue(os.path.exists(os.path.join(self.root, hashed + ".br")))
+
+    def test_serve_negotiates_encoding_and_caches_hashed_files(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        hashed = staticfiles_storage.stored_name("css/home.css")
+        resp = self._get(hashed, accept_encoding="gzip, deflate")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(resp["Content-Type"], "text/css")
+        self.assertIn("immutable", resp["Cache-Control"])
+        self.assertEqual(resp["Vary"], "Accept-Encoding")
+
+        plain = self._get("css/home.css", accept_encoding="gzip;q=0")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertNotIn("immutable", plain["Cache-Control"])
+
+        fresh = self._get(hashed, if_modified_since=resp["Last-Modified"])
+        self.assertEqual(fresh.status_code, 304)
+
+    def test_serve_rejects_paths_outside_static_root(self):
+        from django.http import Http404
+        with self.assertRaises(Http404):
+            self._get("../settings.py")
+
+    def test_charts_page_uses_vendored_chartjs(self):
+        user = User.objects.create_user("rita", "r@example.com", "pw123")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("trades_charts"))
+        self.assertContains(resp, "vendor/chart.js/chart.umd.min")
+        self.assertNotContains(resp, "cdn.jsdelivr.net")
+
+
+class CompressionTests(TestCase):
+    """Tests for negotiated, streaming-aware response compression (config.compression)."""
+    def setUp(self):
+        self.user = User.objects.create_user("sam", "s@example.com", "pw123")
+        self.client.force_login(self.user)
+        base = timezone.now() - timezone.timedelta(days=30)
+        Trade.objects.bulk_create([
+            Trade(owner=self.user, symbol=f"S{i % 40}", side="BUY", quantity=1, price=10,
+                  entry_time=base + timezone.timedelta(hours=i), exit_price=11,
+                  exit_time=base + timezone.timedelta(hours=i + 1), notes="swing " * 5)
+            for i in range(300)
+        ])
+
+    def test_streaming_export_is_gzipped_incrementally(self):
+        import gzip
+        with override_settings(JOURNAL_COMPRESS_MIN_BYTES=1024):
+            resp = self.client.get(reverse("trades_export_csv"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        chunks = list(resp.streaming_content)
+        body = gzip.decompress(b"".join(chunks)).decode()
+        self.assertTrue(body.startswith("id,entry_time,symbol"))
+        self.assertEqual(body.count("\n"), 301)
+
+    def test_brotli_preferred_when_available(self):
+        import json
+        from config.compression import brotli
+        if brotli is None:
+            self.skipTest("brotli not installed")
+        resp = self.client.get(reverse("api_trade_pnl_series"), HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(resp["Content-Encoding"], "br")
+        self.assertEqual(len(json.loads(brotli.decompress(resp.content))["values"]), 300)
+
+    def test_small_and_unaccepted_bodies_are_left_alone(self):
+        with override_settings(JOURNAL_COMPRESS_MIN_BYTES=10**6):
+            resp = self.client.get(reverse("api_symbol_pnl"), HTTP_ACCEPT_ENCODING="gzip")
+            self.assertFalse(resp.has_header("Content-Encoding"))
+            stream = self.client.get(reverse("trades_export_csv"), HTTP_ACCEPT_ENCODING="gzip")
+            self.assertFalse(stream.has_header("Content-Encoding"))
+            self.assertIn(b"id,entry_time", b"".join(stream.streaming_content))
+        resp = self.client.get(reverse("api_symbol_pnl"), HTTP_ACCEPT_ENCODING="identity")
+        self.assertFalse(resp.has_header("Content-Encoding"))
+
+    def test_drf_trade_list_is_compressed_after_rendering(self):
+        import gzip, json
+        resp = self.client.get(reverse("trade-list"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(len(json.loads(gzip.decompress(resp.content))), 300)
+
+
+# Most queries a request to each view may issue, session and user lookups
+# included. They must hold at 10 and at 1,000 trades: a view whose count grows
+# with the number of rows has an N+1.
+QUERY_BUDGETS = {
+    "home": 5,
+    "trades_list": 3,
+    "trades_calendar": 4,
+    "api_daily_pnl": 2,
+    "api_symbol_pnl": 2,
+    "api_symbol_stats": 2,
+    "api_tag_stats": 2,
+    "api_open_positions": 2,
+    "api_trade_pnl_series": 2,
+    "trade-list": 2,
+    "admin:journal_trade_changelist": 6,
+}
+
+# Statements a view may repeat a fixed number of times. Django's changelist
+# counts the unfiltered list once for the paginator and once for the full count.
+ALLOWED_REPEATS = {
+    "admin:journal_trade_changelist": ('SELECT COUNT(*) AS "__count" FROM "journal_trade"',),
+}
+
+
+@override_settings(JOURNAL_THROTTLE_BUDGET=12, JOURNAL_THROTTLE_WINDOW=60, JOURNAL_THROTTLE_MAX_HEAVY=1)
+class ThrottlingTests(TestCase):
+    """Tests for the per-user cost budget and the heavy-request concurrency cap."""
+    def setUp(self):
+        from django.core.cache import cache, caches
+        cache.clear()
+        caches["throttle"].clear()
+        self.user = User.objects.create_user("tia", "t@example.com", "pw123")
+        self.client.force_login(self.user)
+        now = timezone.now()
+        Trade.objects.create(owner=self.user, symbol="THR", side="BUY", quantity=1, price=10,
+                             entry_time=now - timezone.timedelta(hours=2), exit_price=11, exit_time=now)
+
+    def test_budget_is_charged_by_cost_and_shared_with_the_api(self):
+        self.assertEqual(self.client.get(reverse("api_trade_pnl_series")).status_code, 200)  # unfiltered: 10
+        self.assertEqual(self.client.get(reverse("api_daily_pnl")).status_code, 200)  # 11
+        self.assertEqual(self.client.get(reverse("api_trade_pnl_series"), {"symbol": "THR"}).status_code, 200)  # 12
+        resp = self.client.get(reverse("api_daily_pnl"))
+        self.assertEqual(resp.status_code, 429)
+        self.assertTrue(1 <= int(resp["Retry-After"]) <= 60)
+        resp = self.client.get(reverse("trade-list"))
+        self.assertEqual(resp.status_code, 429)
+        self.assertIn("Retry-After", resp)
+
+        other = User.objects.create_user("uma", "u@example.com", "pw123")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse("api_daily_pnl")).status_code, 200)
+
+    def test_counters_stay_out_of_non_atomic_caches(self):
+        if not settings.THROTTLE_SHARED:
+            self.assertTrue(settings.CACHES["throttle"]["BACKEND"].endswith(".LocMemCache"))
+            self.assertNotEqual(settings.CACHES["throttle"].get("LOCATION"), settings.CACHES["default"]["LOCATION"])
+
+    @override_settings(JOURNAL_THROTTLE_LEASE_SECONDS=30)
+    def test_streams_renew_their_slot_lease(self):
+        from unittest import mock
+        from config import throttling
+        slot = throttling.take_slot(f"user:{self.user.pk}")
+        chunks = throttling._ReleasingIterator(iter([b"a", b"b", b"c"]), slot)
+        self.assertEqual(next(chunks), b"a")
+        with mock.patch.object(throttling.cache, "touch", wraps=throttling.cache.touch) as touch:
+            with mock.patch("config.throttling.time.monotonic", return_value=slot._renewed + 11):
+                self.assertEqual(next(chunks), b"b")
+                self.assertEqual(next(chunks), b"c")  # renewed moments ago
+        touch.assert_called_once_with(slot.key, 30)
+        chunks.close()
+        self.assertIsNone(throttling.cache.get(f"journal:throttle:slot:user:{self.user.pk}:0"))
+
+    @override_settings(JOURNAL_THROTTLE_BUDGET=100, JOURNAL_THROTTLE_MAX_HEAVY=2)
+    def test_heavy_requests_hold_a_slot_until_the_response_is_sent(self):
+        from config import throttling
+        ident = f"user:{self.user.pk}"
+        first = self.client.get(reverse("trades_export_csv"))
+        self.assertTrue(first.streaming)
+        # ?format=csv shares the CSV body but takes one slot and one charge, not two.
+        second = self.client.get(reverse("trades_export"), {"format": "csv"})
+        self.assertEqual(second.status_code, 200)
+        resp = self.client.get(reverse("trades_export_csv"))
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp["Retry-After"], str(throttling.BUSY_RETRY_SECONDS))
+        self.assertEqual(throttling.charge(ident, 80), 0)  # 2 x HEAVY spent so far
+        self.assertNotEqual(throttling.charge(ident, 1), 0)
+
+        b"".join(first.streaming_content)  # the test client closes the response at the end
+        b"".join(second.streaming_content)
+        slots = [throttling.take_slot(ident) for _ in range(2)]
+        self.assertNotIn(None, slots)
+        for slot in slots:
+            slot.release()
+
+    def test_refused_requests_are_not_charged(self):
+        from config import throttling
+        ident = f"user:{self.user.pk}"
+        self.assertEqual(throttling.charge(ident, 10, now=30), 0)
+        self.assertEqual(throttling.charge(ident, 10, now=40), 20)
+        self.assertEqual(throttling.charge(ident, 2, now=50), 0)
+        self.assertEqual(throttling.charge(ident, 10, now=60), 0)  # next window
+
+
+@override_settings(JOURNAL_LIVE_BACKEND="memory")
+class LiveUpdateTests(TestCase):
+    """Tests for live trade events: their deltas, import batching and the SSE stream."""
+    def setUp(self):
+        self.user = User.objects.create_user("liv", "liv@example.com", "pw123")
+        self.client.force_login(self.user)
+        self.entry = timezone.make_aware(timezone.datetime(2024, 6, 3, 14, 0))
+
+    def _published(self, change):
+        from unittest import mock
+        from journal import live
+        with mock.patch.object(live.MemoryBroker, "publish") as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            change()
+        return [call.args for call in publish.call_args_list]
+
+    def test_events_carry_the_change_to_the_stats(self):
+        trade = Trade(owner=self.user, symbol="LIV", side="BUY", quantity=2, price=100, entry_time=self.entry)
+        [(user_id, event)] = self._published(trade.save)
+        self.assertEqual((user_id, event["action"], event["legs"]), (self.user.pk, "created", []))
+
+        trade.exit_price, trade.exit_time = 105, self.entry + timezone.timedelta(hours=1)
+        [(_, event)] = self._published(trade.save)
+        self.assertEqual(event["action"], "closed")
+        self.assertEqual(event["delta"], {"trades": 1, "wins": 1, "pnl": 10.0, "days": {"2024-06-03": 10.0}})
+
+        # A loss on the next day: the old leg leaves its bucket, the new one joins another.
+        trade.exit_price, trade.exit_time = 97.5, self.entry + timezone.timedelta(days=1)
+        [(_, event)] = self._published(trade.save)
+        self.assertEqual(event["action"], "edited")
+        self.assertEqual([leg["sign"] for leg in event["legs"]], [-1, 1])
+        self.assertEqual(event["delta"], {
+            "trades": 0, "wins": -1, "pnl": -15.0, "days": {"2024-06-03": -10.0, "2024-06-04": -5.0},
+        })
+
+        trade.notes = "just a note"
+        [(_, event)] = self._published(trade.save)
+        self.assertEqual(event["legs"], [])
+
+        [(_, event)] = self._published(trade.delete)
+        self.assertEqual(event["action"], "deleted")
+        self.assertEqual(event["delta"], {"trades": -1, "wins": 0, "pnl": 5.0, "days": {"2024-06-04": 5.0}})
+
+    def test_import_publishes_a_single_reset(self):
+        csv_bytes = (
+            b"entry_time,symbol,side,quantity,price,exit_price,exit_time,notes\n"
+            b"2025-01-01T10:00:00Z,IBM,BUY,1,100,105,2025-01-01T15:00:00Z,\n"
+            b"2025-01-02T10:00:00Z,IBM,BUY,1,100,95,2025-01-02T15:00:00Z,"
+        )
+        upload = SimpleUploadedFile("trades.csv", csv_bytes, content_type="text/csv")
+        published = self._published(lambda: self.client.post(reverse("trades_import"), {"file": upload}))
+        self.assertEqual(published, [(self.user.pk, {"type": "reset"})])
+        self.assertEqual(Trade.objects.filter(owner=self.user).count(), 2)
+
+    def test_stream_needs_asgi(self):
+        self.assertEqual(self.client.get(reverse("live_events")).status_code, 501)
+
+    async def test_stream_delivers_the_users_events(self):
+        import asyncio
+        import json
+        from asgiref.sync import sync_to_async
+        from django.test import AsyncClient
+
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        resp = await client.get(reverse("live_events"))
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        stream = aiter(resp.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))  # subscribed from here on
+
+        def close_a_trade():
+            other = User.objects.create_user("oth", "oth@example.com", "pw123")
+            with self.captureOnCommitCallbacks(execute=True):
+                Trade.objects.create(owner=other, symbol="OTH", side="BUY", quantity=1, price=1, entry_time=self.entry)
+                Trade.objects.create(owner=self.user, symbol="LIV", side="SELL", quantity=1, price=50,
+                                     entry_time=self.entry, exit_price=45, exit_time=self.entry)
+        await sync_to_async(close_a_trade)()
+
+        chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+        event_type, data = chunk.split("\n")[:2]
+        self.assertEqual(event_type, "event: trade")
+        event = json.loads(data.removeprefix("data: "))
+        self.assertEqual((event["action"], event["delta"]["pnl"]), ("created", 5.0))
+        await stream.aclose()
+
+
+class LiveBrokerTests(TransactionTestCase):
+    """Tests for fanning events out across connections with Postgres LISTEN/NOTIFY."""
+
+    async def test_notify_reaches_subscribers(self):
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from journal import live
+
+        broker = live.PostgresBroker()
+        try:
+            subscription = broker.subscribe(7)
+            other = broker.subscribe(8)
+            self.assertTrue(await sync_to_async(broker.listening.wait)(10))
+            # Published on the request connection, received on the listener's.
+            await sync_to_async(broker.publish)(7, {"type": "reset"})
+            self.assertEqual(await asyncio.wait_for(subscription.get(), 5), {"type": "reset"})
+            self.assertTrue(other.queue.empty())
+            subscription.close()
+            other.close()
+        finally:
+            await sync_to_async(broker.close)()
+
+
+class HealthCheckTests(TransactionTestCase):
+    """Tests for /healthz/ and the deep checks in config.health."""
+    TOKEN = "probe-secret"
+
+    def setUp(self):
+        from config import health
+        health._migrations.update(checked=0.0, result=None)
+        self.settings_override = override_settings(JOURNAL_HEALTH_TOKEN=self.TOKEN)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.client.defaults["HTTP_X_HEALTH_TOKEN"] = self.TOKEN
+
+    def test_plain_probe_touches_nothing(self):
+        with self.assertNumQueries(0):
+            resp = self.client.get("/healthz/")
+        self.assertEqual(resp.json(), {"status": "ok"})
+        self.assertEqual(resp["Cache-Control"], "no-store")
+
+    def test_deep_probe_reports_every_check(self):
+        resp = self.client.get("/healthz/?deep=1")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["status"], "ok")
+        self.assertEqual(set(body["checks"]), {"database", "cache", "workers", "migrations"})
+        database = body["checks"]["database"]
+        self.assertIn("latency_ms", database)
+        self.assertGreater(database["connections"]["used"], 0)
+        self.assertEqual(body["checks"]["migrations"]["pending"], [])
+        self.assertIn("latency_ms", body["checks"]["cache"])
+
+    def test_deep_report_is_internal_only(self):
+        from unittest import mock
+        from config import health
+        del self.client.defaults["HTTP_X_HEALTH_TOKEN"]
+        with mock.patch.object(health, "run") as run:
+            for headers in ({}, {"X-Health-Token": "guess"}):
+                with self.assertNumQueries(0):
+                    resp = self.client.get("/healthz/?deep=1", headers=headers)
+                self.assertEqual(resp.json(), {"status": "ok"})
+            self.client.force_login(User.objects.create_user("nadia", "n@example.com", "pw123"))
+            self.assertEqual(self.client.get("/healthz/?deep=1").json(), {"status": "ok"})
+            with override_settings(JOURNAL_HEALTH_TOKEN=""):
+                self.assertEqual(self.client.get("/healthz/?deep=1", headers={"X-Health-Token": ""}).json(), {"status": "ok"})
+            run.assert_not_called()
+
+        self.client.force_login(User.objects.create_user("olga", "o@example.com", "pw123", is_staff=True))
+        self.assertIn("checks", self.client.get("/healthz/?deep=1").json())
+
+    def test_hung_check_times_out(self):
+        import threading
+        from unittest import mock
+        from config import health
+        release = threading.Event()
+        try:
+            with override_settings(JOURNAL_HEALTH_TIMEOUT_SECONDS=0.2), \
+                    mock.patch.object(health, "check_cache", lambda: release.wait(10)):
+                report = health.run()
+        finally:
+            release.set()
+        self.assertEqual(report["status"], health.DEGRADED)
+        self.assertIn("timed out", report["checks"]["cache"]["error"])
+        self.assertLess(report["elapsed_ms"], 2000)
+
+    def test_database_failure_is_unhealthy(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from config import health
+
+        def unreachable(alias):
+            raise OperationalError("connection refused")
+
+        with mock.patch.object(health, "check_database", unreachable):
+            resp = self.client.get("/healthz/?deep=1")
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json()["status"], health.UNHEALTHY)
+        self.assertIn("connection refused", resp.json()["checks"]["database"]["error"])
+
+    def test_pending_migrations_and_saturation_degrade(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from config import health
+        plan = [(SimpleNamespace(app_label="journal", name="9999_future"), False)]
+        with mock.patch("django.db.migrations.executor.MigrationExecutor.migration_plan", return_value=plan), \
+                override_settings(JOURNAL_HEALTH_MAX_IN_FLIGHT=0):
+            resp = self.client.get("/healthz/?deep=1")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["status"], health.DEGRADED)
+        self.assertEqual(body["checks"]["migrations"]["pending"], ["journal.9999_future"])
+        self.assertEqual(body["checks"]["workers"]["status"], health.DEGRADED)
+
+
+class AsgiExportTests(TransactionTestCase):
+    """The streamed exports served through config.asgi, as in production."""
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        user = User.objects.create_user("sage", "s@example.com", "pw123")
+        now = timezone.now()
+        for i in range(40):
+            Trade.objects.create(owner=user, symbol="AMD", side="BUY", quantity=1, price=10 + i, exit_price=11 + i,
+                                 entry_time=now - timezone.timedelta(hours=i + 1), exit_time=now, notes=f"trade {i}")
+        self.client.force_login(user)
+        self.session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    async def _get(self, url, query, events, accept_encoding=""):
+        """GET url through the ASGI application; returns (headers, body chunks), noting each sent chunk in events."""
+        import asyncio
+        from config.asgi import application
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": url, "raw_path": url.encode(), "query_string": query.encode(),
+            "root_path": "", "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+            "headers": [
+                (b"host", b"testserver"),
+                (b"cookie", f"{settings.SESSION_COOKIE_NAME}={self.session_key}".encode()),
+                (b"accept-encoding", accept_encoding.encode()),
+            ],
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Event().wait()
+
+        headers, chunks = {}, []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                self.assertEqual(message["status"], 200)
+                headers.update((k.decode().lower(), v.decode()) for k, v in message["headers"])
+            elif message.get("body"):
+                events.append("sent")
+                chunks.append(message["body"])
+
+        await application(scope, receive, send)
+        return headers, chunks
+
+    def _traced(self, chunks, events):
+        """Wrap an exporting chunk generator so each produced chunk is noted in events."""
+        def traced(qs):
+            for chunk in chunks(qs):
+                events.append("made")
+                yield chunk
+        return traced
+
+    def assertStreamed(self, events):
+        """The first chunk reached the client before the last one was produced."""
+        self.assertLess(events.index("sent"), len(events) - 1 - events[::-1].index("made"))
+
+    async def test_csv_export_streams(self):
+        from unittest import mock
+        from . import exporting
+        events = []
+        with mock.patch.object(exporting, "CHUNK_BYTES", 256), \
+                mock.patch.object(exporting, "csv_chunks", self._traced(exporting.csv_chunks, events)):
+            headers, chunks = await self._get(reverse("trades_export"), "format=csv", events)
+        self.assertGreater(len(chunks), 1)
+        self.assertStreamed(events)
+        self.assertNotIn("content-encoding", headers)
+        rows = list(csv.reader(b"".join(chunks).decode().splitlines()))
+        self.assertEqual(len(rows), 41)
+
+    async def test_compressed_csv_export_streams(self):
+        import zlib
+        from unittest import mock
+        from . import exporting
+        events = []
+        with mock.patch.object(exporting, "CHUNK_BYTES", 256), \
+                mock.patch.object(exporting, "csv_chunks", self._traced(exporting.csv_chunks, events)):
+            headers, chunks = await self._get(reverse("trades_export_csv"), "", events, accept_encoding="gzip")
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertGreater(len(chunks), 1)
+        self.assertStreamed(events)
+        rows = list(csv.reader(zlib.decompress(b"".join(chunks), 31).decode().splitlines()))
+        self.assertEqual(len(rows), 41)
+
+    async def test_parquet_export_streams(self):
+        from unittest import mock
+        from . import exporting
+        if not exporting.PARQUET_AVAILABLE:
+            self.skipTest("pyarrow is not installed")
+        events = []
+        with mock.patch.object(exporting, "PARQUET_ROW_GROUP", 10), \
+                mock.patch.object(exporting, "parquet_chunks", self._traced(exporting.parquet_chunks, events)):
+            headers, chunks = await self._get(reverse("trades_export"), "format=parquet", events)
+        self.assertGreater(len(chunks), 1)
+        self.assertStreamed(events)
+        import pyarrow as pa, pyarrow.parquet as pq
+        table = pq.read_table(pa.BufferReader(b"".join(chunks)))
+        self.assertEqual(table.num_rows, 40)
+        self.assertEqual(pq.ParquetFile(pa.BufferReader(b"".join(chunks))).num_row_groups, 4)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Per-view query budgets, checked at two data sizes (journal.testing)."""
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_superuser("rhea", "r@example.com", "pw123")
+        self.client.force_login(self.user)
+        self.next_trade = 0
+
+    def _add_trades(self, count):
+        now = timezone.now()
+        symbols, tags = ("AAPL", "MSFT", "TSLA", "NVDA"), (["swing"], ["scalp", "news"], [])
+        trades = []
+        for i in range(self.next_trade, self.next_trade + count):
+            closed = i % 5 != 0
+            trades.append(Trade(
+                owner=self.user, symbol=symbols[i % 4], side="SELL" if i % 3 == 0 else "BUY",
+                quantity=1 + i % 7, price=100 + i % 11, tags=tags[i % 3], notes=f"trade {i}",
+                entry_time=now - timezone.timedelta(hours=i + 2),
+                exit_price=(95 + i % 13) if closed else None,
+                exit_time=(now - timezone.timedelta(hours=i + 1)) if closed else None,
+            ))
+        Trade.objects.bulk_create(trades)
+        self.next_trade += count
+
+    def _measure(self):
+        counts = {}
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(view=name, trades=self.next_trade):
+                url = reverse(name)
+                # The first request fills the cached user; budgets are for warm requests.
+                self.client.get(url)
+                log = self.assertQueryBudget(
+                    budget, self.client.get, url, allow_repeated=ALLOWED_REPEATS.get(name, ()),
+                )
+                counts[name] = len(log)
+        return counts
+
+    def test_query_counts_are_within_budget_and_flat(self):
+        self._add_trades(10)
+        small = self._measure()
+        self._add_trades(990)
+        large = self._measure()
+        self.assertEqual(large, small)
+
+    def test_repeated_statements_are_reported(self):
+        from .testing import QueryLog
+        self._add_trades(3)
+        with QueryLog() as log:
+            [str(t.owner) for t in Trade.objects.all()]
+        self.assertEqual(len(log), 4)
+        self.assertEqual(list(log.repeated().values()), [3])
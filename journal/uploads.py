@@ -0,0 +1,187 @@
+"""
+Resumable chunked uploads of import files.
+
+The client announces the file name and size (start()), then sends the file in
+order, one chunk per PUT with a Content-Range header and optionally the
+chunk's SHA-256 (append_chunk()). Each chunk is streamed from the request to a
+file of its own under JOURNAL_UPLOAD_DIR and only added to the partial file
+once it arrived whole and its checksum matched. After a dropped connection the
+client asks for the current offset and carries on from there. A user can have
+at most JOURNAL_UPLOAD_MAX_ACTIVE uploads at a time.
+
+open_completed() opens the finished file from disk for trades_import, so a
+large statement is never held in memory or copied through Django's upload
+handlers.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .importing import EXTENSIONS
+from .models import ImportUpload
+
+READ_BYTES = 64 * 1024
+
+_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+_SHA256_RE = re.compile(r"[0-9a-f]{64}")
+
+
+class UploadError(ValueError):
+    """A rejected request; status is the HTTP status to answer with."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def path_for(upload):
+    return os.path.join(settings.JOURNAL_UPLOAD_DIR, f"{upload.pk}.part")
+
+
+def _clean_sha256(value):
+    value = (value or "").strip().lower()
+    if value and not _SHA256_RE.fullmatch(value):
+        raise UploadError("sha256 must be 64 hex digits.")
+    return value
+
+
+def start(owner, filename, size, sha256=""):
+    """Create an empty upload for owner; abandoned ones of theirs are purged first."""
+    filename = os.path.basename((filename or "").strip())
+    if not filename.lower().endswith(EXTENSIONS):
+        raise UploadError(f"Unsupported file type; use one of {', '.join(EXTENSIONS)}.")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("size must be an integer.")
+    if size <= 0:
+        raise UploadError("size must be greater than 0.")
+    if size > settings.JOURNAL_UPLOAD_MAX_BYTES:
+        raise UploadError(f"Files are limited to {settings.JOURNAL_UPLOAD_MAX_BYTES} bytes.", status=413)
+    sha256 = _clean_sha256(sha256)
+
+    purge_expired(owner)
+    with transaction.atomic():
+        # Lock the owner so that concurrent starts are counted one at a time.
+        get_user_model().objects.select_for_update().filter(pk=owner.pk).first()
+        if ImportUpload.objects.filter(owner=owner).count() >= settings.JOURNAL_UPLOAD_MAX_ACTIVE:
+            raise UploadError(
+                f"At most {settings.JOURNAL_UPLOAD_MAX_ACTIVE} uploads at a time; "
+                "finish or delete one first.", status=429,
+            )
+        upload = ImportUpload.objects.create(owner=owner, filename=filename, size=size, sha256=sha256)
+    os.makedirs(settings.JOURNAL_UPLOAD_DIR, exist_ok=True)
+    open(path_for(upload), "wb").close()
+    return upload
+
+
+def parse_content_range(header, size):
+    """Return (first, last) byte positions from 'bytes first-last/size'."""
+    match = _RANGE_RE.fullmatch((header or "").strip())
+    if not match:
+        raise UploadError("Content-Range must look like 'bytes first-last/total'.")
+    first, last, total = (int(g) for g in match.groups())
+    if total != size:
+        raise UploadError(f"Content-Range total {total} differs from the announced size {size}.")
+    if last < first or last >= size:
+        raise UploadError("Content-Range is outside the file.")
+    if last - first + 1 > settings.JOURNAL_UPLOAD_CHUNK_BYTES:
+        raise UploadError(f"Chunks are limited to {settings.JOURNAL_UPLOAD_CHUNK_BYTES} bytes.", status=413)
+    return first, last
+
+
+def _check_offset(upload, first):
+    if first != upload.received:
+        raise UploadError(f"Expected the chunk at offset {upload.received}.", status=409)
+
+
+def append_chunk(upload, stream, content_range, content_length, sha256=""):
+    """
+    Append one chunk read from stream. The chunk is read into a file of its
+    own first, so no lock is held while it arrives; the upload row is then
+    locked only to check the offset again, copy the chunk onto the partial
+    file and advance the offset, so retries of the same chunk can't
+    interleave. Raises UploadError (409 if the chunk doesn't start at the
+    current offset).
+    """
+    sha256 = _clean_sha256(sha256)
+    first, last = parse_content_range(content_range, upload.size)
+    length = last - first + 1
+    if content_length is not None and content_length != length:
+        raise UploadError("Content-Length doesn't match Content-Range.")
+    _check_offset(upload, first)
+
+    fd, chunk_path = tempfile.mkstemp(prefix=f"{upload.pk}.", suffix=".chunk", dir=settings.JOURNAL_UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, "w+b") as chunk:
+            digest = hashlib.sha256()
+            written = 0
+            while written < length:
+                data = stream.read(min(READ_BYTES, length - written))
+                if not data:
+                    break
+                chunk.write(data)
+                digest.update(data)
+                written += len(data)
+            if written != length:
+                raise UploadError(f"Chunk ended after {written} of {length} bytes.")
+            if sha256 and digest.hexdigest() != sha256:
+                raise UploadError("Chunk checksum mismatch.")
+
+            chunk.seek(0)
+            with transaction.atomic():
+                upload = ImportUpload.objects.select_for_update().get(pk=upload.pk)
+                _check_offset(upload, first)
+                with open(path_for(upload), "r+b") as fh:
+                    # Anything past the offset is left over from a copy that never completed.
+                    fh.truncate(first)
+                    fh.seek(first)
+                    shutil.copyfileobj(chunk, fh, READ_BYTES)
+                upload.received = first + length
+                upload.save(update_fields=["received", "updated_at"])
+    finally:
+        os.remove(chunk_path)
+    return upload
+
+
+def file_sha256(upload):
+    digest = hashlib.sha256()
+    with open(path_for(upload), "rb") as fh:
+        for data in iter(lambda: fh.read(READ_BYTES), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def open_completed(upload):
+    """Open a finished upload as a File named like the original; the caller closes it."""
+    if not upload.complete:
+        raise UploadError(f"Upload incomplete: {upload.received} of {upload.size} bytes received.", status=409)
+    if upload.sha256 and file_sha256(upload) != upload.sha256:
+        raise UploadError("The uploaded file doesn't match its checksum; upload it again.")
+    return File(open(path_for(upload), "rb"), name=upload.filename)
+
+
+def discard(upload):
+    try:
+        os.remove(path_for(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def purge_expired(owner=None):
+    """Discard uploads untouched for JOURNAL_UPLOAD_EXPIRE_HOURS."""
+    cutoff = timezone.now() - timedelta(hours=settings.JOURNAL_UPLOAD_EXPIRE_HOURS)
+    stale = ImportUpload.objects.filter(updated_at__lt=cutoff)
+    if owner is not None:
+        stale = stale.filter(owner=owner)
+    for upload in stale:
+        discard(upload)
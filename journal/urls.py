@@ -2,7 +2,7 @@
 URL configuration for the journal app, including web views and API endpoints.
 """
 from django.urls import path, include
-from .views import TradeViewSet, healthz, home, trades_list, trades_create, trades_edit, trades_delete, trades_export_csv, dashboard, profile, trades_charts_page, api_daily_pnl, api_symbol_pnl, api_trade_pnl_series, trades_calendar_page, trades_import
+from .views import TradeViewSet, healthz, home, trades_list, trades_create, trades_edit, trades_delete, trades_export_csv, trades_export, dashboard, profile, trades_charts_page, api_daily_pnl, api_symbol_pnl, api_symbol_stats, api_tag_stats, api_open_positions, api_trade_pnl_series, trades_calendar_page, trades_import, live_events, import_uploads, import_upload_detail
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -19,10 +19,17 @@ urlpatterns = [
     path("api/", include(router.urls)),
     path("trades/<int:pk>/delete/", trades_delete, name="trades_delete"),
     path("trades/export.csv", trades_export_csv, name="trades_export_csv"),
+    path("trades/export/", trades_export, name="trades_export"),
     path("trades/charts/", trades_charts_page, name="trades_charts"),
     path("api/stats/daily-pnl/", api_daily_pnl, name="api_daily_pnl"),
     path("api/stats/symbol-pnl/", api_symbol_pnl, name="api_symbol_pnl"),
+    path("api/stats/symbols/", api_symbol_stats, name="api_symbol_stats"),
+    path("api/stats/tags/", api_tag_stats, name="api_tag_stats"),
+    path("api/stats/open-positions/", api_open_positions, name="api_open_positions"),
     path("api/stats/trade-pnl/", api_trade_pnl_series, name="api_trade_pnl_series"),
+    path("api/live/", live_events, name="live_events"),
     path("trades/calendar/", trades_calendar_page, name="trades_calendar"),
     path("trades/import/", trades_import, name="trades_import"),
+    path("trades/import/uploads/", import_uploads, name="import_uploads"),
+    path("trades/import/uploads/<uuid:pk>/", import_upload_detail, name="import_upload_detail"),
 ]
\ No newline at end of file
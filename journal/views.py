@@ -1,79 +1,111 @@
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, permissions
-from .models import Trade, UserTradeSettings
+from .models import PNL_EXPR, ImportUpload, Trade, TradeHistory, normalize_tags
 from .serializers import TradeSerializer
 from .forms import TradeForm, UserTradeSettingsForm, TradesImportForm, ProfileForm
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.utils import timezone
 from django.core.paginator import Paginator
-from django.db.models import F, Case, When, Value, DecimalField, ExpressionWrapper, Q, Sum, Count, IntegerField, Avg
-import csv
-from django.db.models.functions import TruncDate
+from django.db import connections, router, transaction
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
+from django.db.models import Case, When, Sum, Count, IntegerField
+from django.db.models.functions import Substr, TruncDate
+import asyncio
 import calendar as _cal
-from datetime import date, datetime, timedelta
-import openpyxl
-from io import TextIOWrapper
-
-PNL_EXPR = Case(
-    When(side="BUY",  then=(F("exit_price") - F("price")) * F("quantity")),
-    When(side="SELL", then=(F("price") - F("exit_price")) * F("quantity")),
-    default=None,
-    output_field=DecimalField(max_digits=16, decimal_places=2),
-)
-
-EXPECTED = ["entry_time","symbol","side","quantity","price","exit_price","exit_time","notes"]
-
-
-def _dashboard_context(request):
-    closed = Trade.objects.filter(owner=request.user, exit_price__isnull=False)
-    pnl_value = ExpressionWrapper(PNL_EXPR, output_field=DecimalField(max_digits=16, decimal_places=2))
-    closed = closed.annotate(pnl_value=pnl_value)
-
-    agg = closed.aggregate(
-        total_pnl=Sum("pnl_value"),
-        avg_pnl=Avg("pnl_value"),
-        wins=Sum(Case(When(pnl_value__gt=0, then=1), default=0, output_field=IntegerField())),
+from datetime import date
+import json
+from asgiref.sync import sync_to_async
+from . import archive, concurrency, live, quotes, symbols, uploads
+from .caching import get_trade_settings
+from .concurrency import run_concurrently
+from config import health
+from config.compression import compress_response, compressed
+from config.db_routers import reads_from_replica, use_replica
+from config.throttling import HEAVY, LIGHT, throttled
+
+async def _arender(request, template_name, context):
+    """render() for async views; templates and context processors are sync-only."""
+    # Reuse the user loaded by request.auser() so the auth context processor doesn't query it again.
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, template_name, context)
+
+
+DASHBOARD_OPEN_POSITIONS = 10  # largest by unrealized PnL
+
+
+async def _dashboard_context(user):
+    closed = Trade.objects.filter(owner=user, exit_price__isnull=False)
+    closed = closed.annotate(pnl_value=PNL_EXPR)
+    # The five latest may include archived trades when there are few recent ones.
+    recent = archive.trades().filter(owner=user, exit_price__isnull=False).annotate(pnl_value=PNL_EXPR)
+
+    # The aggregate, count, recent-trades and open-position queries are independent; run them at once.
+    # Archived trades count through their rollups (journal.archive).
+    agg, trade_count, recent_trades, open_risk, archived = await run_concurrently(
+        lambda: closed.aggregate(
+            total_pnl=Sum("pnl_value"),
+            wins=Sum(Case(When(pnl_value__gt=0, then=1), default=0, output_field=IntegerField())),
+        ),
+        closed.count,
+        lambda: list(
+            recent.order_by("-exit_time")
+                  .values("exit_time", "symbol", "side", "quantity", "pnl_value")[:5]
+        ),
+        lambda: quotes.unrealized_pnl(user),
+        lambda: archive.totals(user),
     )
-    trade_count = closed.count()
-    wins = agg["wins"] or 0
+    trade_count += archived["trades"]
+    wins = (agg["wins"] or 0) + archived["wins"]
+    total_pnl = (agg["total_pnl"] or 0) + archived["pnl"]
     win_rate = (wins / trade_count * 100.0) if trade_count else 0.0
 
-    recent_trades = (
-        closed.order_by("-exit_time")
-              .values("exit_time", "symbol", "side", "quantity", "pnl_value")[:5]
-    )
     return {
         "trade_count": trade_count,
-        "total_pnl": agg["total_pnl"] or 0,
-        "avg_pnl": agg["avg_pnl"] or 0,
+        "wins": wins,
+        "total_pnl": total_pnl,
+        "avg_pnl": total_pnl / trade_count if trade_count else 0,
         "win_rate": win_rate,
         "recent_trades": recent_trades,
+        "open_positions": sorted(
+            open_risk["positions"],
+            key=lambda p: (p["unrealized_pnl"] is None, -abs(p["unrealized_pnl"] or 0)),
+        )[:DASHBOARD_OPEN_POSITIONS],
+        "open_position_count": len(open_risk["positions"]),
+        "unrealized_pnl": open_risk["unrealized_pnl"],
+        "unpriced": open_risk["unpriced"],
         "now": timezone.now(),
     }
 
-def healthz(_request):
-    return JsonResponse({"status": "ok"})
-
-def home(request):
-    if not request.user.is_authenticated:
-        return render(request, "landing.html", {"now": timezone.now()})
-    return render(request, "dashboard.html", _dashboard_context(request))
+def healthz(request):
+    """
+    Liveness: {"status": "ok"} without touching any dependency. With ?deep=1,
+    from callers config.health.allowed() lets in, readiness: the database,
+    cache, worker saturation and migration checks, answering 503 when the
+    instance is unhealthy. Anyone else gets the liveness answer.
+    """
+    if request.GET.get("deep") not in ("1", "true") or not health.allowed(request):
+        response = JsonResponse({"status": "ok"})
+    else:
+        report = health.run()
+        response = JsonResponse(report, status=503 if report["status"] == health.UNHEALTHY else 200)
+    response["Cache-Control"] = "no-store"
+    return response
+
+@reads_from_replica
+async def home(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return await _arender(request, "landing.html", {"now": timezone.now()})
+    return await _arender(request, "dashboard.html", await _dashboard_context(user))
 
 def _annotate_pnl(qs):
-    buy_expr  = (F("exit_price") - F("price")) * F("quantity")
-    sell_expr = (F("price") - F("exit_price")) * F("quantity")
-    return qs.annotate(
-        pnl_value=Case(
-            When(exit_price__isnull=True, then=Value(None)),
-            When(side="BUY",  then=ExpressionWrapper(buy_expr,  output_field=DecimalField(max_digits=12, decimal_places=2))),
-            When(side="SELL", then=ExpressionWrapper(sell_expr, output_field=DecimalField(max_digits=12, decimal_places=2))),
-            default=Value(None),
-            output_field=DecimalField(max_digits=12, decimal_places=2),
-        )
-    )
+    return qs.annotate(pnl_value=PNL_EXPR)
 
 # --- helper: parse datetime from query params (accepts date or datetime-local) ---
 def _parse_dt(s: str | None):
@@ -89,70 +121,6 @@ def _parse_dt(s: str | None):
     return None
 
 
-def _excel_serial_to_datetime(n: float):
-    """Convert Excel serial date/time to a timezone-aware datetime."""
-    # Excel's day 0 is 1899-12-30 (with the 1900 leap-year bug baked in).
-    origin = datetime(1899, 12, 30)
-    dt = origin + timedelta(days=float(n))
-    # openpyxl/pure Excel serials are naive; make aware in project TZ
-    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
-
-def _coerce_dt_any(val):
-    """
-    Accepts:
-      - datetime/date objects
-      - Excel serial numbers (int/float)
-      - strings in many common formats
-    Returns a timezone-aware datetime or None.
-    """
-    if val in (None, ""):
-        return None
-
-    # 1) Python datetime/date
-    if isinstance(val, datetime):
-        return timezone.make_aware(val) if timezone.is_naive(val) else val
-    if isinstance(val, date):
-        dt = datetime(val.year, val.month, val.day)
-        return timezone.make_aware(dt)
-
-    # 2) Excel serial (int/float)
-    if isinstance(val, (int, float)):
-        try:
-            return _excel_serial_to_datetime(val)
-        except Exception:
-            pass  # fall through to string parsing
-
-    # 3) Strings
-    s = str(val).strip()
-    # common ISO variants and “datetime-local” variants
-    fmts = [
-        "%Y-%m-%dT%H:%M:%S.%f%z",
-        "%Y-%m-%dT%H:%M:%S%z",
-        "%Y-%m-%dT%H:%M:%S.%f",
-        "%Y-%m-%dT%H:%M:%S",
-        "%Y-%m-%dT%H:%M",
-
-        "%Y-%m-%d %H:%M:%S.%f%z",
-        "%Y-%m-%d %H:%M:%S%z",
-        "%Y-%m-%d %H:%M:%S.%f",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d %H:%M",
-
-        "%Y-%m-%d",  # date-only
-    ]
-    # allow trailing 'Z' for UTC
-    if s.endswith("Z"):
-        s = s[:-1] + "+0000"
-    for fmt in fmts:
-        try:
-            dt = datetime.strptime(s, fmt)
-            # if parsed with %z it’s already aware; else make aware
-            return dt if dt.tzinfo else timezone.make_aware(dt)
-        except ValueError:
-            continue
-
-    return None
-
 
 def _month_bounds(year: int, month: int):
     start = date(year, month, 1)
@@ -162,12 +130,6 @@ def _month_bounds(year: int, month: int):
         next_month = date(year, month + 1, 1)
     return start, next_month  # [start, next_month)
 
-def _coerce_decimal(s):
-    if s in (None, ""):
-        return None
-    # allow commas, spaces
-    return float(str(s).replace(",", "").strip())
-
 
 def _color_for_pnl(pnl: float | None, max_abs: float) -> str:
     """
@@ -191,34 +153,42 @@ def _color_for_pnl(pnl: float | None, max_abs: float) -> str:
     return f"#{r:02x}{g:02x}{b:02x}"
 
 @login_required
-def trades_calendar_page(request):
+@reads_from_replica
+async def trades_calendar_page(request):
     """
     Monthly calendar colored by realized PnL.
     Hover shows PnL, #trades, wins, win rate. Click a day to jump to filtered list.
     """
+    user = await request.auser()
     today = timezone.localdate()
     has_query_month = ("month" in request.GET) or ("year" in request.GET)
 
     if not has_query_month:
-        # 1) most recent closed trade (by exit_time)
-        latest_exit = (
-            Trade.objects
-            .filter(owner=request.user, exit_time__isnull=False)
-            .order_by("-exit_time")
-            .values_list("exit_time", flat=True)
-            .first()
-        )
-        # 2) else most recent entry_time
-        latest_entry = (
-            None if latest_exit else
-            Trade.objects
-            .filter(owner=request.user)
-            .order_by("-entry_time")
-            .values_list("entry_time", flat=True)
-            .first()
-        )
-
-        dt = latest_exit or latest_entry
+        # 1) most recent closed trade (by exit_time), 2) else most recent entry_time.
+        def latest_exit():
+            return (
+                archive.trades()
+                .filter(owner=user, exit_time__isnull=False)
+                .order_by("-exit_time")
+                .values_list("exit_time", flat=True)
+                .first()
+            )
+
+        def latest_entry():
+            return (
+                Trade.objects
+                .filter(owner=user)
+                .order_by("-entry_time")
+                .values_list("entry_time", flat=True)
+                .first()
+            )
+
+        if concurrency.enabled():
+            # With the query pool both lookups are issued together; the entry one is only used as a fallback.
+            dt_exit, dt_entry = await run_concurrently(latest_exit, latest_entry)
+            dt = dt_exit or dt_entry
+        else:
+            dt = await sync_to_async(latest_exit)() or await sync_to_async(latest_entry)()
         if dt is not None:
             dt = timezone.localtime(dt)  # ensure local tz
             default_year, default_month = dt.year, dt.month
@@ -243,24 +213,20 @@ def trades_calendar_page(request):
     weekdays = [_cal.day_abbr[(first_weekday + i) % 7] for i in range(7)]
     weeks = cal.monthdatescalendar(year, month)
 
-    # ----- FIXED: define once, then reuse consistently -----
-    pnl_value_expr = ExpressionWrapper(
-        PNL_EXPR, output_field=DecimalField(max_digits=16, decimal_places=2)
-    )
-
     # Closed trades in the month (by exit_time) → per-day stats
     qs = (
         Trade.objects
         .filter(
-            owner=request.user,
+            owner=user,
             exit_price__isnull=False,
             exit_time__gte=start,
             exit_time__lt=next_month,
+            entry_time__lt=next_month,  # implied by the above; enables partition pruning
         )
         # Step A: add day + pnl_value
         .annotate(
             day=TruncDate("exit_time"),
-            pnl_value=pnl_value_expr,
+            pnl_value=PNL_EXPR,
         )
         # Step B: now we can reference the annotation name 'pnl_value'
         .annotate(
@@ -281,15 +247,22 @@ def trades_calendar_page(request):
     )
 
 
+    rows = [row async for row in qs]
+    if archive.reaches(start):
+        # Archived trades, from their daily rollups.
+        rows += [row async for row in archive.rollups(user, start, next_month - timezone.timedelta(days=1))
+                 .values("day", "pnl", "trades", "wins")]
+
     # Build map of day → stats
     day_stats = {}
-    for row in qs:
+    for row in rows:
         d = row["day"]
-        pnl = float(row["pnl"] or 0)
-        trades = int(row["trades"] or 0)
-        wins = int(row["wins"] or 0)
-        win_rate = (wins / trades * 100.0) if trades else 0.0
-        day_stats[d] = {"pnl": pnl, "trades": trades, "wins": wins, "win_rate": win_rate}
+        stats = day_stats.setdefault(d, {"pnl": 0.0, "trades": 0, "wins": 0})
+        stats["pnl"] += float(row["pnl"] or 0)
+        stats["trades"] += int(row["trades"] or 0)
+        stats["wins"] += int(row["wins"] or 0)
+    for stats in day_stats.values():
+        stats["win_rate"] = (stats["wins"] / stats["trades"] * 100.0) if stats["trades"] else 0.0
 
     max_abs = max((abs(v["pnl"]) for v in day_stats.values()), default=0.0)
     month_total_pnl = sum(v["pnl"] for v in day_stats.values())
@@ -343,43 +316,87 @@ def trades_calendar_page(request):
         "next_link": f"?year={next_y}&month={next_m}",
         "month_total_pnl": month_total_pnl,
     }
-    return render(request, "trades/calendar.html", context)
+    return await _arender(request, "trades/calendar.html", context)
 
-@login_required
-def api_trade_pnl_series(request):
+def _tags_param(params):
+    """Tags from ?tag=, repeated or comma-separated, normalized as they are stored."""
+    return normalize_tags(t for value in params.getlist("tag") for t in value.split(","))
+
+
+def _tag_filter(qs, params):
     """
-    Returns each CLOSED trade's realized PnL in chronological order (by exit_time).
-    Filterable via ?symbol=&side=&start=&end= (same semantics as your other chart APIs).
+    Keep trades carrying every tag in ?tag=. tags @> ARRAY[...] is answered
+    from the GIN index on Trade.tags.
     """
-    qs = Trade.objects.filter(owner=request.user, exit_price__isnull=False)
+    tags = _tags_param(params)
+    return qs.filter(tags__contains=tags) if tags else qs
 
-    # filters
-    symbol = (request.GET.get("symbol") or "").strip()
+
+def _symbol_filter(qs, params):
+    """Keep trades whose symbol matches ?symbol= (see journal.symbols), resolved to ids first."""
+    spec = symbols.parse_filter(params.get("symbol"))
+    return qs.filter(symbol_ref__in=symbols.ids_for(spec)) if spec else qs
+
+
+async def _closed_trades(request, user, archived=True):
+    """
+    The user's closed trades, filtered by ?symbol=&side=&tag=&start=&end= with
+    the date range applied to exit_time. Shared by the /api/stats/ views.
+    Includes archived trades when the range reaches into the archive, unless
+    archived is False.
+    """
+    symbol = symbols.parse_filter(request.GET.get("symbol"))
     side   = (request.GET.get("side") or "").strip().upper()
     start  = (request.GET.get("start") or "").strip()
     end    = (request.GET.get("end") or "").strip()
+    start_dt = _parse_dt(start)
+    end_dt   = _parse_dt(end)
+
+    trades = archive.trades(start_dt) if archived else Trade.objects
+    qs = _tag_filter(trades.filter(owner=user, exit_price__isnull=False), request.GET)
 
     if symbol:
-        qs = qs.filter(symbol__icontains=symbol)
+        qs = qs.filter(symbol_ref__in=await symbols.aids_for(symbol))
     if side in {"BUY", "SELL"}:
         qs = qs.filter(side=side)
 
-    start_dt = _parse_dt(start)
-    end_dt   = _parse_dt(end)
     if start_dt:
         qs = qs.filter(exit_time__gte=start_dt)
     if end_dt:
+        # Trades can't exit before they enter (Trade.clean, the API and import all
+        # check), so the exit bound also bounds entry_time, the partition key; that
+        # lets a partitioned table skip later partitions.
         if len(end) == 10:
-            qs = qs.filter(exit_time__lt=_parse_dt(end) + timezone.timedelta(days=1))
+            bound = _parse_dt(end) + timezone.timedelta(days=1)
+            qs = qs.filter(exit_time__lt=bound, entry_time__lt=bound)
         else:
-            qs = qs.filter(exit_time__lte=end_dt)
+            qs = qs.filter(exit_time__lte=end_dt, entry_time__lte=end_dt)
+    return qs
+
+
+def _series_cost(request):
+    """Unfiltered, the series covers every closed trade the user has."""
+    filtered = any((request.GET.get(name) or "").strip() for name in ("symbol", "tag", "start", "end"))
+    return LIGHT if filtered else HEAVY
+
+
+@login_required
+@throttled(_series_cost)
+@reads_from_replica
+@compressed
+async def api_trade_pnl_series(request):
+    """
+    Returns each CLOSED trade's realized PnL in chronological order (by exit_time).
+    Filterable via ?symbol=&side=&start=&end= (same semantics as your other chart APIs).
+    """
+    qs = await _closed_trades(request, await request.auser())
 
     # compute per-trade realized PnL (adjust to subtract fees if you track them)
-    pnl_expr = ExpressionWrapper(PNL_EXPR, output_field=DecimalField(max_digits=16, decimal_places=2))
-    qs = qs.order_by("exit_time").values("id", "exit_time", "symbol").annotate(pnl=pnl_expr)
+    qs = qs.order_by("exit_time").values("id", "exit_time", "symbol").annotate(pnl=PNL_EXPR)
+    rows = [row async for row in qs]
 
-    labels = [row["exit_time"].isoformat(timespec="seconds") for row in qs]  # x-axis labels
-    values = [float(row["pnl"] or 0) for row in qs]
+    labels = [row["exit_time"].isoformat(timespec="seconds") for row in rows]  # x-axis labels
+    values = [float(row["pnl"] or 0) for row in rows]
 
     return JsonResponse({"labels": labels, "values": values})
 
@@ -390,79 +407,311 @@ def trades_charts_page(request):
     return render(request, "trades/charts.html")
 
 @login_required
-def api_daily_pnl(request):
-    qs = Trade.objects.filter(owner=request.user, exit_price__isnull=False)
-
-    # filters: symbol/side/date range (by exit_time)
-    symbol = (request.GET.get("symbol") or "").strip()
-    side   = (request.GET.get("side") or "").strip().upper()
-    start  = (request.GET.get("start") or "").strip()
-    end    = (request.GET.get("end") or "").strip()
-
-    if symbol:
-        qs = qs.filter(symbol__icontains=symbol)
-    if side in {"BUY", "SELL"}:
-        qs = qs.filter(side=side)
-
-    start_dt = _parse_dt(start)
-    end_dt   = _parse_dt(end)
-    if start_dt:
-        qs = qs.filter(exit_time__gte=start_dt)
-    if end_dt:
-        if len(end) == 10:
-            qs = qs.filter(exit_time__lt=_parse_dt(end) + timezone.timedelta(days=1))
-        else:
-            qs = qs.filter(exit_time__lte=end_dt)
+@throttled(LIGHT)
+@reads_from_replica
+@compressed
+async def api_daily_pnl(request):
+    user = await request.auser()
+    days = _rollup_days(request)
+    qs = await _closed_trades(request, user, archived=days is None)
 
     qs = qs.annotate(day=TruncDate("exit_time")).values("day") \
-           .annotate(pnl=Sum(ExpressionWrapper(PNL_EXPR, output_field=DecimalField(max_digits=16, decimal_places=2)))) \
+           .annotate(pnl=Sum(PNL_EXPR)) \
            .order_by("day")
 
+    rows = [row async for row in qs]
+    if days is not None:
+        # The archived days come from their rollups instead.
+        pnl = {row["day"]: row["pnl"] or 0 for row in rows}
+        async for row in archive.rollups(user, *days).values("day", "pnl"):
+            pnl[row["day"]] = pnl.get(row["day"], 0) + row["pnl"]
+        rows = [{"day": day, "pnl": pnl[day]} for day in sorted(pnl)]
+
     # return both labels and values, and also the signed values for shadow coloring
-    labels = [row["day"].isoformat() for row in qs]
-    values = [float(row["pnl"] or 0) for row in qs]
+    labels = [row["day"].isoformat() for row in rows]
+    values = [float(row["pnl"] or 0) for row in rows]
     return JsonResponse({"labels": labels, "values": values})
 
 
+def _rollup_days(request):
+    """
+    (first, last) days, either None, when api_daily_pnl can take the archived
+    part from the rollups: the range reaches into the archive, only ?start=
+    and ?end= filter it, and both are whole days. Otherwise None.
+    """
+    if any((request.GET.get(name) or "").strip() for name in ("symbol", "side", "tag")):
+        return None
+    bounds = [(request.GET.get(name) or "").strip() for name in ("start", "end")]
+    if any(bound and (len(bound) != 10 or _parse_dt(bound) is None) for bound in bounds):
+        return None
+    first, last = (_parse_dt(bound).date() if bound else None for bound in bounds)
+    return (first, last) if archive.reaches(first) else None
+
+
 @login_required
-def api_symbol_pnl(request):
-    qs = Trade.objects.filter(owner=request.user, exit_price__isnull=False)
+@throttled(LIGHT)
+@reads_from_replica
+@compressed
+async def api_symbol_pnl(request):
+    qs = await _closed_trades(request, await request.auser())
+
+    # Group on the integer key, then name the (few) groups.
+    qs = qs.values("symbol_ref").annotate(
+        pnl=Sum(PNL_EXPR)
+    ).order_by()
+    rows = [row async for row in qs]
+    names = await symbols.anames([row["symbol_ref"] for row in rows])
+    rows.sort(key=lambda row: names[row["symbol_ref"]])
 
-    # same filters; aggregating by symbol after filters
-    symbol = (request.GET.get("symbol") or "").strip()
-    side   = (request.GET.get("side") or "").strip().upper()
-    start  = (request.GET.get("start") or "").strip()
-    end    = (request.GET.get("end") or "").strip()
+    return JsonResponse({
+        "labels": [names[row["symbol_ref"]] for row in rows],
+        "values": [float(row["pnl"] or 0) for row in rows],
+    })
 
-    if symbol:
-        qs = qs.filter(symbol__icontains=symbol)
-    if side in {"BUY", "SELL"}:
-        qs = qs.filter(side=side)
 
-    start_dt = _parse_dt(start)
-    end_dt   = _parse_dt(end)
-    if start_dt:
-        qs = qs.filter(exit_time__gte=start_dt)
-    if end_dt:
-        if len(end) == 10:
-            qs = qs.filter(exit_time__lt=_parse_dt(end) + timezone.timedelta(days=1))
-        else:
-            qs = qs.filter(exit_time__lte=end_dt)
 
-    qs = qs.values("symbol").annotate(
-        pnl=Sum(ExpressionWrapper(PNL_EXPR, output_field=DecimalField(max_digits=16, decimal_places=2)))
-    ).order_by("symbol")
+SYMBOL_SORTS = ("symbol", "trades", "win_rate", "avg_win", "avg_loss", "best", "worst", "pnl")
+TAG_SORTS = ("tag",) + SYMBOL_SORTS[1:]
+SYMBOL_PAGE_SIZE = 50
+SYMBOL_MAX_ROWS = 200
+
+
+# One statement for a whole leaderboard. OFFSET 0 keeps Postgres from
+# flattening the closed-trades subquery, so each trade's PnL is computed once
+# rather than once per aggregate (about 4x faster at 20k trades). "ranked" is
+# read twice (the requested rows and the rest), so it is materialized once.
+# {source} yields (key, pnl) rows: a trade's symbol id, or each of its tags;
+# {named} then gives each group its display name, after the aggregation.
+_GROUP_STATS_SQL = """
+WITH per_group AS (
+    SELECT key,
+           count(*) AS trades,
+           count(*) FILTER (WHERE pnl > 0) AS wins,
+           sum(pnl) FILTER (WHERE pnl > 0) AS win_sum,
+           count(*) FILTER (WHERE pnl < 0) AS losses,
+           sum(pnl) FILTER (WHERE pnl < 0) AS loss_sum,
+           max(pnl) AS best,
+           min(pnl) AS worst,
+           sum(pnl) AS pnl
+    FROM {source}
+    GROUP BY key
+), named AS (
+    {named}
+), ranked AS (
+    SELECT *, row_number() OVER (ORDER BY {order} NULLS LAST, name) AS rank
+    FROM (
+        SELECT *, wins * 1.0 / trades AS win_rate,
+               win_sum / NULLIF(wins, 0) AS avg_win,
+               loss_sum / NULLIF(losses, 0) AS avg_loss
+        FROM named
+    ) AS s
+)
+SELECT rank, name, trades, wins, avg_win, avg_loss, best, worst, pnl, 1
+FROM ranked WHERE rank > %s AND rank <= %s
+UNION ALL
+SELECT NULL, NULL, CAST(sum(trades) AS bigint), CAST(sum(wins) AS bigint),
+       sum(win_sum) / NULLIF(sum(wins), 0), sum(loss_sum) / NULLIF(sum(losses), 0),
+       max(best), min(worst), sum(pnl), count(*)
+FROM ranked WHERE rank > %s
+ORDER BY rank NULLS LAST
+"""
+_GROUP_SOURCES = {
+    "symbol": "({closed} OFFSET 0) AS closed (key, pnl)",
+    # A trade with several tags counts towards each of them.
+    "tag": "({closed} OFFSET 0) AS closed (tags, pnl) CROSS JOIN LATERAL unnest(closed.tags) AS key",
+}
+_GROUP_NAMES = {
+    "symbol": "SELECT journal_symbol.name, per_group.* FROM per_group JOIN journal_symbol ON journal_symbol.id = per_group.key",
+    "tag": "SELECT key AS name, per_group.* FROM per_group",
+}
+_GROUP_FIELDS = {"symbol": "symbol_ref", "tag": "tags"}
+_GROUP_STATS_COLUMNS = ("rank", "name", "trades", "wins", "avg_win", "avg_loss", "best", "worst", "pnl", "groups")
+
+
+def _group_stats(trades, group, sort, offset, limit, rest_after):
+    """
+    Rows offset+1..offset+limit of the leaderboard by group ("symbol" or
+    "tag"), plus one trailing row aggregating every group ranked after
+    rest_after (its "groups" is their count).
+    """
+    field = sort.removeprefix("-")  # validated against SYMBOL_SORTS/TAG_SORTS by the caller
+    order = f"{'name' if field == group else field} {'DESC' if sort.startswith('-') else 'ASC'}"
+    closed, params = trades.annotate(trade_pnl=PNL_EXPR).values_list(_GROUP_FIELDS[group], "trade_pnl") \
+        .order_by().query.sql_with_params()
+    source = _GROUP_SOURCES[group].format(closed=closed)
+    with connections[trades.db].cursor() as cursor:
+        cursor.execute(
+            _GROUP_STATS_SQL.format(source=source, named=_GROUP_NAMES[group], order=order),
+            [*params, offset, offset + limit, rest_after],
+        )
+        rows = [dict(zip(_GROUP_STATS_COLUMNS, row)) for row in cursor.fetchall()]
+    return rows[:-1], rows[-1]
+
+
+def _money(value):
+    return None if value is None else round(float(value), 2)
+
+
+def _stats_row(row, group):
+    return {
+        group: row["name"],
+        "trades": row["trades"],
+        "wins": row["wins"],
+        "win_rate": round(row["wins"] / row["trades"], 4) if row["trades"] else None,
+        "avg_win": _money(row["avg_win"]),
+        "avg_loss": _money(row["avg_loss"]),
+        "best": _money(row["best"]),
+        "worst": _money(row["worst"]),
+        "pnl": _money(row["pnl"]),
+    }
+
 
+def _int_param(request, name, default, low, high):
+    raw = (request.GET.get(name) or "").strip()
+    if not raw:
+        return default
+    value = int(raw)  # ValueError is reported by the caller
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+
+async def _leaderboard(request, group, sorts):
+    """The body shared by api_symbol_stats and api_tag_stats."""
+    plural = f"{group}s"
+    sort = (request.GET.get("sort") or "-pnl").strip()
+    if sort.removeprefix("-") not in sorts:
+        return JsonResponse({"error": f"sort must be one of {', '.join(sorts)}"}, status=400)
+    try:
+        top = _int_param(request, "top", None, 1, SYMBOL_MAX_ROWS)
+        page = _int_param(request, "page", 1, 1, 10 ** 6)
+        page_size = _int_param(request, "page_size", SYMBOL_PAGE_SIZE, 1, SYMBOL_MAX_ROWS)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    trades = await _closed_trades(request, await request.auser())
+    offset = 0 if top else (page - 1) * page_size
+    rows, rest = await sync_to_async(_group_stats)(
+        trades, group, sort, offset, top or page_size,
+        # With top, the trailing row is the "other" bucket; otherwise it just counts the groups.
+        rest_after=top or 0,
+    )
+    count = len(rows) + rest["groups"] if top else rest["groups"]
+
+    body = {"sort": sort, "count": count, plural: [_stats_row(row, group) for row in rows]}
+    if top:
+        body["other"] = None
+        if rest["groups"]:
+            body["other"] = {**_stats_row(rest, group), plural: rest["groups"]}
+    else:
+        body.update(page=page, page_size=page_size, pages=-(-count // page_size))
+    return JsonResponse(body)
+
+
+@login_required
+@throttled(LIGHT)
+@reads_from_replica
+@compressed
+async def api_symbol_stats(request):
+    """
+    Per-symbol leaderboard of closed trades: count, wins, win rate, average
+    win/loss, best/worst trade and total PnL, all from one grouped query.
+
+    ?sort=      one of SYMBOL_SORTS, prefixed with "-" for descending (default -pnl)
+    ?top=N      the first N symbols plus an "other" bucket summing up the rest
+    ?page=&page_size=   without top, one page of symbols (page_size <= 200)
+    plus the symbol/side/tag/start/end filters of the other chart APIs.
+    """
+    return await _leaderboard(request, "symbol", SYMBOL_SORTS)
+
+
+@login_required
+@throttled(LIGHT)
+@reads_from_replica
+@compressed
+async def api_tag_stats(request):
+    """
+    The same leaderboard per tag (sort by TAG_SORTS). A trade with several
+    tags counts towards each, so the rows may add up to more than the total.
+    """
+    return await _leaderboard(request, "tag", TAG_SORTS)
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+@login_required
+@throttled(LIGHT)
+@reads_from_replica
+@compressed
+async def api_open_positions(request):
+    """
+    Open trades marked to market from the quote store (journal.quotes), one
+    position per symbol and side, optionally only those with every ?tag=. Symbols without a fresh quote are listed in
+    "unpriced" and left out of the total.
+    """
+    user = await request.auser()
+    risk = await sync_to_async(quotes.unrealized_pnl)(user, tags=_tags_param(request.GET))
     return JsonResponse({
-        "labels": [row["symbol"] for row in qs],
-        "values": [float(row["pnl"] or 0) for row in qs],
+        "unrealized_pnl": _money(risk["unrealized_pnl"]),
+        "unpriced": risk["unpriced"],
+        "positions": [
+            {
+                **p,
+                "quantity": _float(p["quantity"]),
+                "avg_price": _float(p["avg_price"]),
+                "mark": _float(p["mark"]),
+                "unrealized_pnl": _money(p["unrealized_pnl"]),
+            }
+            for p in risk["positions"]
+        ],
     })
 
 
+def _close_idle_connections():
+    # Connections are per thread, and this request's thread keeps its own until the response closes.
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+@login_required
+async def live_events(request):
+    """
+    Server-sent events with the user's live trade updates (journal.live), for
+    the dashboard and charts pages. Needs the ASGI server: under WSGI an open
+    stream would tie up a worker thread, so it answers 501 and pages stay static.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Live updates need the ASGI server."}, status=501)
+    user = await request.auser()
+    # Don't hold the session/user lookup's database connection for the life of the stream.
+    await sync_to_async(_close_idle_connections)()
+
+    async def stream():
+        subscription = live.get_broker().subscribe(user.pk)
+        try:
+            yield f"retry: {live.RETRY_MS}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), settings.JOURNAL_LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"  # a comment; also tells proxies the stream is alive
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: pass events through unbuffered
+    return response
+
 
 @login_required
 def trades_list(request):
-    trades = Trade.objects.filter(owner=request.user).order_by("-entry_time")
+    trades =Trade.objects.filter(owner=request.user).order_by("-entry_time")
     return render(request, "trades/list.html", {"trades": trades})
 
 @login_required
@@ -513,7 +762,7 @@ def dashboard(request):
 
 @login_required
 def profile(request):
-    settings_obj, _ = UserTradeSettings.objects.get_or_create(user=request.user)
+    settings_obj = get_trade_settings(request.user, create=True)
 
     if request.method == "POST":
         profile_form = ProfileForm(request.POST, instance=request.user)
@@ -546,24 +795,25 @@ def profile(request):
 
 
 
+TRADES_LIST_COLUMNS = ("id", "entry_time", "symbol", "side", "quantity", "price", "exit_price", "exit_time", "tags")
+TRADES_LIST_NOTES_CHARS = 80
+
+
 @login_required
 def trades_list(request):
-    qs = Trade.objects.filter(owner=request.user)
-
     # filters from querystring
     symbol = (request.GET.get("symbol") or "").strip()
     side   = (request.GET.get("side") or "").strip().upper()
     start  = (request.GET.get("start") or "").strip()  # YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]
     end    = (request.GET.get("end") or "").strip()
+    start_dt = _parse_dt(start)
+    end_dt   = _parse_dt(end)
 
-    if symbol:
-        qs = qs.filter(symbol__icontains=symbol)
+    qs = _tag_filter(archive.trades(start_dt).filter(owner=request.user), request.GET)
+    qs = _symbol_filter(qs, request.GET)
     if side in {"BUY", "SELL"}:
         qs = qs.filter(side=side)
 
-    start_dt = _parse_dt(start)
-    end_dt   = _parse_dt(end)
-
     if start_dt:
         qs = qs.filter(entry_time__gte=start_dt)
     if end_dt:
@@ -573,7 +823,15 @@ def trades_list(request):
         else:
             qs = qs.filter(entry_time__lte=end_dt)
 
-    qs = _annotate_pnl(qs).order_by("-entry_time")
+    # Only the displayed columns, and a preview of the notes: SUBSTRING (unlike
+    # LEFT) reads just the first chunks of a long TOASTed value. The template's
+    # truncatechars adds the ellipsis when there was more; the edit page has the rest.
+    # "archived" marks the rows the template lists without edit/delete buttons.
+    columns = TRADES_LIST_COLUMNS + (("archived",) if qs.model is TradeHistory else ())
+    qs = qs.order_by("-entry_time").values(*columns).annotate(
+        pnl_value=PNL_EXPR,
+        notes_preview=Substr("notes", 1, TRADES_LIST_NOTES_CHARS + 1),
+    )
 
     paginator = Paginator(qs, 25)
     page_obj = paginator.get_page(request.GET.get("page") or 1)
@@ -581,143 +839,224 @@ def trades_list(request):
     context = {
         "trades": page_obj,
         "page_obj": page_obj,
-        "filters": {"symbol": symbol, "side": side, "start": start, "end": end},
+        "notes_chars": TRADES_LIST_NOTES_CHARS,
+        "filters": {"symbol": symbol, "side": side, "tag": request.GET.get("tag", ""), "start": start, "end": end},
     }
     return render(request, "trades/list.html", context)
 
 
+def _render_import(request, context):
+    context["chunk_bytes"] = settings.JOURNAL_UPLOAD_CHUNK_BYTES
+    return render(request, "trades/import.html", context)
+
+
+def _import_cost(request):
+    return HEAVY if request.method == "POST" else 0
+
+
 @login_required
+@throttled(_import_cost)
 def trades_import(request):
-    context = {}
     if request.method == "POST":
         form = TradesImportForm(request.POST, request.FILES)
         if form.is_valid():
-            f = request.FILES["file"]
             dry_run = form.cleaned_data["dry_run"]
+            upload_id = form.cleaned_data["upload"]
+            if not upload_id:
+                return _import_file(request, form, request.FILES["file"], dry_run)
+
+            # A file sent in chunks through import_upload_detail (journal.uploads).
+            pending = get_object_or_404(ImportUpload, pk=upload_id, owner=request.user)
+            try:
+                f = uploads.open_completed(pending)
+            except uploads.UploadError as exc:
+                return _render_import(request, {"form": form, "file_errors": [str(exc)], "has_errors": True})
+            with f:
+                response = _import_file(request, form, f, dry_run)
+            if response.status_code == 302:
+                # The trades were saved; the file is no longer needed.
+                uploads.discard(pending)
+            return response
 
-            rows = []
-            errors = []
-            # --- CSV ---
-            if f.name.lower().endswith(".csv"):
-                text = TextIOWrapper(f.file, encoding="utf-8", errors="replace")
-                reader = csv.DictReader(text)
-                headers = [h.strip() for h in reader.fieldnames or []]
-                # allow extra columns like id/pnl; we only require our set to be present
-                missing = [c for c in EXPECTED if c not in headers]
-                if missing:
-                    errors.append(f"Missing required columns in CSV: {', '.join(missing)}")
-                else:
-                    for i, row in enumerate(reader, start=2):  # header is line 1
-                        rows.append((i, row))
-
-            # --- XLSX ---
-            elif f.name.lower().endswith(".xlsx"):
-                if not openpyxl:
-                    errors.append("openpyxl not installed in the container.")
-                else:
-                    wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
-                    ws = wb.active
-                    headers = [str(c.value).strip() if c.value is not None else "" for c in next(ws.rows)]
-                    missing = [c for c in EXPECTED if c not in headers]
-                    if missing:
-                        errors.append(f"Missing required columns in XLSX: {', '.join(missing)}")
-                    else:
-                        idx = {h: headers.index(h) for h in headers}
-                        for r_i, r in enumerate(ws.iter_rows(min_row=2), start=2):
-                            row = {h: (r[idx[h]].value if h in idx else None) for h in headers}
-                            # cast all cell values to string except numbers/dates we’ll parse
-                            for k, v in row.items():
-                                if isinstance(v, str):
-                                    row[k] = v.strip()
-                            rows.append((r_i, row))
-            else:
-                errors.append("Unsupported file type. Please upload .csv or .xlsx.")
-
-            parsed = []
-            for line_no, row in rows:
-                # map/clean
-                symbol = (row.get("symbol") or "").strip().upper()
-                side   = (row.get("side") or "").strip().upper()
-                q      = _coerce_decimal(row.get("quantity"))
-                price  = _coerce_decimal(row.get("price"))
-                exitp  = _coerce_decimal(row.get("exit_price"))
-                notes  = (row.get("notes") or "").strip()
-
-                # dates: if xlsx gave Python datetimes, accept them
-                et = row.get("entry_time")
-                xt = row.get("exit_time")
-                entry_time = et if isinstance(et, datetime) else _coerce_dt_any(row.get("entry_time"))
-                exit_time  = xt if isinstance(xt, datetime) else _coerce_dt_any(row.get("exit_time"))
-
-                row_errs = []
-                if not symbol:
-                    row_errs.append("symbol required")
-                if side not in {"BUY","SELL"}:
-                    row_errs.append("side must be BUY or SELL")
-                if q is None:
-                    row_errs.append("quantity required")
-                if price is None:
-                    row_errs.append("price required")
-                if not entry_time:
-                    row_errs.append("entry_time required")
-
-                parsed.append({
-                    "line": line_no,
-                    "data": {
-                        "symbol": symbol,
-                        "side": side,
-                        "quantity": q,
-                        "price": price,
-                        "entry_time": entry_time,
-                        "exit_price": exitp,
-                        "exit_time": exit_time,
-                        "notes": notes,
-                    },
-                    "errors": row_errs,
-                })
-
-            context = {
-                "form": form,
-                "preview": parsed,
-                "has_errors": any(p["errors"] for p in parsed) or bool(errors),
-                "file_errors": errors,
-                "count_ok": sum(1 for p in parsed if not p["errors"]),
-                "count_total": len(parsed),
-            }
+    else:
+        form = TradesImportForm()
+    return _render_import(request, {"form": form})
 
-            # commit if no errors and not a dry run
-            if not context["has_errors"] and not dry_run:
-                created = 0
-                for p in parsed:
-                    Trade.objects.create(owner=request.user, **p["data"])
-                    created += 1
-                messages.success(request, f"Imported {created} trades.")
-                return redirect("trades_list")
 
-            return render(request, "trades/import.html", context)
+IMPORT_PREVIEW_ROWS = 200
+IMPORT_BATCH_ROWS = 2000
 
-    else:
-        form = TradesImportForm()
-    return render(request, "trades/import.html", {"form": form})
+
+def _import_file(request, form, f, dry_run):
+    """
+    Validate f (CSV, XLSX or a columnar format), then preview it or save its
+    trades. CSV and XLSX rows are checked as they are read: the preview keeps
+    at most IMPORT_PREVIEW_ROWS of them, errors first, and unless it's a dry
+    run the valid rows are saved with bulk_create as they go, in one
+    transaction that is rolled back at the first error.
+    """
+    from . import importing
+
+    if importing.is_columnar(f.name):
+        return _trades_import_columnar(request, form, f, dry_run)
+    rows, file_errors = importing.read_rows(f)
+
+    first, invalid, batch = [], [], []
+    count_total = count_ok = 0
+    with transaction.atomic(), live.batch(request.user.pk):
+        for p in importing.parse_rows(rows):
+            count_total += 1
+            if p["errors"]:
+                if len(invalid) < IMPORT_PREVIEW_ROWS:
+                    invalid.append(p)
+                continue
+            count_ok += 1
+            if len(first) < IMPORT_PREVIEW_ROWS:
+                first.append(p)
+            if dry_run or invalid:
+                continue
+            batch.append(Trade(owner=request.user, **p["data"]))
+            if len(batch) == IMPORT_BATCH_ROWS:
+                Trade.objects.bulk_create(batch)
+                batch = []
+        has_errors = bool(invalid or file_errors)
+        if not has_errors and not dry_run:
+            Trade.objects.bulk_create(batch)
+            messages.success(request, f"Imported {count_ok} trades.")
+            return redirect("trades_list")
+        transaction.set_rollback(True)
+
+    preview = invalid or first
+    listed = count_total - count_ok if invalid else count_total
+    context = {
+        "form": form,
+        "preview": preview,
+        "has_errors": has_errors,
+        "file_errors": file_errors,
+        "count_ok": count_ok,
+        "count_total": count_total,
+    }
+    if len(preview) < listed:
+        what = "rows with errors" if invalid else "rows"
+        context["preview_note"] = f"Showing the first {len(preview)} of {listed} {what}."
+    return _render_import(request, context)
+
+
+def _trades_import_columnar(request, form, f, dry_run):
+    """
+    Parquet/Arrow/JSONL branch of trades_import. Validation runs a column at a
+    time (journal.columnar_import); the preview shows at most
+    IMPORT_PREVIEW_ROWS rows, errors first, and commits use bulk_create.
+    """
+    from . import columnar_import
+
+    context = {"form": form}
+    if not columnar_import.AVAILABLE:
+        context.update(file_errors=["pyarrow not installed on the server."], has_errors=True)
+        return _render_import(request, context)
+    try:
+        upload = columnar_import.ColumnarUpload(columnar_import.read_table(f))
+    except columnar_import.ImportFileError as exc:
+        context.update(file_errors=[str(exc)], has_errors=True)
+        return _render_import(request, context)
+
+    if not upload.error_count and not dry_run:
+        with transaction.atomic(), live.batch(request.user.pk):
+            for batch in upload.batches(IMPORT_BATCH_ROWS):
+                Trade.objects.bulk_create([Trade(owner=request.user, **data) for data in batch])
+        messages.success(request, f"Imported {upload.num_rows} trades.")
+        return redirect("trades_list")
+
+    preview = upload.preview(IMPORT_PREVIEW_ROWS)
+    context.update(
+        preview=preview,
+        has_errors=bool(upload.error_count),
+        file_errors=[],
+        count_ok=upload.num_rows - upload.error_count,
+        count_total=upload.num_rows,
+    )
+    listed = upload.error_count or upload.num_rows
+    if len(preview) < listed:
+        what = "rows with errors" if upload.error_count else "rows"
+        context["preview_note"] = f"Showing the first {len(preview)} of {listed} {what}."
+    return _render_import(request, context)
+
+
+def _upload_state(upload):
+    return {
+        "id": str(upload.pk),
+        "filename": upload.filename,
+        "size": upload.size,
+        "offset": upload.received,
+        "complete": upload.complete,
+        "url": reverse("import_upload_detail", args=[upload.pk]),
+    }
 
 
 @login_required
-def trades_export_csv(request):
-    qs = Trade.objects.filter(owner=request.user)
+@require_POST
+def import_uploads(request):
+    """
+    Start a resumable upload: POST filename, size and optionally sha256 (form
+    fields or JSON). Then PUT the chunks to the returned url.
+    """
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON."}, status=400)
+    else:
+        data = request.POST
+    try:
+        upload = uploads.start(request.user, data.get("filename"), data.get("size"), data.get("sha256"))
+    except uploads.UploadError as exc:
+        return JsonResponse({"error": str(exc)}, status=exc.status)
+    return JsonResponse(_upload_state(upload), status=201)
+
 
+@login_required
+@require_http_methods(["GET", "HEAD", "PUT", "DELETE"])
+def import_upload_detail(request, pk):
+    """
+    GET: the upload's state; "offset" is where the next chunk must start.
+    PUT: append a chunk, sent as the raw body with Content-Range
+    (bytes first-last/total) and optionally X-Chunk-SHA256. A chunk at the
+    wrong offset gets 409 with the current state, so the client can resume.
+    DELETE: abandon the upload.
+    """
+    upload = get_object_or_404(ImportUpload, pk=pk, owner=request.user)
+    if request.method == "DELETE":
+        uploads.discard(upload)
+        return HttpResponse(status=204)
+    if request.method == "PUT":
+        try:
+            length = int(request.META["CONTENT_LENGTH"])
+        except (KeyError, ValueError):
+            length = None
+        try:
+            upload = uploads.append_chunk(
+                upload, request, request.headers.get("Content-Range"), length,
+                request.headers.get("X-Chunk-SHA256", ""),
+            )
+        except uploads.UploadError as exc:
+            upload.refresh_from_db()
+            return JsonResponse({"error": str(exc), **_upload_state(upload)}, status=exc.status)
+    return JsonResponse(_upload_state(upload))
+
+
+def _export_queryset(request):
+    """The user's trades with the trades_list filters applied, newest first, with pnl_value."""
     # same filters as trades_list
-    symbol = (request.GET.get("symbol") or "").strip()
     side   = (request.GET.get("side") or "").strip().upper()
     start  = (request.GET.get("start") or "").strip()
     end    = (request.GET.get("end") or "").strip()
+    start_dt = _parse_dt(start)
+    end_dt   = _parse_dt(end)
 
-    if symbol:
-        qs = qs.filter(symbol__icontains=symbol)
+    qs = _tag_filter(archive.trades(start_dt).filter(owner=request.user), request.GET)
+    qs = _symbol_filter(qs, request.GET)
     if side in {"BUY", "SELL"}:
         qs = qs.filter(side=side)
-
-    start_dt = _parse_dt(start)
-    end_dt   = _parse_dt(end)
     if start_dt:
         qs = qs.filter(entry_time__gte=start_dt)
     if end_dt:
@@ -727,28 +1066,60 @@ def trades_export_csv(request):
             qs = qs.filter(entry_time__lte=end_dt)
 
     qs = _annotate_pnl(qs).order_by("-entry_time")
+    # Streamed exports read once the view has returned and the request's
+    # routing state is gone, so pick the database (replica or primary) now.
+    return qs.using(router.db_for_read(qs.model))
+
+
+def _export_stream(request, chunks):
+    """An export's chunks in the form the server streams: async under ASGI, as is under WSGI."""
+    from . import exporting
+
+    return exporting.AsyncChunks(chunks) if isinstance(request, ASGIRequest) else chunks
+
+
+def _csv_export(request):
+    """The streamed CSV export; shared by both export views, each throttled once."""
+    from . import exporting
 
-    # stream CSV
-    resp = HttpResponse(content_type="text/csv")
+    resp = StreamingHttpResponse(_export_stream(request, exporting.csv_chunks(_export_queryset(request))),
+                                 content_type="text/csv")
     resp["Content-Disposition"] = 'attachment; filename="trades_export.csv"'
-    w = csv.writer(resp)
-    w.writerow(["id","entry_time","symbol","side","quantity","price","exit_price","exit_time","pnl","notes"])
-    for t in qs:
-        w.writerow([
-            t.id,
-            t.entry_time.isoformat(timespec="seconds"),
-            t.symbol,
-            t.side,
-            t.quantity,
-            t.price,
-            "" if t.exit_price is None else t.exit_price,
-            "" if not t.exit_time else t.exit_time.isoformat(timespec="seconds"),
-            "" if t.pnl_value is None else f"{t.pnl_value:.2f}",
-            (t.notes or "").replace("\r", " ").replace("\n", " "),
-        ])
     return resp
 
 
+@login_required
+@throttled(HEAVY)
+@reads_from_replica
+@compressed
+def trades_export_csv(request):
+    return _csv_export(request)
+
+
+@login_required
+@throttled(HEAVY)
+@reads_from_replica
+def trades_export(request):
+    """Export in ?format=csv (default), xlsx or parquet, with the same filters as the CSV export."""
+    from . import exporting
+
+    fmt = (request.GET.get("format") or "csv").strip().lower()
+    if fmt == "csv":
+        return compress_response(request, _csv_export(request))
+    if fmt == "xlsx":
+        return exporting.xlsx_response(_export_queryset(request))
+    if fmt == "parquet":
+        if not exporting.PARQUET_AVAILABLE:
+            return HttpResponse("Parquet export needs pyarrow, which is not installed on the server.", status=501)
+        chunks = exporting.parquet_chunks(_export_queryset(request))
+        resp = StreamingHttpResponse(_export_stream(request, chunks), content_type="application/vnd.apache.parquet")
+        resp["Content-Disposition"] = 'attachment; filename="trades_export.parquet"'
+        return resp
+    return HttpResponse("Unsupported export format; use csv, xlsx or parquet.", status=400)
+
+
+
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
@@ -763,9 +1134,21 @@ class TradeViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
 
     
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Reads (list/retrieve) can be served by the replica; writes stay on the primary.
+        if request.method in permissions.SAFE_METHODS:
+            use_replica(request.user)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return compress_response(request, response)
+
     def get_queryset(self):
-        # Each user only sees their own trades
-        return Trade.objects.filter(owner=self.request.user).order_by("-entry_time")
+        # Each user only sees their own trades; archived ones can be read but not changed.
+        trades = archive.trades() if self.request.method in permissions.SAFE_METHODS else Trade.objects
+        qs = trades.filter(owner=self.request.user).select_related("owner").order_by("-entry_time")
+        return _tag_filter(qs, self.request.query_params)
 
     def perform_create(self, serializer):
         # Auto-set the owner on create
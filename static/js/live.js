@@ -0,0 +1,36 @@
+// Live trade updates from /api/live/ (journal.live) for the dashboard and charts pages.
+// Each "trade" event carries the change to the closed-trade stats; pages apply it in
+// place instead of refetching. A "reset" (imports, missed events) means refetch.
+(function () {
+  function connect(url, handlers) {
+    if (!window.EventSource) return null;
+    const source = new EventSource(url);
+    source.addEventListener("trade", (e) => handlers.trade(JSON.parse(e.data)));
+    source.addEventListener("reset", () => handlers.reset());
+    return source;
+  }
+
+  // Whether a leg (one closed version of a trade) falls within the page's
+  // ?symbol=&side=&tag=&start=&end= filters, with the server's semantics.
+  function legMatches(leg, filters) {
+    const symbol = (filters.symbol || "").trim().toUpperCase();
+    if (symbol) {
+      const text = symbol.replace(/\*+$/, "").trim();
+      if (symbol.endsWith("*") ? !leg.symbol.startsWith(text) : leg.symbol !== text) return false;
+    }
+    const side = (filters.side || "").trim().toUpperCase();
+    if (side && leg.side !== side) return false;
+    const tags = (filters.tag || "").split(",").map(t => t.trim().toLowerCase()).filter(Boolean);
+    if (tags.some(t => !leg.tags.includes(t))) return false;
+    const exit = new Date(leg.exit);
+    if (filters.start && exit < new Date(filters.start)) return false;
+    if (filters.end) {
+      // A bare date includes the whole day.
+      const end = filters.end.length === 10 ? new Date(filters.end + "T23:59:59.999") : new Date(filters.end);
+      if (exit > end) return false;
+    }
+    return true;
+  }
+
+  window.journalLive = { connect, legMatches };
+})();